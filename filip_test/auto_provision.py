@@ -28,6 +28,7 @@ from filip.clients.ngsi_v2 import QuantumLeapClient
 from filip.clients.ngsi_v2.client import HttpClientConfig
 from filip.models.ngsi_v2.context import ContextEntity
 from keycloak_python import KeycloakPython
+from token_manager import TokenManager
 
 
 class AutoProvision:
@@ -42,6 +43,14 @@ class AutoProvision:
         self.iota_url = iota_url
         self.ql_url = ql_url
         self.fiware_service = fiware_service
+        self.keycloak = KeycloakPython()
+        self.token_manager = TokenManager(self.keycloak.get_access_token)
+
+    def get_token(self):
+        """
+        This function returns the token shared by all functions of this class, see token_manager.py.
+        """
+        return self.token_manager.get_token()
 
     def provision_service_group(self, fiware_service_path: str,
                                 service_group_apikey: str,
@@ -72,7 +81,7 @@ class AutoProvision:
                                      cbHost=cb_host,
                                      autoprovision=autoprovision,
                                      explicitAttrs=explicitAttrs)
-        token, in_sec = KeycloakPython().get_access_token()
+        token = self.get_token()
         client = HttpClient(fiware_header=fiware_header, config=config,
                             headers={'Authorization': 'Bearer %s' % token})
         client.iota.headers.update({'Authorization': 'Bearer %s' % token})
@@ -148,7 +157,7 @@ class AutoProvision:
                             lazy=[],
                             explicitAttrs=provision_device['explicitAttrs'])
 
-            token, in_sec = KeycloakPython().get_access_token()
+            token = self.get_token()
             client = HttpClient(fiware_header=fiware_header, config=config,
                                 headers={'Authorization': 'Bearer %s' % token})
             client.iota.headers.update({'Authorization': 'Bearer %s' % token})
@@ -195,7 +204,7 @@ class AutoProvision:
             data = patch_metadata_json[key]
             entity = ContextEntity(**data)
 
-            token, in_sec = KeycloakPython().get_access_token()
+            token = self.get_token()
             client = HttpClient(fiware_header=fiware_header, config=config,
                                 headers={'Authorization': 'Bearer %s' % token})
             client.cb.headers.update({'Authorization': 'Bearer %s' % token})
@@ -212,7 +221,7 @@ class AutoProvision:
                                      service_path=fiware_service_path)
         config = HttpClientConfig(cb_url=self.cb_url, iota_url=self.iota_url, ql_url=self.ql_url)
         cb_request_session = requests.Session()
-        token, in_sec = KeycloakPython().get_access_token()
+        token = self.get_token()
         client = HttpClient(fiware_header=fiware_header, config=config,
                             session=cb_request_session,
                          headers={'Authorization': 'Bearer %s' % token})
@@ -263,7 +272,7 @@ class AutoProvision:
         fiware_header = FiwareHeader(service=self.fiware_service,
                                      service_path=fiware_service_path)
         config = HttpClientConfig(cb_url=self.cb_url, iota_url=self.iota_url)
-        token, in_sec = KeycloakPython().get_access_token()
+        token = self.get_token()
         client = HttpClient(fiware_header=fiware_header, config=config,
                             headers={'Authorization': 'Bearer %s' % token})
         client.iota.headers.update({'Authorization': 'Bearer %s' % token})
@@ -287,7 +296,7 @@ class AutoProvision:
         fiware_header = FiwareHeader(service=self.fiware_service,
                                      service_path=fiware_service_path)
         config = HttpClientConfig(cb_url=self.cb_url, iota_url=self.iota_url)
-        token, in_sec = KeycloakPython().get_access_token()
+        token = self.get_token()
         client = HttpClient(fiware_header=fiware_header, config=config,
                             headers={'Authorization': 'Bearer %s' % token})
         client.iota.headers.update({'Authorization': 'Bearer %s' % token})
@@ -329,7 +338,7 @@ class AutoProvision:
         fiware_header = FiwareHeader(service=self.fiware_service,
                                      service_path=fiware_service_path)
         config = HttpClientConfig(cb_url=self.cb_url, iota_url=self.iota_url)
-        token, in_sec = KeycloakPython().get_access_token()
+        token = self.get_token()
         client = HttpClient(fiware_header=fiware_header, config=config,
                             headers={'Authorization': 'Bearer %s' % token})
         client.cb.headers.update({'Authorization': 'Bearer %s' % token})
@@ -364,7 +373,7 @@ class AutoProvision:
                                      service_path=fiware_service_path)
         config = HttpClientConfig(cb_url=self.cb_url, iota_url=self.iota_url, ql_url=self.ql_url)
         cb_request_session = requests.Session()
-        token, in_sec = KeycloakPython().get_access_token()
+        token = self.get_token()
         client = HttpClient(fiware_header=fiware_header, config=config,
                             session=cb_request_session,
                          headers={'Authorization': 'Bearer %s' % token})
@@ -6,11 +6,12 @@ load_dotenv()
 
 
 class KeycloakPython:
-    def __init__(self, keycloak_host=None, client_id=None, client_secret=None):
+    def __init__(self, keycloak_host=None, client_id=None, client_secret=None, timeout=(3.05, 10)):
         """
         - Initialze the Keycloak Host , Client ID and Client secret.
         - If no parameters are passed .env file is used
         - Priority : function parameters > Class Instatiation > .env file
+        - timeout: seconds, or (connect timeout, read timeout), of all requests
         """
         # if keycloak_host == None:
         #     self.keycloak_host = os.getenv('KEYCLOAK_HOST')
@@ -19,6 +20,7 @@ class KeycloakPython:
         self.keycloak_host = os.getenv('KEYCLOAK_HOST') if keycloak_host == None else keycloak_host
         self.client_id = os.getenv('CLIENT_ID') if client_id == None else client_id
         self.client_secret = os.getenv('CLIENT_SECRET') if client_secret ==None else client_secret
+        self.timeout = timeout
 
     def get_access_token(self, keycloak_host=None, client_id=None, client_secret=None):
         """
@@ -34,7 +36,7 @@ class KeycloakPython:
                     'grant_type':'client_credentials'}
         try:
             headers = {"content-type": "application/x-www-form-urlencoded"}
-            access_data = requests.post(self.keycloak_host, data=self.data, headers=headers)
+            access_data = requests.post(self.keycloak_host, data=self.data, headers=headers, timeout=self.timeout)
             expires_in = access_data.json()['expires_in']
             access_token = access_data.json()['access_token']
             return access_token, expires_in
@@ -49,7 +51,7 @@ class KeycloakPython:
         """
         access_token, expires_in = self.get_access_token(keycloak_host=keycloak_host,client_id=client_id, client_secret=client_secret)
         headers['Authorization'] = 'Bearer %s' % (access_token)
-        response = requests.get(client_host, headers=headers)
+        response = requests.get(client_host, headers=headers, timeout=self.timeout)
         return response.text
 
     def post_data(self,client_host,data, headers = {},keycloak_host=None, client_id=None, client_secret=None):
@@ -61,7 +63,7 @@ class KeycloakPython:
         access_token, expires_in = self.get_access_token(keycloak_host=keycloak_host,client_id=client_id, client_secret=client_secret)
         headers['Content-Type'] = 'application/json' 
         headers['Authorization'] = 'Bearer %s' % (access_token)
-        response = requests.post(client_host, data = data , headers=headers)
+        response = requests.post(client_host, data = data , headers=headers, timeout=self.timeout)
         return response
 
     def patch_data(self,client_host,json, headers = {},keycloak_host=None, client_id=None, client_secret=None):
@@ -73,7 +75,7 @@ class KeycloakPython:
         access_token, expires_in = self.get_access_token(keycloak_host=keycloak_host,client_id=client_id, client_secret=client_secret)
         headers['Content-Type'] = 'application/json' 
         headers['Authorization'] = 'Bearer %s' % (access_token)
-        response = requests.patch(url = client_host, json = json , headers=headers)
+        response = requests.patch(url = client_host, json = json , headers=headers, timeout=self.timeout)
         return response
 
 class KeycloakPythonException(Exception):
@@ -0,0 +1,63 @@
+"""
+This file contains the class TokenManager, a copy of the class TokenManager of the dashboard (webpage/helper_function/token_manager.py)
+with the same interface, so that this folder can be used without the dashboard.
+All functions of AutoProvision share one TokenManager, which gets the tokens from keycloak.
+Only one thread requests a new token at a time, and the token is renewed shortly before it expires.
+"""
+
+import time
+from threading import Lock, Condition
+
+
+class TokenManager:
+    """
+    This class keeps the current token and its expire time.
+
+    parameter fetch_token: function returning (access_token, expires_in seconds), e.g. KeycloakPython().get_access_token
+    parameter renew_before: seconds before the expire time from which on the token is renewed
+    parameter clock: function returning the current time in seconds, time.time by default, can be replaced e.g. for testing
+    """
+    def __init__(self, fetch_token, renew_before: float = 20, clock=time.time):
+        self.fetch_token = fetch_token
+        self.renew_before = renew_before
+        self.clock = clock
+        self.condition = Condition(Lock())
+        self.token = ''
+        self.expire_time = 0
+        self.refreshing = False  # True while one thread is requesting a new token
+
+    def get_token(self, force_refresh: bool = False):
+        """
+        This function returns a valid token.
+        If the token is about to expire, the first calling thread requests a new one from keycloak,
+        the other threads keep using the current token as long as it is still valid, or wait for the new one otherwise.
+
+        parameter force_refresh: request a new token even if the current one has not expired, e.g. after the server rejected it
+        """
+        with self.condition:
+            while True:
+                now = self.clock()
+                if not force_refresh and self.token and now < self.expire_time - self.renew_before:
+                    return self.token
+                if not self.refreshing:
+                    self.refreshing = True
+                    break
+                if not force_refresh and self.token and now < self.expire_time:
+                    return self.token  # still valid, another thread is already renewing it
+                self.condition.wait()
+                force_refresh = False  # the token has just been renewed by another thread
+
+        start = self.clock()
+        try:
+            access_token, expires_in = self.fetch_token()
+        except Exception:
+            with self.condition:
+                self.refreshing = False
+                self.condition.notify_all()
+            raise
+        with self.condition:
+            self.token = access_token
+            self.expire_time = start + expires_in
+            self.refreshing = False
+            self.condition.notify_all()
+            return access_token
@@ -256,8 +256,10 @@ Input_valve_opening = dcc.Input(
 )
 
 Tabs = html.Div([
-    dcc.Tabs(id='Tabs', value='tab-1', children=[
-        dcc.Tab(label='Air Inlet/Outlet Temperature/RH', children=[
+    # state of the figures in the browser, used for appending only the new points on a refresh, see helper_function/figure_builder.py
+    dcc.Store(id='history-graph-state', storage_type='memory'),
+    dcc.Tabs(id='Tabs', value='air', children=[
+        dcc.Tab(label='Air Inlet/Outlet Temperature/RH', value='air', children=[
             html.Div([
                 dcc.Graph(
                     id='tab_temp_rh_air',
@@ -266,7 +268,7 @@ Tabs = html.Div([
                 )
             ]),
         ]),
-        dcc.Tab(label='Water Supply/Return Temperature', children=[
+        dcc.Tab(label='Water Supply/Return Temperature', value='water', children=[
             html.Div([
                 dcc.Graph(
                     id='tab_temp_water',
@@ -275,7 +277,7 @@ Tabs = html.Div([
                 )
             ]),
         ]),
-        dcc.Tab(label='voc', children=[
+        dcc.Tab(label='voc', value='voc', children=[
             html.Div([
                 dcc.Graph(
                     id='tab_voc',
@@ -284,7 +286,7 @@ Tabs = html.Div([
                 )
             ]),
         ]),
-        dcc.Tab(label='valve opening', children=[
+        dcc.Tab(label='valve opening', value='valve', children=[
             html.Div([
                 dcc.Graph(
                     id='tab_valve',
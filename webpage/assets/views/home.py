@@ -1,10 +1,14 @@
 import datetime
+from threading import Lock
 
 import dash
 import dash_html_components as html
 import dash_core_components as dcc
 import dash_bootstrap_components as dbc
 from assets.views import plot_common
+from helper_function.config import WebpageConfig
+from helper_function.organize_data import GetData
+from helper_function.timeseries_store import to_plot_time
 
 # DEFAULT_IMAGE_PATH = "assets/images/AHU.PNG"
 
@@ -15,6 +19,29 @@ app = dash.Dash(__name__, external_stylesheets=external_stylesheets)
 server = app.server
 app.title = "AHU04 Display Draft"
 
+
+class HomeConfig(WebpageConfig):
+    # The history cache of this draft page is kept in memory only, so that it does not write to the files of the HistoryCache of the dashboard.
+    # The daily tiles (history_tile_dir) are shared, they are never changed once written.
+    history_cache_dir = ''
+
+
+get_data = None  # created by the function get_home_data on the first use
+get_data_lock = Lock()
+
+
+def get_home_data():
+    """
+    This function returns the GetData of this page. It is created on the first call rather than on import,
+    so that importing this module starts no thread pools and loads no cache.
+    """
+    global get_data
+    with get_data_lock:
+        if get_data is None:
+            get_data = GetData(HomeConfig())
+        return get_data
+
+
 # display current sensor values
 current_values = [
     dbc.Card(
@@ -102,17 +129,11 @@ history_humidity = dcc.Graph(
 
 # the date range selector
 date_selector = dbc.Row(children=[
-    html.H4("Select Start Time:"),
-    dcc.DatePickerSingle(
+    html.H4("Select Start and End Time:"),
+    dcc.DatePickerRange(
         id='date_selector',
-        date=datetime.date.today() - datetime.timedelta(days=1),
-        display_format='DD.MM.YYYY',
-        style={"margin-left": "15px", 'margin-right': '15px'}
-    ),
-    html.H4("Select End Time:"),
-    dcc.DatePickerSingle(
-        id='date_selector',
-        date=datetime.date.today(),
+        start_date=datetime.date.today() - datetime.timedelta(days=1),
+        end_date=datetime.date.today(),
         display_format='DD.MM.YYYY',
         style={"margin-left": "15px"}
     )
@@ -173,12 +194,29 @@ def update_output(n_clicks, value):
     return 'pump speed "{}" submitted'.format(value)
 
 
-# potential callback for adjusting start/end dates (not yet in use)
+# display the history temperature of the selected dates
 @app.callback(
     dash.dependencies.Output('history_temperature', 'figure'),
     [dash.dependencies.Input('date_selector', 'start_date'),
      dash.dependencies.Input('date_selector', 'end_date')])
-def update_output(start_date, end_date):
-    start_date_object = date.fromisoformat(start_date)
-    end_date_object = date.fromisoformat(end_date)
-
+def update_history_temperature(start_date, end_date):
+    """
+    This function shows the historical temperatures of plc from the beginning of start_date until the end of end_date (UTC).
+    The completed days are taken from the daily tiles of get_home_data() (see helper_function/history_tiles.py),
+    so that only the days never displayed before and the current day are requested from quantumleap.
+    """
+    if start_date is None or end_date is None:
+        return dash.no_update
+    fromDate_str = start_date[:10] + 'T00:00:00'
+    toDate_str = end_date[:10] + 'T23:59:59'
+    minutes = int((datetime.datetime.fromisoformat(toDate_str) - datetime.datetime.fromisoformat(fromDate_str)).total_seconds() // 60) + 1
+    home_data = get_home_data()
+    history = home_data.get_history(['plc'], fromDate_str, max_points=home_data.get_point_budget(minutes),
+                                    aggr_period=home_data.get_aggregation_period(minutes), toDate_str=toDate_str)['plc']
+    return {
+        'data': [
+            {'x': to_plot_time(history[param][0]).tolist(), 'y': history[param][1].tolist(), 'type': 'scatter', 'name': param}
+            for param in home_data.config.history_values_display_param_list['plc'] if 'Temperature' in param and param in history
+        ],
+        'layout': {'width': 1300, 'height': 400, 'title': 'History Temperature'}
+    }
@@ -0,0 +1,22 @@
+"""
+This file contains the settings of gunicorn, see wsgi.py.
+Every worker process imports index.py by itself (no preload_app), so that each of them starts its own background threads
+(orion poller, thread pool of GetData), which would not survive the fork of a preloaded app.
+The state shared by the workers is kept in the directory SHARED_STATE_DIR, see helper_function/shared_state.py.
+"""
+
+import os
+import multiprocessing
+
+# has to be set before helper_function.config is imported
+os.environ.setdefault('SHARED_STATE_DIR', '/tmp/iotweb_shared_state')
+
+from helper_function.config import WebpageConfig
+
+config = WebpageConfig()
+
+bind = '%s:%s' % (config.HOST_NAME, config.PORT_NUMBER)
+workers = int(os.environ.get('GUNICORN_WORKERS', multiprocessing.cpu_count()))
+threads = int(os.environ.get('GUNICORN_THREADS', 4))  # call back functions of one worker running at the same time
+timeout = 120  # seconds, longer than config.history_request_timeout
+preload_app = False
@@ -0,0 +1,63 @@
+"""
+This file contains the function build_band_shapes.
+The background color of the historical graphs shows which control system was active.
+Instead of adding one vrect per control period to each figure (plotly copies and validates all shapes on every add_vrect),
+the shapes are built once as a list of dicts, and the control periods are merged to pixels if there are more than pixels,
+so that the number of shapes is bounded by the width of the graph and not by the number of switches.
+"""
+
+import numpy as np
+from helper_function.timeseries_store import to_plot_time
+
+
+def build_band_shapes(start_end_time: dict, from_date, now, system_color: dict, resolution: int, opacity: float = 0.15):
+    """
+    This function builds the background shapes of the historical graphs from the control periods.
+    Illustration of returned data:
+    [
+        {
+            'type': 'rect', 'xref': 'x', 'yref': 'paper',
+            'x0': '2021-01-02T08:00:00.000', 'x1': '2021-01-02T09:59:59.000', 'y0': 0, 'y1': 1,
+            'fillcolor': 'rgb(255, 0, 0)', 'opacity': 0.15, 'layer': 'below', 'line': {'width': 0}
+        }
+    ]
+    If there are more control periods than pixels, the graph is divided into resolution pixels,
+    and each pixel gets the color of the control system active in its middle.
+    Afterwards neighbouring control periods of the same control system are joined.
+
+    parameter start_end_time: the return of the function get_switch_history of GetData
+    parameter from_date, now: numpy datetime64, the displayed time range
+    parameter system_color: {control system: color}
+    parameter resolution: approximate width of the graph in pixels
+    """
+    systems = [system for system in start_end_time if len(start_end_time[system][0]) > 0]
+    if not systems:
+        return []
+    starts = np.concatenate([np.array(start_end_time[system][0], dtype='datetime64[ms]') for system in systems])
+    ends = np.concatenate([np.array(start_end_time[system][1], dtype='datetime64[ms]') for system in systems])
+    codes = np.concatenate([np.full(len(start_end_time[system][0]), code) for code, system in enumerate(systems)])
+    order = np.argsort(starts, kind='stable')
+    starts, ends, codes = starts[order], ends[order], codes[order]
+
+    if len(starts) > resolution:
+        # more control periods than pixels: color each pixel by the control system active in its middle
+        edges = np.datetime64(from_date, 'ms') + (np.datetime64(now, 'ms') - np.datetime64(from_date, 'ms')) * np.linspace(0, 1, resolution + 1)
+        edges = edges.astype('datetime64[ms]')
+        middles = edges[:-1] + (edges[1:] - edges[:-1]) // 2
+        index = np.searchsorted(starts, middles, side='right') - 1
+        active = (index >= 0) & (middles <= ends[np.maximum(index, 0)])
+        starts, ends, codes = edges[:-1][active], edges[1:][active], codes[index[active]]
+        if len(starts) == 0:
+            return []
+
+    # join neighbouring control periods of the same control system
+    first = np.concatenate([[True], codes[1:] != codes[:-1]])
+    last = np.concatenate([codes[1:] != codes[:-1], [True]])
+    starts, ends, codes = starts[first], ends[last], codes[first]
+
+    x0, x1 = to_plot_time(starts).tolist(), to_plot_time(ends).tolist()
+    return [
+        {'type': 'rect', 'xref': 'x', 'yref': 'paper', 'x0': start, 'x1': end, 'y0': 0, 'y1': 1,
+         'fillcolor': system_color[systems[code]], 'opacity': opacity, 'layer': 'below', 'line': {'width': 0}}
+        for start, end, code in zip(x0, x1, codes)
+    ]
@@ -0,0 +1,156 @@
+"""
+This file contains the classes CircuitBreaker and BackendSession, and the exception CircuitOpenError.
+When a backend of the dashboard (orion, quantumleap, keycloak) is down, every request to it would wait until its timeout,
+so every refresh of the dashboard would block a thread of the server for this time.
+Instead, after config.circuit_failure_threshold failed requests in a row the backend is considered down ("the circuit is open"),
+and further requests fail at once with CircuitOpenError, so that the callers return their fallback values
+(e.g. GetData.return_null_orion, or the data in the HistoryCache) without waiting.
+While the circuit is open, the backend is probed in a background thread every config.circuit_probe_interval seconds,
+and the circuit is closed again as soon as the backend answers.
+"""
+
+import time
+from threading import Lock, Thread
+import requests
+
+
+class CircuitOpenError(requests.exceptions.ConnectionError):
+    """
+    This exception is raised instead of sending a request to a backend whose circuit is open.
+    It is a requests.exceptions.ConnectionError, so that it is handled by the same code as an unreachable server.
+    """
+
+
+class CircuitBreaker:
+    """
+    This class keeps whether a backend is considered down.
+
+    parameter name: name of the backend, e.g. 'orion', used in the messages
+    parameter failure_threshold: number of failed requests in a row after which the circuit is opened
+    parameter probe_interval: seconds between two probes of the backend while the circuit is open
+    parameter probe: function returning whether the backend is reachable, e.g. BackendSession.probe.
+                     If None, one request is let through every probe_interval seconds instead.
+    parameter clock: function returning the current time in seconds, time.monotonic by default, can be replaced e.g. for testing
+    """
+    def __init__(self, name: str, failure_threshold: int, probe_interval: float, probe=None, clock=time.monotonic):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.probe_interval = probe_interval
+        self.probe = probe
+        self.clock = clock
+        self.lock = Lock()
+        self.failures = 0  # failed requests in a row
+        self.is_open = False
+        self.open_time = 0  # time when the circuit was opened or a request was last let through while open
+        self.probe_thread = None
+
+    def allow_request(self):
+        """
+        This function returns whether a request may be sent to the backend.
+        """
+        with self.lock:
+            if not self.is_open:
+                return True
+            if self.probe is None and self.clock() - self.open_time >= self.probe_interval:
+                self.open_time = self.clock()  # this request is the probe
+                return True
+            return False
+
+    def record_success(self):
+        with self.lock:
+            self.close()
+
+    def record_failure(self):
+        """
+        This function counts a failed request, and opens the circuit after self.failure_threshold failed requests in a row.
+        """
+        with self.lock:
+            self.failures += 1
+            if self.is_open or self.failures < self.failure_threshold:
+                return
+            print('circuit of', self.name, 'opened after', self.failures, 'failed requests, requests fail at once until it is reachable again')
+            self.is_open = True
+            self.open_time = self.clock()
+            if self.probe is not None and self.probe_thread is None:
+                self.probe_thread = Thread(target=self.run_probe, name='CircuitBreaker-%s' % self.name, daemon=True)
+                self.probe_thread.start()
+
+    def close(self):
+        if self.is_open:
+            print('circuit of', self.name, 'closed, it is reachable again')
+        self.is_open = False
+        self.failures = 0
+
+    def run_probe(self):
+        """
+        This function runs in the background thread while the circuit is open, and probes the backend until it is reachable again.
+        """
+        while True:
+            time.sleep(self.probe_interval)
+            try:
+                reachable = self.probe()
+            except Exception as error:
+                print('in CircuitBreaker.run_probe of', self.name, 'error message:\n', error)
+                reachable = False
+            with self.lock:
+                if reachable or not self.is_open:
+                    self.close()
+                    self.probe_thread = None
+                    return
+
+    def call(self, function, *args, **kwargs):
+        """
+        This function calls function(*args, **kwargs) if the circuit is closed, and raises CircuitOpenError otherwise.
+        Any exception raised by the function counts as a failed request.
+        Example: circuit_breaker.call(KeycloakPython().get_access_token)
+        """
+        if not self.allow_request():
+            raise CircuitOpenError('%s is unavailable, the request is not sent' % self.name)
+        try:
+            result = function(*args, **kwargs)
+        except Exception:
+            self.record_failure()
+            raise
+        self.record_success()
+        return result
+
+
+class BackendSession(requests.Session):
+    """
+    This class is a requests.Session which gives every request a timeout and passes it through a CircuitBreaker.
+    It is given to the clients of FiLiP (ContextBrokerClient, QuantumLeapClient), so that all their requests are covered.
+    A request fails if the server cannot be reached, does not answer within the timeout, or answers with a server error (status code 5xx).
+
+    parameter timeout: seconds, or (connect timeout, read timeout), used if a request does not give its own timeout
+    parameter circuit_breaker: CircuitBreaker of the backend, or None
+    """
+    def __init__(self, timeout, circuit_breaker: CircuitBreaker = None):
+        requests.Session.__init__(self)
+        self.timeout = timeout
+        self.circuit_breaker = circuit_breaker
+
+    def request(self, method, url, **kwargs):
+        if kwargs.get('timeout') is None:
+            kwargs['timeout'] = self.timeout
+        if self.circuit_breaker is None:
+            return requests.Session.request(self, method, url, **kwargs)
+        if not self.circuit_breaker.allow_request():
+            raise CircuitOpenError('%s is unavailable, the request to %s is not sent' % (self.circuit_breaker.name, url))
+        try:
+            response = requests.Session.request(self, method, url, **kwargs)
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+            self.circuit_breaker.record_failure()
+            raise
+        if response.status_code >= 500:
+            self.circuit_breaker.record_failure()
+        else:
+            self.circuit_breaker.record_success()
+        return response
+
+    def probe(self, url: str, headers: dict = None):
+        """
+        This function returns whether the server answers a GET request to url without a server error, bypassing the circuit breaker.
+        Any other answer, e.g. 401 for a missing token, means the server is reachable.
+        """
+        response = requests.Session.request(self, 'GET', url, headers=headers, timeout=self.timeout)
+        return response.status_code < 500
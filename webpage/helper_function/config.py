@@ -1,3 +1,4 @@
+import os
 
 
 class WebpageConfig:
@@ -22,6 +23,69 @@ class WebpageConfig:
     display_digits = 1
     switch_timeout = 30  # Seconds. After switch to a different control system, the switching function is disabled for these seconds.
     orion_refresh_interval = 5  # Seconds. How often do the current values on the system graph refresh.
+    history_band_resolution = 1500  # Pixels. Control periods narrower than 1/history_band_resolution of the historical graph are merged into the background.
+    # Orion subscription. If enabled, orion pushes the changes of the current values to the dashboard instead of being polled.
+    orion_subscription_enabled = False
+    orion_notification_path = '/online-workshop/orion-notification'  # Path of the endpoint receiving the notifications on the flask server
+    orion_notification_url = 'http://localhost:7770/online-workshop/orion-notification'  # Url of this endpoint as reachable from orion
+    orion_resync_interval = 300  # Seconds. How often all current values are read from orion again, in case a notification is lost.
+    # Secret sent by orion in the header config.orion_notification_header of every notification, notifications without it are rejected.
+    # Empty means a random secret is generated when the dashboard starts, and given to orion with the subscriptions.
+    orion_notification_secret = os.environ.get('ORION_NOTIFICATION_SECRET', '')
+    orion_notification_header = 'X-Dashboard-Secret'
+
+    # Worker processes
+    # Directory of the state shared by the worker processes when the dashboard is served by gunicorn (see gunicorn.conf.py),
+    # empty means the dashboard runs in one process (python index.py) and keeps everything in memory.
+    shared_state_dir = os.environ.get('SHARED_STATE_DIR', '')
+
+    # Token
+    token_renew_before = 20  # Seconds. The token from keycloak is renewed this time before it expires.
+
+    # Timeouts and circuit breakers of the requests to the fiware platform, see helper_function/circuit_breaker.py
+    orion_timeout = (3.05, 10)  # Seconds. (connect timeout, read timeout) of the requests to orion.
+    quantumleap_timeout = (3.05, 20)  # Seconds. (connect timeout, read timeout) of the requests to quantumleap.
+    keycloak_timeout = (3.05, 10)  # Seconds. (connect timeout, read timeout) of the requests to keycloak.
+    circuit_failure_threshold = 3  # Number of failed requests in a row after which a backend is considered down and requests to it fail at once.
+    circuit_probe_interval = 10  # Seconds. How often a backend considered down is probed in the background.
+
+    # Data source
+    use_async_client = False  # If True, the data are requested by AsyncGetData (all requests on one asyncio event loop) instead of GetData.
+
+    # History
+    history_cache_max_age = 86400  # Minutes. Historical data older than this are dropped from the cache, should be the longest display duration.
+    history_cache_max_bytes_per_series = 4 * 1024 * 1024  # Bytes. Maximum memory of each cached series, afterwards the oldest data are overwritten.
+    # Directory where the cached historical data are saved, so that they survive a restart of the server. Empty means they are only kept in memory.
+    history_cache_dir = os.environ.get('HISTORY_CACHE_DIR', os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'history_cache'))
+    history_cache_save_interval = 60  # Seconds. How often the changed cached historical data are saved to history_cache_dir.
+    # The aggregated historical data of every completed UTC day are requested once and kept as a tile, see helper_function/history_tiles.py
+    history_tile_dir = os.path.join(history_cache_dir, 'tiles') if history_cache_dir else ''  # Directory of the saved tiles, empty means only in memory.
+    history_tile_cache_size = 10000  # Maximum number of tiles kept in memory, the others are loaded from history_tile_dir when needed.
+    history_tile_settle_minutes = 10  # Minutes. The tile of a day is requested this time after the end of the day, so that late data are not missed.
+    history_max_workers = 16  # Maximum number of threads requesting historical data from quantumleap at the same time.
+    history_page_size = 10000  # Maximum number of records quantumleap returns per request, larger results are requested in pages.
+    history_page_workers = 4  # Maximum number of pages of large results requested from quantumleap at the same time.
+    history_request_timeout = 20  # Seconds. Historical data not arrived within this time are taken from the cache.
+    history_callback_deadline = 15  # Seconds. Maximum time of all requests to quantumleap of one refresh of the historical graphs, later data are taken from the cache.
+    # Maximum number of points of each series in the historical graph, depending on the display duration.
+    # Each item is (longest display duration in minutes, maximum number of points), None means the series is not downsampled.
+    history_point_budget = [(300, None), (1440, 4000), (21600, 3000), (86400, 2000)]
+    # Quantumleap aggregation period of the historical data, depending on the display duration, so that long durations are averaged by the database.
+    # Each item is (longest display duration in minutes, aggrPeriod of quantumleap), None means the raw data are requested.
+    history_aggregation_period = [(300, None), (21600, 'minute'), (86400, 'hour')]
+    history_aggregation_method = 'avg'  # aggrMethod of quantumleap for the line of aggregated data, e.g. 'avg', 'min' or 'max'
+    # aggrMethods of quantumleap (lower, upper) requested in parallel for aggregated data and drawn as a band around the line,
+    # so that short peaks stay visible on long display durations. Empty means no band.
+    history_envelope_methods = ['min', 'max']
+    # The historical graphs are drawn with WebGL (scattergl) instead of SVG if the display duration is at least history_webgl_min_minutes,
+    # or if any series of a graph has more than history_webgl_min_points points.
+    history_webgl_min_minutes = 1440
+    history_webgl_min_points = 5000
+    # The data and the figures of the historical graphs are cached per refresh period and shared by all browser sessions.
+    history_display_cache_ttl = 900  # Seconds. Maximum time an entry is kept, should not be shorter than the longest refresh interval.
+    history_display_cache_size = 64  # Maximum number of cached data and of cached figures.
+    history_full_redraw_every = 12  # On every refresh only the new points of the raw data are appended to the historical graphs, and every this many refreshes they are redrawn completely.
+    history_downsample_method = 'minmax'  # 'minmax' (keeps all peaks) or 'lttb' (Largest-Triangle-Three-Buckets), see helper_function/downsample.py
 
     # Parameters to display in historical graph
     history_values_display_param_list = {
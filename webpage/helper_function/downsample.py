@@ -0,0 +1,88 @@
+"""
+This file contains the functions for reducing the number of points of a historical time series before it is plotted.
+A long display duration (e.g. 15 or 60 days) contains far more points than a plot can show, all of them would be sent to the browser otherwise.
+Two methods are available (see history_downsample_method in helper_function/config.py):
+'minmax' keeps the minimum and the maximum of each bucket, it is fully vectorized and keeps all peaks and switching transitions.
+'lttb' is the Largest-Triangle-Three-Buckets algorithm, which keeps the visual shape of the series with fewer points.
+"""
+
+import numpy as np
+
+
+def to_seconds(data_time):
+    """
+    This function transforms an array of timestamps (datetimes or numpy datetime64) into float seconds,
+    which are needed for the calculation of the LTTB algorithm.
+    """
+    data_time = np.asarray(data_time)
+    if data_time.dtype.kind == 'M':
+        return data_time.astype('datetime64[ns]').astype(np.int64) / 1e9
+    return np.fromiter((t.timestamp() for t in data_time), dtype=float, count=len(data_time))
+
+
+def minmax_indices(data_value, max_points: int):
+    """
+    This function divides the series into max_points / 2 buckets of the same number of points,
+    and returns the sorted indices of the minimum and the maximum of each bucket, together with the first and the last point.
+    """
+    n = len(data_value)
+    n_buckets = max(max_points // 2, 1)
+    bucket_size = -(-n // n_buckets)  # ceil
+    n_buckets = -(-n // bucket_size)
+    padded = np.full(n_buckets * bucket_size, np.nan)
+    padded[:n] = data_value
+    padded = padded.reshape(n_buckets, bucket_size)
+    offset = np.arange(n_buckets) * bucket_size
+    indices = np.concatenate(([0, n - 1],
+                              offset + np.nanargmin(padded, axis=1),
+                              offset + np.nanargmax(padded, axis=1)))
+    return np.unique(indices)
+
+
+def lttb_indices(data_seconds, data_value, max_points: int):
+    """
+    This function returns the indices of the points selected by the Largest-Triangle-Three-Buckets algorithm.
+    The first and the last point are always kept, the other points are divided into max_points - 2 buckets,
+    from each bucket the point forming the largest triangle with the point selected in the previous bucket
+    and the average point of the next bucket is selected.
+    The averages of all buckets are calculated at once, only the selection is done bucket by bucket.
+    """
+    n = len(data_value)
+    edges = np.linspace(1, n - 1, max_points - 1).astype(int)
+    bucket_size = np.diff(edges)
+    mean_x = np.add.reduceat(data_seconds[:-1], edges[:-1]) / bucket_size
+    mean_y = np.add.reduceat(data_value[:-1], edges[:-1]) / bucket_size
+    # the "next bucket" of the last bucket is the last point
+    next_x = np.append(mean_x[1:], data_seconds[-1])
+    next_y = np.append(mean_y[1:], data_value[-1])
+
+    indices = np.empty(max_points, dtype=int)
+    indices[0], indices[-1] = 0, n - 1
+    selected = 0
+    for i in range(max_points - 2):
+        start, end = edges[i], edges[i + 1]
+        x_a, y_a = data_seconds[selected], data_value[selected]
+        areas = np.abs((x_a - next_x[i]) * (data_value[start:end] - y_a) -
+                       (x_a - data_seconds[start:end]) * (next_y[i] - y_a))
+        selected = start + int(np.argmax(areas))
+        indices[i + 1] = selected
+    return indices
+
+
+def downsample(data: list, max_points: int, method: str = 'minmax'):
+    """
+    This function reduces a series in the format [numpy array of timestamps, numpy array of values]
+    (e.g. the return of GetQuantumLeap.filter) to at most about max_points points, and returns it in the same format.
+    Series with fewer points, or max_points None, are returned unchanged.
+
+    parameter method: 'minmax' or 'lttb'
+    """
+    data_time, data_value = data
+    if max_points is None or len(data_value) <= max_points or max_points < 3:
+        return data
+    data_value = np.asarray(data_value, dtype=float)
+    if method == 'lttb':
+        indices = lttb_indices(to_seconds(data_time), data_value, max_points)
+    else:
+        indices = minmax_indices(data_value, max_points)
+    return [np.asarray(data_time)[indices], data_value[indices]]
@@ -0,0 +1,310 @@
+"""
+This file contains the class HistoryFigureBuilder.
+HistoryFigureBuilder assembles the four figures of the historical graphs (tabs of the history section in index.py)
+directly as dicts in the json format of plotly, instead of building them with make_subplots, go.Scatter, add_trace and add_annotation.
+The graph objects of plotly validate every property and copy every array on each call, which takes most of the time of a refresh
+when the series are long, while DASH accepts the figure of a dcc.Graph as a plain dict as well.
+"""
+
+import numpy as np
+import plotly.io as pio
+from helper_function.config import WebpageConfig
+from helper_function.timeseries_store import to_plot_time
+from helper_function.organize_data import GetQuantumLeap
+
+
+class HistoryFigureBuilder:
+    """
+    This class builds the figures of the historical graphs from the return of the function get_history of GetData.
+    Illustration of self.tabs, the definition of each figure:
+    {
+        'air': {
+            'params': ['Air_Inlet_Temperature', 'Air_Inlet_Humidity'],
+            'secondary_y': 'Humidity',  # parameters containing this text are shown on the right y axis, None for no right y axis
+            'y_titles': ['Temperature', 'Humidity'],  # titles of the left and the right y axis
+            'trace_name': 'system_param'  # 'system_param' for e.g. 'PLC_Air_Inlet_Temperature', 'system' for e.g. 'PLC' in the color of the system
+        }
+    }
+    The layout is the same as the one created by make_subplots, including the default template of plotly,
+    so that the figures look the same as before.
+
+    Long series are drawn with WebGL ('scattergl') instead of SVG ('scatter'), see the function get_trace_type.
+    Aggregated series are drawn with the band between their config.history_envelope_methods (e.g. min and max), see the function build_band.
+
+    Only the figure of the opened tab is built (see the function build_figure).
+    On a refresh of the raw data, only the points added since the last refresh are sent to the browser and appended via the extendData of the dcc.Graph,
+    see the function build_extend_data. Aggregated or downsampled series are always sent completely, see the function build_incremental_update. The browser keeps the state of its figure in a dcc.Store ('history-graph-state'),
+    which is built by the function build_graph_state.
+    """
+    systems = ['plc', 'ed', 'lcgw']
+    system_color = {'plc': 'rgb(255, 0, 0)', 'ed': 'rgb(0, 255, 0)', 'lcgw': 'rgb(0, 0, 255)'}
+    # the little legend boxes with the name of each system, y is relative between the minimum and the maximum of the data
+    annotation_template = {
+        'xref': 'x', 'yref': 'y', 'font': {'family': 'Courier New, monospace', 'size': 16, 'color': 'rgb(0, 0, 0)'},
+        'align': 'center', 'borderwidth': 2, 'borderpad': 4, 'width': 50
+    }
+    system_annotations = [
+        {'text': 'PLC', 'bgcolor': 'rgb(250, 0, 0)', 'opacity': 0.7, 'relative_y': 1.0},
+        {'text': 'ED', 'bgcolor': 'rgb(0, 250, 0)', 'opacity': 0.7, 'relative_y': 0.9},
+        {'text': 'LCGW', 'bgcolor': 'rgb(139, 161, 231)', 'opacity': 0.8, 'relative_y': 0.8}
+    ]
+
+    def __init__(self, config: WebpageConfig):
+        self.config = config
+        self.tabs = {
+            'air': {
+                'params': ['Air_Inlet_Temperature', 'Air_Inlet_Humidity', 'Air_Outlet_Temperature', 'Air_Outlet_Humidity'],
+                'secondary_y': 'Humidity',
+                'y_titles': ['Temperature', 'Humidity'],
+                'trace_name': 'system_param'
+            },
+            'water': {
+                'params': ['Return_Temperature_Primary', 'Supply_Temperature_Primary', 'Return_Temperature', 'Supply_Temperature'],
+                'secondary_y': None,
+                'y_titles': [None, None],
+                'trace_name': 'system_param'
+            },
+            'voc': {
+                'params': ['Air_Outlet_VOC'],
+                'secondary_y': None,
+                'y_titles': [None, None],
+                'trace_name': 'system'
+            },
+            'valve': {
+                'params': ['Three_Way_Valve'],
+                'secondary_y': None,
+                'y_titles': [None, None],
+                'trace_name': 'system'
+            }
+        }
+        self.template = pio.templates[pio.templates.default].to_plotly_json()  # converted only once
+
+    def build_layout(self, tab: str):
+        """
+        This function returns the layout of a figure without annotations and shapes, the same as make_subplots returns.
+        """
+        y_titles = self.tabs[tab]['y_titles']
+        if self.tabs[tab]['secondary_y'] is None:
+            layout = {
+                'xaxis': {'anchor': 'y', 'domain': [0.0, 1.0]},
+                'yaxis': {'anchor': 'x', 'domain': [0.0, 1.0]}
+            }
+        else:
+            layout = {
+                'xaxis': {'anchor': 'y', 'domain': [0.0, 0.94]},
+                'yaxis': {'anchor': 'x', 'domain': [0.0, 1.0]},
+                'yaxis2': {'anchor': 'x', 'overlaying': 'y', 'side': 'right'}
+            }
+        for axis, title in zip(['yaxis', 'yaxis2'], y_titles):
+            if title is not None:
+                layout[axis]['title'] = {'text': title}
+        layout['template'] = self.template
+        return layout
+
+    def get_trace_type(self, tab: str, history: dict, minutes: int):
+        """
+        This function returns the trace type of all series of a figure: 'scattergl' if the display duration is at least
+        config.history_webgl_min_minutes, or if any series of the figure has more than config.history_webgl_min_points points,
+        otherwise 'scatter'. All series of a figure get the same type, so that their order of drawing does not change.
+        """
+        if minutes >= self.config.history_webgl_min_minutes:
+            return 'scattergl'
+        for param in self.tabs[tab]['params']:
+            for system in self.systems:
+                if param in history.get(system, {}) and len(history[system][param][0]) > self.config.history_webgl_min_points:
+                    return 'scattergl'
+        return 'scatter'
+
+    def get_trace_keys(self, tab: str, history: dict):
+        """
+        This function returns the series shown in a figure, in the order of the traces.
+        Example return: [['plc', 'Air_Outlet_VOC'], ['lcgw', 'Air_Outlet_VOC']]
+        """
+        return [[system, param] for param in self.tabs[tab]['params'] for system in self.systems if param in history.get(system, {})]
+
+    def build_traces(self, tab: str, history: dict, trace_type: str = 'scatter', stale=()):
+        """
+        This function returns the traces of a figure, and the range of the data for the position of the annotations.
+        The series in stale ((system, param) taken from the cache because quantumleap did not answer in time) are dotted and named '... (stale)'.
+        The band of a series, if any, is drawn as two traces before the trace of the series, so that the traces of the series keep their order
+        only if there are no bands, which is the case for the raw data updated via extendData (see the function build_incremental_update).
+        Example return: ([{'type': 'scatter', 'x': ..., 'y': ..., 'name': 'PLC'}], np.datetime64('2021-01-02T08:00:00'), 10.0, 30.0)
+        """
+        definition = self.tabs[tab]
+        colorway = self.template['layout']['colorway']
+        traces = []
+        x_min, y_min, y_max = None, float('Inf'), -float('Inf')
+        for index, (system, param) in enumerate(self.get_trace_keys(tab, history)):
+            data_time, data_value = history[system][param]
+            trace = {'type': trace_type, 'x': to_plot_time(data_time), 'y': data_value}
+            # the colors of the colorway are given explicitly, the traces of the bands would take the next colors of the colorway otherwise
+            if definition['trace_name'] == 'system_param':
+                trace['name'] = '%s_%s' % (system.upper(), param)
+                trace['line'] = {'color': colorway[index % len(colorway)]}
+            else:
+                trace['name'] = system.upper()
+                trace['line'] = {'color': self.system_color[system]}
+            if definition['secondary_y'] is not None:
+                trace.update({'xaxis': 'x', 'yaxis': 'y2' if definition['secondary_y'] in param else 'y'})
+            band = self.build_band(history[system], param, trace, trace['line']['color'])
+            if band:
+                trace['legendgroup'] = trace['name']
+                traces += band
+            if (system, param) in stale:
+                trace['name'] += ' (stale)'
+                trace['line'] = dict(trace['line'], dash='dot')
+            traces.append(trace)
+            if len(data_time) > 0:  # the data may be empty when something's wrong during the getting data process from the quantumleap
+                x_min = data_time[0] if x_min is None else min(x_min, data_time[0])
+                y_min = min(y_min, float(np.nanmin(data_value)))
+                y_max = max(y_max, float(np.nanmax(data_value)))
+        return traces, x_min, y_min, y_max
+
+    def build_band(self, system_history: dict, param: str, trace: dict, color: str):
+        """
+        This function returns the two traces of the band of a series between its lower and upper aggregation (config.history_envelope_methods),
+        the upper one filled down to the lower one. An empty list is returned if the data contain no band, e.g. for the raw data.
+        The traces of the band are in the legend group of the series, so that they are hidden together with it.
+
+        parameter system_history: the data of one control system, e.g. the return of the function get_history of GetData for 'plc'
+        parameter trace: the trace of the series, the band gets its type and y axis
+        """
+        names = [GetQuantumLeap.get_envelope_name(param, aggr_method) for aggr_method in self.config.history_envelope_methods]
+        if len(names) != 2 or any(name not in system_history for name in names):
+            return []
+        band = []
+        for name in names:
+            data_time, data_value = system_history[name]
+            band_trace = {'type': trace['type'], 'x': to_plot_time(data_time), 'y': data_value, 'mode': 'lines',
+                          'line': {'width': 0, 'color': color}, 'hoverinfo': 'skip', 'showlegend': False, 'legendgroup': trace['name']}
+            if 'yaxis' in trace:
+                band_trace.update({'xaxis': trace['xaxis'], 'yaxis': trace['yaxis']})
+            band.append(band_trace)
+        band[1].update({'fill': 'tonexty', 'fillcolor': self.get_band_color(color)})
+        return band
+
+    @staticmethod
+    def get_band_color(color: str, opacity: float = 0.2):
+        """
+        This function returns a color of plotly ('#636efa' or 'rgb(255, 0, 0)') with the given opacity, for the fill of a band.
+        Example: get_band_color('rgb(255, 0, 0)') -> 'rgba(255, 0, 0, 0.2)'
+        """
+        if color.startswith('#'):
+            rgb = [int(color[i:i + 2], 16) for i in (1, 3, 5)]
+        else:
+            rgb = [int(float(value)) for value in color[color.index('(') + 1:color.index(')')].split(',')[:3]]
+        return 'rgba(%d, %d, %d, %s)' % (rgb[0], rgb[1], rgb[2], opacity)
+
+    def build_annotations(self, x_min, y_min: float, y_max: float):
+        """
+        This function returns the little legend boxes saying 'PLC', 'ED' and 'LCGW' at the beginning of the data.
+        """
+        if x_min is None or not y_max > y_min:  # filter out the case when there is no data
+            return []
+        x = to_plot_time(x_min).item()
+        return [
+            dict(self.annotation_template, x=x, y=y_min + annotation['relative_y'] * (y_max - y_min),
+                 text=annotation['text'], bgcolor=annotation['bgcolor'], opacity=annotation['opacity'])
+            for annotation in self.system_annotations
+        ]
+
+    def build_figure(self, tab: str, history: dict, shapes: list, minutes: int, stale=()):
+        """
+        This function returns one figure as a dict, which can be returned by a call back function as the figure of a dcc.Graph.
+
+        parameter tab: 'air', 'water', 'voc' or 'valve', the value of the dcc.Tab in assets/views/display_widgets.py
+        parameter history: the return of the function get_history of GetData
+        parameter shapes: the background of the control systems, see helper_function/background_bands.py
+        parameter minutes: the display duration
+        parameter stale: the series taken from the cache, see the parameter stale of the function get_history of GetData
+        """
+        traces, x_min, y_min, y_max = self.build_traces(tab, history, self.get_trace_type(tab, history, minutes), stale)
+        layout = self.build_layout(tab)
+        layout['annotations'] = self.build_annotations(x_min, y_min, y_max)
+        layout['shapes'] = shapes
+        return {'data': traces, 'layout': layout}
+
+    def build_graph_state(self, history: dict, shapes: list, minutes: int, system: str, tabs: list = None, stale=()):
+        """
+        This function returns the state of the figures of the given tabs (all tabs by default) in the browser after they are updated with the given data,
+        it is kept in the dcc.Store 'history-graph-state' and compared on the next refresh.
+        Illustration of returned data:
+        {
+            'minutes': 60,
+            'system': 'ALL',
+            'shapes': 3,  # number of background shapes
+            'refresh_count': 0,  # number of incremental updates since the last full redraw
+            'tabs': {
+                'voc': {
+                    'trace_keys': [['plc', 'Air_Outlet_VOC'], ['lcgw', 'Air_Outlet_VOC']],
+                    'trace_type': 'scatter',
+                    'last_times': ['2021-01-02T08:00:00.000000000', None],  # newest timestamp of each trace, None for an empty trace
+                    'stale': False  # whether any trace shows data from the cache, see the function build_traces
+                }
+            }
+        }
+        """
+        tab_states = {}
+        for tab in (tabs if tabs is not None else self.tabs):
+            trace_keys = self.get_trace_keys(tab, history)
+            tab_states[tab] = {
+                'trace_keys': trace_keys,
+                'trace_type': self.get_trace_type(tab, history, minutes),
+                'last_times': [np.datetime_as_string(history[system][param][0][-1]) if len(history[system][param][0]) > 0 else None
+                               for system, param in trace_keys],
+                'stale': any((system, param) in stale for system, param in trace_keys)
+            }
+        return {'minutes': minutes, 'system': system, 'shapes': len(shapes), 'refresh_count': 0, 'tabs': tab_states}
+
+    def build_extend_data(self, tab: str, history: dict, tab_state: dict):
+        """
+        This function returns the extendData of the dcc.Graph of a tab, which appends the points newer than tab_state['last_times'],
+        and keeps as many points of each trace as the series has from the beginning of the display duration on,
+        so that the points older than the display duration are dropped by the browser.
+        Illustration of returned data:
+        [
+            {'x': [['2021-01-02T08:01:00.000']], 'y': [[21.5]]},  # new points of each updated trace
+            [0],  # index of each updated trace
+            {'x': [120], 'y': [120]}  # number of points each updated trace keeps
+        ]
+        None is returned if there are no new points.
+        """
+        new_x, new_y, trace_indices, max_points = [], [], [], []
+        for index, ((system, param), last_time) in enumerate(zip(tab_state['trace_keys'], tab_state['last_times'])):
+            data_time, data_value = history[system][param]
+            start = 0 if last_time is None else np.searchsorted(data_time, np.datetime64(last_time, 'ns'), side='right')
+            if start < len(data_time):
+                new_x.append(to_plot_time(data_time[start:]))
+                new_y.append(data_value[start:])
+                trace_indices.append(index)
+                max_points.append(len(data_time))
+        if not trace_indices:
+            return None
+        return [{'x': new_x, 'y': new_y}, trace_indices, {'x': max_points, 'y': max_points}]
+
+    def build_incremental_update(self, tab: str, history: dict, shapes: list, minutes: int, system: str, graph_state: dict, stale=(),
+                                 raw: bool = True):
+        """
+        This function returns the extendData of the figure of a tab and the new state of the figure,
+        or None if the figure in the browser has to be redrawn completely, which is the case when
+        - the series are not the raw data (raw is False): the last bucket of aggregated data changes while it is incomplete,
+          and downsampling chooses different points of the same range on every refresh, so the points in the browser cannot be extended
+        - the browser has no figure of this tab yet, or the display duration or the displayed control system have changed
+        - the series shown in the figure or their trace type have changed
+        - the background of the control systems has changed
+        - the figure shows or would show stale series (see the function build_traces), so that they are replaced as soon as the data arrive
+        - the figure has been updated config.history_full_redraw_every times incrementally,
+          so that the background and the legend boxes move with the display duration
+        """
+        if not raw or not graph_state or tab not in graph_state['tabs'] or graph_state['minutes'] != minutes or graph_state['system'] != system:
+            return None
+        if graph_state['shapes'] != len(shapes) or graph_state['refresh_count'] + 1 >= self.config.history_full_redraw_every:
+            return None
+        new_state = self.build_graph_state(history, shapes, minutes, system, [tab], stale)
+        if new_state['tabs'][tab]['trace_keys'] != graph_state['tabs'][tab]['trace_keys'] \
+                or new_state['tabs'][tab]['trace_type'] != graph_state['tabs'][tab]['trace_type']:
+            return None
+        if new_state['tabs'][tab]['stale'] or graph_state['tabs'][tab].get('stale'):
+            return None
+        new_state['refresh_count'] = graph_state['refresh_count'] + 1
+        return self.build_extend_data(tab, history, graph_state['tabs'][tab]), new_state
@@ -0,0 +1,232 @@
+"""
+This file contains the class HistoryCache.
+HistoryCache keeps the historical data which have already been fetched from quantumleap in the memory of the server process,
+so that on a refresh of the dashboard only the data newer than the last request have to be requested from quantumleap.
+Each series is stored in a RingSeries (helper_function/timeseries_store.py) with a fixed maximum memory.
+If a cache directory is given, every series is also saved there as a numpy file, and loaded again when the server restarts,
+so that after a restart only the data since the last save have to be requested from quantumleap.
+"""
+
+import os
+import re
+import time
+import atexit
+import tempfile
+import threading
+from datetime import datetime, timedelta, timezone
+import numpy as np
+from helper_function.timeseries_store import RingSeries
+
+
+class HistoryCache:
+    """
+    This class is an in-process cache of historical time series, it is used by GetData and GetQuantumLeap.
+    Each series is identified by a key (system, entity, attribute, aggregation period) and stored in a RingSeries
+    (timestamps as datetime64[ns] in UTC, values as float32). The aggregation period is None for the raw data.
+    Illustration of self.series:
+    {
+        ('plc', 'sensor:Multisensor:Air_Inlet_PLC', 'measured_Temperature', None):
+            {
+                'covered_from': np.datetime64('2021-01-01T08:00:00'),
+                'fetched_until': np.datetime64('2021-01-02T08:01:30'),
+                'series': RingSeries
+            }
+    }
+    'covered_from' is the earliest time from which the data of this series have been requested from quantumleap,
+    any request starting before 'covered_from' cannot be answered by the cache and leads to a full request.
+    'fetched_until' is the to_date of the last successful request, the next request starts from there (see the function get_fetch_start),
+    also if the series has no data or its last data point is old, e.g. an attribute which is rarely sent.
+    If a series reaches its maximum memory, the oldest data are overwritten, then the beginning of a long display duration may be missing.
+
+    If cache_dir is given, the changed series are saved to cache_dir at most every save_interval seconds and when the process exits,
+    one file per series, see the function save. The files in cache_dir are loaded when the HistoryCache is created.
+
+    parameter max_age_minutes: data older than this are dropped from the cache, should not be shorter than the longest display duration
+    parameter max_bytes_per_series: maximum memory of each series
+    parameter cache_dir: directory of the saved series, None means the cache is only kept in memory
+    parameter save_interval: seconds, minimum time between two saves
+    """
+    def __init__(self, max_age_minutes: int, max_bytes_per_series: int, cache_dir: str = None, save_interval: float = 60):
+        self.max_age = np.timedelta64(timedelta(minutes=max_age_minutes))
+        self.max_capacity = RingSeries.capacity_from_bytes(max_bytes_per_series)
+        self.lock = threading.Lock()
+        self.series = {}
+        self.cache_dir = cache_dir
+        self.save_interval = save_interval
+        self.save_lock = threading.Lock()
+        self.last_save = time.monotonic()
+        self.changed_keys = set()  # keys of the series changed since the last save
+        if self.cache_dir:
+            self.load()
+            atexit.register(self.save)
+
+    @staticmethod
+    def parse_date(date_str: str):
+        """
+        This function transforms the fromDate_str used by GetData (UTC, e.g. '2021-01-31T08:00:00') into a numpy datetime64[ns],
+        so that it can be compared with the cached timestamps.
+        """
+        return np.datetime64(datetime.strptime(date_str, '%Y-%m-%dT%H:%M:%S'), 'ns')
+
+    @staticmethod
+    def format_date(date):
+        """
+        This function transforms a numpy datetime64 (UTC) into the format of the from_date of quantumleap (UTC, with microseconds).
+        """
+        return np.datetime_as_string(np.datetime64(date, 'us'))
+
+    # numpy units of the aggrPeriod of quantumleap, used to find the beginning of the last bucket of aggregated data
+    aggr_period_units = {'year': 'Y', 'month': 'M', 'day': 'D', 'hour': 'h', 'minute': 'm', 'second': 's'}
+
+    @staticmethod
+    def now():
+        """
+        This function returns the current UTC time as numpy datetime64[ns].
+        """
+        return np.datetime64(datetime.now(timezone.utc).replace(tzinfo=None), 'ns')
+
+    def get_fetch_start(self, key: tuple, from_date):
+        """
+        This function returns from when the data of a series have to be requested from quantumleap, and whether the request is a full request.
+        If the cache already covers from_date, only the data from 'fetched_until' on are needed (the from_date of quantumleap is inclusive,
+        a data point at 'fetched_until' is requested again and replaced by the function update).
+        For aggregated data, the request starts from the beginning of the bucket containing 'fetched_until',
+        so that this bucket, which was incomplete at the last request, is updated.
+        Example return: (np.datetime64('2021-01-02T08:01:30'), False)
+        """
+        with self.lock:
+            entry = self.series.get(key)
+            if entry is None or from_date < entry['covered_from']:
+                return from_date, True
+            fetched_until = entry['fetched_until']
+        unit = self.aggr_period_units.get(key[3])
+        if unit is not None:
+            fetched_until = np.datetime64(np.datetime64(fetched_until, unit), 'ns')
+        return max(fetched_until, entry['covered_from']), False
+
+    def get_fetch_start_group(self, keys: list, from_date):
+        """
+        This function does the same as the function get_fetch_start for several series which are requested from quantumleap in one request,
+        e.g. all attributes of one entity. The request has to start from the earliest fetch start of all series,
+        which is normally the same for all of them, because they are updated by the same requests.
+        Example return: (np.datetime64('2021-01-02T08:01:00'), {key1: False, key2: True})
+        """
+        fetch_starts = {key: self.get_fetch_start(key, from_date) for key in keys}
+        fetch_start = min(start for start, _ in fetch_starts.values())
+        return fetch_start, {key: full_request for key, (_, full_request) in fetch_starts.items()}
+
+    def update(self, key: tuple, fetch_start, full_request: bool, data: list, fetched_until):
+        """
+        This function adds the data returned by quantumleap to the cache.
+        For a full request the cached series is replaced, otherwise the cached data from the first new timestamp on are replaced by the new data.
+        Afterwards the data older than self.max_age are dropped.
+        It has to be called for every series of a successful request, also if quantumleap returned no data for it, so that 'fetched_until' is moved on.
+
+        parameter data: [numpy array of timestamps, numpy array of values], e.g. the return of GetQuantumLeap.filter_values
+        parameter fetched_until: to_date of the request, as numpy datetime64[ns]
+        """
+        new_time, new_value = data
+        with self.lock:
+            entry = self.series.get(key)
+            if full_request or entry is None:
+                entry = {'covered_from': fetch_start, 'fetched_until': fetched_until, 'series': RingSeries(self.max_capacity)}
+            elif len(new_time) > 0:
+                entry['series'].drop_from(new_time[0])
+            entry['fetched_until'] = max(entry['fetched_until'], fetched_until)
+            entry['series'].append(new_time, new_value)
+
+            # drop the data that will never be displayed
+            oldest = self.now() - self.max_age
+            if entry['covered_from'] < oldest:
+                entry['covered_from'] = oldest
+                entry['series'].drop_before(oldest)
+            self.series[key] = entry
+            self.changed_keys.add(key)
+        if self.cache_dir and time.monotonic() - self.last_save > self.save_interval:
+            self.save()
+
+    def get(self, key: tuple, from_date):
+        """
+        This function returns the cached data of a series from from_date on, in the format [numpy array of timestamps, numpy array of values].
+        The arrays are copies, so that they can be kept (e.g. in the history_display_cache of index.py)
+        while later updates overwrite the ring buffer of the series, see RingSeries.
+        If nothing is cached, two empty arrays are returned.
+        """
+        with self.lock:
+            entry = self.series.get(key)
+            if entry is None:
+                return [np.array([], dtype='datetime64[ns]'), np.array([], dtype=np.float32)]
+            data_time, data_value = entry['series'].get_range(from_date)
+            return [data_time.copy(), data_value.copy()]
+
+    def file_path(self, key: tuple):
+        """
+        This function returns the path of the file of a series in self.cache_dir.
+        Example: ('plc', 'sensor:Multisensor:Air_Inlet_PLC', 'measured_Temperature', None)
+        -> cache_dir/plc__sensor_Multisensor_Air_Inlet_PLC__measured_Temperature__raw.npz
+        """
+        system, entity, attribute, aggr_period = key
+        name = '__'.join([system, entity, attribute, aggr_period or 'raw'])
+        return os.path.join(self.cache_dir, re.sub(r'[^A-Za-z0-9_.-]', '_', name) + '.npz')
+
+    def save(self):
+        """
+        This function saves the series changed since the last save to self.cache_dir.
+        Each file contains the key, 'covered_from', 'fetched_until', the timestamps (int64 nanoseconds) and the values (float32) of one series.
+        The file is first written to a temporary file and then renamed, so that a crash while saving never leaves a broken file.
+        Only one thread saves at a time, the other threads do not wait for it.
+        """
+        if not self.save_lock.acquire(blocking=False):
+            return
+        try:
+            with self.lock:
+                self.last_save = time.monotonic()
+                changed = {}
+                for key in self.changed_keys:
+                    data_time, data_value = self.series[key]['series'].get_view()
+                    changed[key] = (self.series[key]['covered_from'], self.series[key]['fetched_until'], data_time.copy(), data_value.copy())
+                self.changed_keys = set()
+            os.makedirs(self.cache_dir, exist_ok=True)
+            for key, (covered_from, fetched_until, data_time, data_value) in changed.items():
+                path = self.file_path(key)
+                try:
+                    file, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+                    with os.fdopen(file, 'wb') as tmp_file:
+                        np.savez(tmp_file, key=np.array([str(item) if item is not None else '' for item in key]),
+                                 covered_from=np.array(covered_from, dtype='datetime64[ns]').view('int64'),
+                                 fetched_until=np.array(fetched_until, dtype='datetime64[ns]').view('int64'),
+                                 times=data_time.view('int64'), values=data_value)
+                    os.replace(tmp_path, path)
+                except Exception as error:
+                    print('in HistoryCache.save, error when saving', path, 'error message:\n', error)
+        finally:
+            self.save_lock.release()
+
+    def load(self):
+        """
+        This function loads all series saved in self.cache_dir, the data older than self.max_age are dropped.
+        Broken files are skipped, these series are then requested from quantumleap again.
+        Files saved without 'fetched_until' continue from their last data point.
+        """
+        if not os.path.isdir(self.cache_dir):
+            return
+        oldest = self.now() - self.max_age
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith('.npz'):
+                continue
+            try:
+                with np.load(os.path.join(self.cache_dir, name)) as saved:
+                    key = tuple(item or None for item in saved['key'].tolist())
+                    covered_from = saved['covered_from'].view('datetime64[ns]')[()]
+                    series = RingSeries(self.max_capacity)
+                    series.append(saved['times'].view('datetime64[ns]'), saved['values'])
+                    if 'fetched_until' in saved.files:
+                        fetched_until = saved['fetched_until'].view('datetime64[ns]')[()]
+                    else:
+                        fetched_until = series.last_time() if series.last_time() is not None else covered_from
+            except Exception as error:
+                print('in HistoryCache.load, error when loading', name, 'error message:\n', error)
+                continue
+            series.drop_before(oldest)
+            with self.lock:
+                self.series[key] = {'covered_from': max(covered_from, oldest), 'fetched_until': fetched_until, 'series': series}
@@ -0,0 +1,147 @@
+"""
+This file contains the class DailyTileCache.
+The aggregated historical data of a day which has passed never change, but each change of the display duration (e.g. from 7 to 15 days)
+would request the whole range from quantumleap again, because HistoryCache (helper_function/history_cache.py) keeps one continuous range per series.
+DailyTileCache keeps the data of every completed UTC day of every series as a separate tile, which is requested from quantumleap only once,
+and kept in memory and in the cache directory. Only the current day is requested by GetQuantumLeap via the HistoryCache.
+"""
+
+import os
+import re
+import tempfile
+import threading
+from collections import OrderedDict
+from datetime import timedelta
+import numpy as np
+from helper_function.history_cache import HistoryCache
+
+
+class DailyTileCache:
+    """
+    This class keeps the tiles, each tile contains the data of one series on one UTC day.
+    The key of a tile is the key of the series in the HistoryCache and the day.
+    Illustration of self.tiles:
+    {
+        ('plc', 'sensor:Multisensor:Air_Inlet_PLC', 'measured_Temperature', 'hour', np.datetime64('2021-01-02')):
+            [
+                np.array(['2021-01-02T00:00:00', '2021-01-02T01:00:00'], dtype='datetime64[ns]'),
+                np.array([20.1, 20.3], dtype=np.float32)
+            ]
+    }
+    A day is complete settle_minutes after its end, so that data arriving late at quantumleap are not missed.
+    If there are more than max_tiles tiles in memory, the least recently used one is dropped from memory, and loaded again from cache_dir when needed.
+
+    parameter max_tiles: maximum number of tiles in memory
+    parameter cache_dir: directory of the saved tiles, None means the tiles are only kept in memory
+    parameter settle_minutes: minutes after the end of a day from which on its tile is requested and kept
+    """
+    def __init__(self, max_tiles: int, cache_dir: str = None, settle_minutes: int = 10):
+        self.max_tiles = max_tiles
+        self.cache_dir = cache_dir
+        self.settle = np.timedelta64(timedelta(minutes=settle_minutes))
+        self.lock = threading.Lock()
+        self.tiles = OrderedDict()
+
+    def get_complete_until(self):
+        """
+        This function returns the first day which is not complete yet, as numpy datetime64[D]. The days before it are kept as tiles.
+        """
+        return np.datetime64(HistoryCache.now() - self.settle, 'D')
+
+    def get_until(self, from_date, aggr_period):
+        """
+        This function returns until which day (exclusive, numpy datetime64[D]) the data from from_date on are taken from the tiles,
+        or None if no tiles are used: only aggregated data are kept as tiles, the raw data of a day are too many for a short display duration.
+        """
+        if aggr_period is None:
+            return None
+        until = self.get_complete_until()
+        return until if from_date < until else None
+
+    @staticmethod
+    def get_days(from_date, until):
+        """
+        This function returns the days from the day of from_date until the day before until, as numpy datetime64[D].
+        Example: get_days(np.datetime64('2021-01-01T08:00'), np.datetime64('2021-01-03')) -> ['2021-01-01', '2021-01-02']
+        """
+        return np.arange(np.datetime64(from_date, 'D'), np.datetime64(until, 'D'), dtype='datetime64[D]')
+
+    @staticmethod
+    def get_day_range(day):
+        """
+        This function returns the first and the last requested timestamp of a day, as numpy datetime64[ns],
+        the last one is one microsecond before the next day, the precision of the from_date and to_date of quantumleap.
+        """
+        start = np.datetime64(day, 'ns')
+        return start, start + np.timedelta64(1, 'D') - np.timedelta64(1, 'us')
+
+    @staticmethod
+    def join(pieces: list, from_date, to_date=None):
+        """
+        This function joins the data of consecutive tiles (and of the current day), each as [timestamps, values],
+        and returns the data from from_date until to_date in the same format.
+        """
+        data_time = np.concatenate([piece[0] for piece in pieces]) if pieces else np.array([], dtype='datetime64[ns]')
+        data_value = np.concatenate([piece[1] for piece in pieces]) if pieces else np.array([], dtype=np.float32)
+        select_index = data_time >= from_date
+        if to_date is not None:
+            select_index &= data_time <= to_date
+        return [data_time[select_index], data_value[select_index]]
+
+    def file_path(self, key: tuple):
+        """
+        This function returns the path of the file of a tile in self.cache_dir, the same as HistoryCache.file_path with the day.
+        Example: ('plc', 'sensor:Multisensor:Air_Inlet_PLC', 'measured_Temperature', 'hour', np.datetime64('2021-01-02'))
+        -> cache_dir/2021-01-02/plc__sensor_Multisensor_Air_Inlet_PLC__measured_Temperature__hour.npz
+        """
+        system, entity, attribute, aggr_period, day = key
+        name = '__'.join([system, entity, attribute, aggr_period or 'raw'])
+        return os.path.join(self.cache_dir, str(day), re.sub(r'[^A-Za-z0-9_.-]', '_', name) + '.npz')
+
+    def get(self, key: tuple):
+        """
+        This function returns a tile as [timestamps, values], or None if it has never been requested.
+        """
+        with self.lock:
+            tile = self.tiles.get(key)
+            if tile is not None:
+                self.tiles.move_to_end(key)
+                return tile
+        if not self.cache_dir:
+            return None
+        try:
+            with np.load(self.file_path(key)) as saved:
+                tile = [saved['times'].view('datetime64[ns]'), saved['values']]
+        except FileNotFoundError:
+            return None
+        except Exception as error:
+            print('in DailyTileCache.get, error when loading', self.file_path(key), 'error message:\n', error)
+            return None
+        self.put_memory(key, tile)
+        return tile
+
+    def put(self, key: tuple, tile: list):
+        """
+        This function keeps a tile given as [timestamps, values], and saves it to self.cache_dir.
+        The file is first written to a temporary file and then renamed, the same as HistoryCache.save does.
+        """
+        tile = [np.asarray(tile[0], dtype='datetime64[ns]'), np.asarray(tile[1], dtype=np.float32)]
+        self.put_memory(key, tile)
+        if not self.cache_dir:
+            return
+        path = self.file_path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            file, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+            with os.fdopen(file, 'wb') as tmp_file:
+                np.savez(tmp_file, times=tile[0].view('int64'), values=tile[1])
+            os.replace(tmp_path, path)
+        except Exception as error:
+            print('in DailyTileCache.put, error when saving', path, 'error message:\n', error)
+
+    def put_memory(self, key: tuple, tile: list):
+        with self.lock:
+            self.tiles[key] = tile
+            self.tiles.move_to_end(key)
+            while len(self.tiles) > self.max_tiles:
+                self.tiles.popitem(last=False)
@@ -1,7 +1,10 @@
 """
 This file contains two classes: GetData and GetQuantumLeap.
 GetData uses FiLiP to get data and send commands, and then return the organized results.
-GetQuantumLeap inherit class Thread and uses FiLiP to get historical data of different entities/attributes in parallel, and return the organized results.
+GetQuantumLeap uses FiLiP to get historical data of all attributes of one entity, GetData runs many of them in parallel in a thread pool, and return the organized results.
+The historical data are kept in a HistoryCache (helper_function/history_cache.py), so that only new data are requested from quantumleap.
+All requests have a timeout, and fail at once while orion or quantumleap is down (helper_function/circuit_breaker.py),
+so that the fallback values (return_null_orion, the data in the HistoryCache) are returned without waiting.
 
 Currently, a http request that uses an expired token or uses an incorrect url
 lead to the same error message and error code. When one day the error message
@@ -11,14 +14,17 @@ in the def __init__ of class GetData accordingly.
 Please also comment the codes tagged as "temporary" and uncomment the codes tagged as "hanling expired token".
 """
 
-from helper_function.keycloak_python import KeycloakPython
+from helper_function.token_manager import get_token_manager
 from helper_function.config import WebpageConfig
-import time
-from datetime import datetime
-from datetime import timedelta
+from helper_function.history_cache import HistoryCache
+from helper_function.history_tiles import DailyTileCache
+from helper_function.switch_history import SwitchSegments
+from helper_function.timeseries_store import to_datetime64
+from helper_function.downsample import downsample
+from helper_function.circuit_breaker import CircuitBreaker, BackendSession
+from helper_function.single_flight import SingleFlight
 import numpy as np
-import requests
-from threading import Thread
+from concurrent.futures import ThreadPoolExecutor, wait
 from filip.models.base import FiwareHeader
 from filip.clients.ngsi_v2 import ContextBrokerClient, QuantumLeapClient
 
@@ -34,72 +40,112 @@ class GetData:
         self.service = 'iotteststand'
         self.url_quantum_leap = 'http://' + self.config.HOST_IOTSERVER + '/quantum_teststand/'
         self.url_orion = 'http://' + self.config.HOST_IOTSERVER + '/orion_teststand/'
-        self.requests_session_cb = requests.Session()
-        self.requests_session_ql = requests.Session()
-        self.ql_client = QuantumLeapClient(session=self.requests_session_cb, url=self.url_quantum_leap, fiware_header=FiwareHeader(service=self.service))
-        self.cb_client = ContextBrokerClient(session=self.requests_session_ql, url=self.url_orion, fiware_header=FiwareHeader(service=self.service))
-        self.cb_client.headers.update({'secret': str(datetime.now().microsecond)})
-        self.cb_structure = self.construct_cb_structure()
+        # every request has a timeout, and fails at once while its backend is down, see helper_function/circuit_breaker.py
+        self.orion_circuit_breaker = CircuitBreaker('orion', self.config.circuit_failure_threshold, self.config.circuit_probe_interval,
+                                                    probe=lambda: self.requests_session_cb.probe(self.url_orion + 'version'))
+        self.quantumleap_circuit_breaker = CircuitBreaker('quantumleap', self.config.circuit_failure_threshold, self.config.circuit_probe_interval,
+                                                          probe=lambda: self.requests_session_ql.probe(self.url_quantum_leap + 'version'))
+        self.requests_session_cb = BackendSession(self.config.orion_timeout, self.orion_circuit_breaker)
+        self.requests_session_ql = BackendSession(self.config.quantumleap_timeout, self.quantumleap_circuit_breaker)
+        self.extraction_plan = self.construct_extraction_plan()
+        self.history_structure = self.construct_history_structure()
         self.current_values_display_param_list = {system: list(self.config.data_structure[system].keys()) for system in self.config.data_structure}
-        self.kp = KeycloakPython()
-        self.token = ''
-        self.token_expire_time = 0
+        self.history_cache = HistoryCache(self.config.history_cache_max_age, self.config.history_cache_max_bytes_per_series,
+                                          self.config.history_cache_dir, self.config.history_cache_save_interval)
+        self.tile_cache = DailyTileCache(self.config.history_tile_cache_size, self.config.history_tile_dir, self.config.history_tile_settle_minutes)
+        self.relais_entity_id = 'actuator:Relais_Switch:DO4-1'
+        self.relais_switch_attrs = ['current_State_Relais1', 'current_State_Relais2']  # the relais deciding the control system
+        self.switch_segments = SwitchSegments()
+        self.history_single_flight = SingleFlight()  # identical requests to quantumleap running at the same time are sent only once
+        self.history_executor, self.page_executor = self.construct_executors()
+        self.token_manager = get_token_manager(self.config)
         self.expired_token_returned_message = ''
         self.expired_token_returned_status_code = 400
 
-    def construct_cb_structure(self):
+    def construct_executors(self):
         """
-        This function construct the data structure of the data in the context broker by the data structure provided in the helper_function/config.py
-        The returned cb_structure can be used by function get_current_value.
-        Illustration of cb_structure:
+        This function creates, once in the __init__, the thread pools of the requests to quantumleap:
+        the requests of the entities run in the first one, see the function get_history_thread,
+        and the pages of large results are requested in parallel in the second one, see the function request_data of GetQuantumLeap.
+        """
+        return (ThreadPoolExecutor(max_workers=self.config.history_max_workers, thread_name_prefix='GetQuantumLeap'),
+                ThreadPoolExecutor(max_workers=self.config.history_page_workers, thread_name_prefix='GetQuantumLeapPage'))
+
+    def construct_extraction_plan(self):
+        """
+        This function builds, once in the __init__, the plan for extracting the current values from the data of the context broker,
+        by the data structure provided in the helper_function/config.py.
+        The plan maps each entity to the list of its attributes and the parameters they are displayed as.
+        It is used by function get_current_value, so that the data returned by the context broker can be organized
+        without searching config.data_structure on every request.
+        Illustration of extraction_plan:
         {
             'plc':
                 {
                     'sensor:Multisensor:Air_Inlet_PLC':
-                        {
-                            'measured_Temperature': -99.0,
-                            'measured_Relative_Humidity': -99.0
-                        },
-                    'sensor:Multisensor:Air_Outlet_PLC':
-                        {
-                            'measured_Temperature': -99.0,
-                            'measured_Relative_Humidity': -99.0
-                        }
+                        [
+                            ('measured_Temperature', 'Air_Inlet_Temperature'),
+                            ('measured_Relative_Humidity', 'Air_Inlet_Humidity')
+                        ]
                 },
             'lcgw':
                 {
                     'sensor:Multisensor:Temperature:Air_Inlet_LCGW':
-                        {
-                            'measured_Temperature': -99.0
-                        }
+                        [
+                            ('measured_Temperature', 'Air_Inlet_Temperature')
+                        ]
                 }
         }
-        The purpose of constructing this dictionary is to make it easier to organize the returned data from the context broker for further usage.
         """
-        cb_structure = {}
+        extraction_plan = {}
         for system in self.config.data_structure:
-            cb_structure[system] = {}
+            extraction_plan[system] = {}
             for param in self.config.data_structure[system]:
                 entity = self.config.data_structure[system][param]['entity']
-                if entity not in cb_structure[system]:
-                    cb_structure[system][entity] = {}
                 attribute = self.config.data_structure[system][param]['attribute']
-                cb_structure[system][entity][attribute] = self.null_value
-        return cb_structure
+                extraction_plan[system].setdefault(entity, []).append((attribute, param))
+        return extraction_plan
+
+    def construct_history_structure(self):
+        """
+        This function groups the parameters in config.history_values_display_param_list by their entities,
+        so that the historical data of all attributes of an entity can be requested from quantumleap in one request.
+        Illustration of history_structure:
+        {
+            'plc':
+                {
+                    'sensor:Multisensor:Air_Outlet_PLC':
+                        {
+                            'measured_Temperature': 'Air_Outlet_Temperature',
+                            'measured_Relative_Humidity': 'Air_Outlet_Humidity',
+                            'measured_VOC': 'Air_Outlet_VOC'
+                        }
+                }
+        }
+        """
+        history_structure = {}
+        for system in self.config.history_values_display_param_list:
+            history_structure[system] = {}
+            for param in self.config.history_values_display_param_list[system]:
+                entity = self.config.data_structure[system][param]['entity']
+                if entity not in history_structure[system]:
+                    history_structure[system][entity] = {}
+                attribute = self.config.data_structure[system][param]['attribute']
+                history_structure[system][entity][attribute] = param
+        return history_structure
 
     def manage_token(self, update_token_anyway=False):
         """
-        This function checks if current token has expired, and fetch a new token from keycloak server if it has expired.
+        This function gets a valid token from the TokenManager shared by the whole server process (helper_function/token_manager.py),
+        which fetches a new token from keycloak server only if the current one is about to expire, and returns the token.
+        If keycloak cannot be reached, the last token is returned, so that the requests fail at the backend and return their fallback values.
+        The token is given to the clients created for each request by the functions get_ql_client and get_cb_client.
         """
-        now = time.time()
-        if update_token_anyway or now >= self.token_expire_time:  # meaning token has expired and now it needs a new token
-            access_token, expires_in = self.kp.get_access_token()
-            self.token = access_token
-            self.token_expire_time = now + expires_in - 20  # temporary
-            # self.token_expire_time = now + expires_in  # hanling expired token
-            header_update = {'Authorization': 'Bearer %s' % self.token}
-            self.cb_client.headers.update(header_update)
-            self.ql_client.headers.update(header_update)
+        try:
+            return self.token_manager.get_token(force_refresh=update_token_anyway)
+        except Exception as error:
+            print('in manage_token, error message:\n', error)
+            return self.token_manager.token
 
     def get_relais_switch(self):
         """
@@ -114,11 +160,10 @@ class GetData:
         }
         """
 
-        self.manage_token()
-        self.cb_client.headers.update({'fiware-servicepath': '/'})
+        cb_client = self.get_cb_client('/')
 
         try:  # to handle the case with api errors (cannot even return any data)
-            data_read = self.cb_client.get_entity_attributes(
+            data_read = cb_client.get_entity_attributes(
                 entity_id='actuator:Relais_Switch:DO4-1',
                 entity_type='actuator:Relais_Switch'
             )
@@ -172,8 +217,10 @@ class GetData:
         This function gets all the data of a specified control system from the context broker.
         This function fetches all data at once instead of requesting data of each entity one by one, so that it takes less data transmission time in total.
         The data returned from the context broker contains data of all attributes of all entities, and the data structure of different control systems may not be the same.
-        With the help of self.config.data_structure and the self.cb_structure (previously built via function construct_cb_structure in the __init__(self)),
+        With the help of self.extraction_plan (previously built via function construct_extraction_plan in the __init__(self)),
         this function returns the same format for different control systems.
+        The values are written into a new dictionary on every call, so that this function can be called by several call back functions at the same time.
+        Parameters whose entity is not returned by the context broker or whose value cannot be read get self.null_value.
         Illustration of returned data:
         {
             'Air_Inlet_Temperature': 10,
@@ -183,11 +230,10 @@ class GetData:
 
         parameter 'system' can be 'plc', 'ed', or 'lcgw'
         """
-        self.manage_token()
-        self.cb_client.headers.update({'fiware-servicepath': '/%s' % system})
+        cb_client = self.get_cb_client('/%s' % system)
 
         try:
-            data_read = self.cb_client.get_entity_list(response_format='keyValues')
+            data_read = cb_client.get_entity_list(response_format='keyValues')
         ## temporary
         except Exception as error:
             print('in get_current_value, error message:\n', error)
@@ -206,19 +252,15 @@ class GetData:
         #         return self.return_null_orion()
 
         # organize data returned from the context broker to the same format
+        plan = self.extraction_plan[system]
+        current_value = dict.fromkeys(self.current_values_display_param_list[system], self.null_value)
         for item in data_read:
-            entity = item.id
-            if entity in self.cb_structure[system]:
-                attrs_list = self.cb_structure[system][entity].keys()
-                for attr in attrs_list:
-                    exec('self.cb_structure[system][entity][attr] = item.%s' % attr)
-                    self.cb_structure[system][entity][attr] = round(float(self.cb_structure[system][entity][attr]), self.config.display_digits)
-        return {
-            param: self.cb_structure[system][
-                self.config.data_structure[system][param]['entity']
-            ][self.config.data_structure[system][param]['attribute']]
-            for param in self.current_values_display_param_list[system]
-        }
+            for attr, param in plan.get(item.id, ()):
+                try:
+                    current_value[param] = round(float(getattr(item, attr)), self.config.display_digits)
+                except (AttributeError, TypeError, ValueError):
+                    pass
+        return current_value
 
     def return_null_orion(self):
         """
@@ -238,26 +280,190 @@ class GetData:
             all_param += self.current_values_display_param_list[system]
         return {param: self.null_value for param in list(set(all_param))}  # eliminate duplicates
 
-    def get_history_thread(self, system: str, fromDate_str: str):
+    def get_ql_client(self, service_path: str):
         """
-        This function creates multiple threads via the class GetQuantumLeap to get historical data from quantumleap.
-        For each parameter in the config.history_values_display_param_list of each control system,
-        this function creates a thread for getting the historical data of this function.
-        This function take advantage of the feature of python's objects,
-        that is to do shallow copy by default, and let all threads share a same dictionary (the data_return) for storing the returned data.
+        This function returns a QuantumLeapClient for the given fiware service path.
+        All clients share the request session self.requests_session_ql, but each has its own headers,
+        so that requests for different control systems running in parallel do not overwrite the fiware-servicepath of each other.
+
+        parameter service_path: e.g. '/plc' or '/'
+        """
+        token = self.manage_token()
+        ql_client = QuantumLeapClient(session=self.requests_session_ql, url=self.url_quantum_leap,
+                                      fiware_header=FiwareHeader(service=self.service, service_path=service_path))
+        ql_client.headers.update({'Authorization': 'Bearer %s' % token})
+        return ql_client
+
+    def get_cb_client(self, service_path: str):
+        """
+        This function returns a ContextBrokerClient for the given fiware service path, the same as the function get_ql_client does for quantumleap.
+
+        parameter service_path: e.g. '/plc' or '/'
+        """
+        token = self.manage_token()
+        cb_client = ContextBrokerClient(session=self.requests_session_cb, url=self.url_orion,
+                                        fiware_header=FiwareHeader(service=self.service, service_path=service_path))
+        cb_client.headers.update({'Authorization': 'Bearer %s' % token})
+        return cb_client
+
+    def get_history_thread(self, system: str, fromDate_str: str, aggr_period: str = None, toDate_str: str = None):
+        """
+        This function submits the requests for the historical data of a control system to the thread pool self.history_executor.
+        For each entity in self.history_structure of the control system,
+        this function submits the function run of a GetQuantumLeap, which requests all attributes of the entity at once, and returns the futures of them.
+        The number of threads is bounded by config.history_max_workers, further requests wait in the queue of the thread pool.
+        All requests share self.history_cache, so each request only asks quantumleap for the data newer than its last request,
+        and share self.history_single_flight, so that a request identical to a running one waits for it instead of being sent again.
+        If aggr_period is given, quantumleap returns the data aggregated by config.history_aggregation_method over each aggr_period,
+        which are cached separately from the raw data, and the data of the completed days are kept in self.tile_cache.
+        The aggregations by config.history_envelope_methods are then requested in parallel as well, see the function get_aggregation_methods.
+        Illustration of returned data:
+        {
+            ('sensor:Multisensor:Air_Inlet_PLC', None): Future,  # raw data
+            ('sensor:Multisensor:Air_Outlet_PLC', 'avg'): Future,
+            ('sensor:Multisensor:Air_Outlet_PLC', 'min'): Future
+        }
 
         parameter system: 'plc', 'ed', or 'lcgw'
-        parameter fromDate_str: year-month-day, e.g.: '2021-01-31'
+        parameter fromDate_str: UTC, e.g.: '2021-01-31T08:00:00'
+        parameter aggr_period: None, or aggrPeriod of quantumleap, e.g. 'minute', see the function get_aggregation_period
+        parameter toDate_str: UTC, e.g.: '2021-01-31T18:00:00', None means until now
+        """
+        ql_client = self.get_ql_client('/%s' % system)
+        futures = {}
+        for entity in self.history_structure[system]:
+            for aggr_method in self.get_aggregation_methods(aggr_period):
+                ql_obj = GetQuantumLeap(self.config, self.get_attr_params(system, entity, aggr_method), ql_client, self.history_cache,
+                                        system, entity, fromDate_str, aggr_period, self.history_single_flight, self.page_executor,
+                                        self.tile_cache, toDate_str, aggr_method)
+                futures[(entity, aggr_method)] = self.history_executor.submit(ql_obj.run)
+        return futures
+
+    def get_aggregation_methods(self, aggr_period: str = None):
+        """
+        This function returns the aggrMethods of quantumleap requested for an aggregation period: config.history_aggregation_method for the line,
+        followed by config.history_envelope_methods for the band around it. [None] is returned for the raw data (aggr_period None).
+        """
+        if aggr_period is None:
+            return [None]
+        return [self.config.history_aggregation_method] + list(self.config.history_envelope_methods)
+
+    def get_attr_params(self, system: str, entity: str, aggr_method: str = None):
+        """
+        This function returns the attributes of an entity mapped to the parameters of the returned data for an aggrMethod.
+        The parameters of config.history_envelope_methods get the method as suffix, see GetQuantumLeap.get_envelope_name.
+        Example return for 'max': {'measured_Temperature': 'Air_Outlet_Temperature_max'}
+        """
+        attr_params = self.history_structure[system][entity]
+        if aggr_method is None or aggr_method == self.config.history_aggregation_method:
+            return attr_params
+        return {attr: GetQuantumLeap.get_envelope_name(param, aggr_method) for attr, param in attr_params.items()}
+
+    def get_point_budget(self, minutes: int):
         """
-        data_return = {'token_expire_time': self.token_expire_time}
-        self.ql_client.headers.update({'fiware-servicepath': '/%s' % system})
-        for param in self.config.history_values_display_param_list[system]:
-            thread_obj = GetQuantumLeap(self.config, param, data_return, self.ql_client, self.config.data_structure[system][param]['entity'],
-                                        self.config.data_structure[system][param]['attribute'], fromDate_str)
-            thread_obj.start()
-        return data_return
+        This function returns the maximum number of points of each series in the historical graph for a display duration,
+        as defined by config.history_point_budget. None means the series should not be downsampled.
 
-    def get_switch_history(self, fromDate_str):
+        parameter minutes: the display duration, e.g. 21600
+        """
+        for duration, max_points in self.config.history_point_budget:
+            if minutes <= duration:
+                return max_points
+        return self.config.history_point_budget[-1][1]
+
+    def get_aggregation_period(self, minutes: int):
+        """
+        This function returns the aggregation period (aggrPeriod of quantumleap, e.g. 'minute') used for a display duration,
+        as defined by config.history_aggregation_period. None means the raw data are requested.
+
+        parameter minutes: the display duration, e.g. 21600
+        """
+        for duration, aggr_period in self.config.history_aggregation_period:
+            if minutes <= duration:
+                return aggr_period
+        return self.config.history_aggregation_period[-1][1]
+
+    def downsample_history(self, history: dict, max_points: int):
+        """
+        This function downsamples every series of the return of the function get_history to at most about max_points points,
+        with the method config.history_downsample_method (see helper_function/downsample.py).
+        The data in self.history_cache are not changed.
+        """
+        if max_points is None:
+            return history
+        return {
+            system: {param: downsample(data, max_points, self.config.history_downsample_method)
+                     for param, data in history[system].items()}
+            for system in history
+        }
+
+    def get_cached_history(self, system: str, entity: str, from_date, aggr_period: str = None, to_date=None, aggr_method: str = None):
+        """
+        This function returns the data of all parameters of an entity which are already cached, from the tiles and the history_cache,
+        in the format of the function run of GetQuantumLeap, without requesting anything from quantumleap.
+        """
+        tile_until = self.tile_cache.get_until(from_date, aggr_period)
+        recent_from = from_date if tile_until is None else np.datetime64(tile_until, 'ns')
+        cached = {}
+        for attr, param in self.get_attr_params(system, entity, aggr_method).items():
+            key = GetQuantumLeap.get_cache_key(self.config, system, entity, attr, aggr_period, aggr_method)
+            pieces = []
+            if tile_until is not None:
+                tiles = [self.tile_cache.get(key + (day,)) for day in DailyTileCache.get_days(from_date, tile_until)]
+                pieces = [tile for tile in tiles if tile is not None]
+            pieces.append(self.history_cache.get(key, recent_from))
+            cached[param] = DailyTileCache.join(pieces, from_date, to_date)
+        return cached
+
+    def get_history(self, systems: list, fromDate_str: str, timeout: float = None, max_points: int = None, aggr_period: str = None,
+                    stale: set = None, toDate_str: str = None):
+        """
+        This function gets the historical data of the control systems in parallel, and waits until all of them have arrived.
+        If a request does not finish within the timeout (config.history_request_timeout by default),
+        the data already cached (see the function get_cached_history) are returned for the parameters of this entity instead,
+        and the request keeps filling the cache in the background.
+        These parameters are added to the set 'stale' if given, e.g. {('plc', 'Air_Inlet_Temperature')}.
+        Aggregated data also contain the band of each parameter, e.g. 'Air_Inlet_Temperature_min' and 'Air_Inlet_Temperature_max',
+        see the function get_aggregation_methods.
+        Illustration of returned data:
+        {
+            'plc': {
+                'Air_Inlet_Temperature': [
+                    np.array(['2021-01-02T08:00:00', '2021-01-02T08:01:00'], dtype='datetime64[ns]'),
+                    [10, 20]
+                ]
+            }
+        }
+
+        parameter systems: list of 'plc', 'ed', or 'lcgw'
+        parameter fromDate_str: UTC, e.g.: '2021-01-31T08:00:00'
+        parameter timeout: seconds
+        parameter max_points: each series is downsampled to at most about this number of points, see the function get_point_budget
+        parameter aggr_period: None, or aggrPeriod of quantumleap, e.g. 'minute', see the function get_aggregation_period
+        parameter stale: set to which the parameters taken from the cache are added
+        parameter toDate_str: UTC, e.g.: '2021-01-31T18:00:00', None means until now
+        """
+        if timeout is None:
+            timeout = self.config.history_request_timeout
+        futures = {system: self.get_history_thread(system, fromDate_str, aggr_period, toDate_str) for system in systems}
+        wait([future for system in futures for future in futures[system].values()], timeout=timeout)
+
+        from_date = HistoryCache.parse_date(fromDate_str)
+        to_date = HistoryCache.parse_date(toDate_str) if toDate_str is not None else None
+        history = {}
+        for system in futures:
+            history[system] = {}
+            for (entity, aggr_method), future in futures[system].items():
+                if future.done() and future.exception() is None:
+                    history[system].update(future.result())
+                else:
+                    print('in get_history, timeout or error when getting', system, entity, aggr_method or '')
+                    history[system].update(self.get_cached_history(system, entity, from_date, aggr_period, to_date, aggr_method))
+                    if stale is not None:
+                        stale.update((system, param) for param in self.get_attr_params(system, entity, aggr_method).values())
+        return self.downsample_history(history, max_points)
+
+    def get_switch_history(self, fromDate_str, timeout: float = None):
         """
         This function gets the history data of the relais from quantumleap.
         The data in quantumleap is the history values of relai1, relai2, etc.
@@ -266,49 +472,68 @@ class GetData:
         {
             'plc': [
                 [
-                    datetime(2021, 1, 2, 8, 0, 0), datetime(2021, 1, 2, 12, 0, 0)
+                    '2021-01-02T08:00:00.000', '2021-01-02T12:00:00.000'
                 ],
                 [
-                    datetime(2021, 1, 2, 9, 59, 59), datetime(2021, 1, 2, 14, 59, 59)
+                    '2021-01-02T09:59:59.000', '2021-01-02T14:59:59.000'
                 ]
             ],
+            'ed': [[], []],
             'lcgw': [
                 [
-                    datetime(2021, 1, 2, 10, 0, 0)
+                    '2021-01-02T10:00:00.000'
                 ],
                 [
-                    datetime(2021, 1, 2, 11, 59, 59)
+                    '2021-01-02T11:59:59.000'
                 ]
             ]
         }
-        The idea is [[list of the starting timestamps], [list of the ending timestamps]]
+        The idea is [[list of the starting timestamps], [list of the ending timestamps]], the timestamps are UTC strings for plotly.
         For the example above, from 08:00:00 on 2nd of January, the control system is plc, and the control time ends at 09:59:59 on the same day.
         From 10:00:00 on, lcgw starts to control the system, and ends at 11:59:59.
         Afterward, plc takes control again from 12:00:00 untill 14:59:59.
 
-        parameter fromDate_str: year-month-day, e.g.: '2021-01-31'
-        """
-        start_end_time = {
-            'plc': [[], []],  # [[start_time list], [end_time list]]
-            'ed': [[], []],
-            'lcgw': [[], []]
-        }
+        The history values of the relais are kept in self.history_cache, and the control periods in self.switch_segments,
+        so that only the values newer than the last request are requested from quantumleap and processed.
+        The request runs in the thread pool self.history_executor. If it does not finish within the timeout (no limit by default),
+        the control periods of the cached values are returned instead, and the request keeps filling the cache in the background.
 
-        # get data
-        self.manage_token()
-        self.ql_client.headers.update({'fiware-servicepath': '/'})
+        parameter fromDate_str: UTC, e.g.: '2021-01-31T08:00:00'
+        parameter timeout: seconds
+        """
+        from_date = HistoryCache.parse_date(fromDate_str)
+        future = self.history_executor.submit(self.fetch_switch_history, from_date)
+        wait([future], timeout=timeout)
+        if not future.done():
+            print('in get_switch_history, timeout when getting the relais')
+        return self.organize_switch_history(from_date)
+
+    def fetch_switch_history(self, from_date):
+        """
+        This function requests the history values of relai1 and relai2 not requested yet from quantumleap,
+        and adds them to self.history_cache. It is run in the thread pool by the function get_switch_history.
+        If the same request is already running, this function waits for it instead, see helper_function/single_flight.py.
+        """
+        cache_keys = self.get_switch_cache_keys()
+        fetch_start, full_requests = self.history_cache.get_fetch_start_group(cache_keys, from_date)
+        request_key = ('/', self.relais_entity_id, tuple(self.relais_switch_attrs), None, fetch_start)
+        self.history_single_flight.run(request_key, self.request_switch_history, fetch_start, full_requests)
 
+    def request_switch_history(self, fetch_start, full_requests: dict):
+        """
+        This function requests the history values of relai1 and relai2 from fetch_start on, and adds them to self.history_cache.
+        """
+        ql_client = self.get_ql_client('/')
+        fetched_until = HistoryCache.now()
         try:
-            relai1_ql_data = self.ql_client.get_entity_attr_values_by_id(
-                    entity_id='actuator:Relais_Switch:DO4-1',
-                    attr_name='current_State_Relais1', from_date=fromDate_str)
-            relai2_ql_data = self.ql_client.get_entity_attr_values_by_id(
-                entity_id='actuator:Relais_Switch:DO4-1',
-                attr_name='current_State_Relais2', from_date=fromDate_str)
+            relais_ql_data = ql_client.get_entity_by_id(
+                entity_id=self.relais_entity_id,
+                attrs=','.join(self.relais_switch_attrs), from_date=HistoryCache.format_date(fetch_start),
+                to_date=HistoryCache.format_date(fetched_until))
         ## temporary
         except Exception as error:
-            print('in get_switch_history, error message:\n', error)
-            return start_end_time
+            print('in fetch_switch_history, error message:\n', error)
+            relais_ql_data = None
         ### hanling expired token
         # except requests.exceptions.RequestException as error:
         #     response_text = error.response.text
@@ -316,63 +541,70 @@ class GetData:
         #     if response_text == self.expired_token_returned_message and response_status_code == self.expired_token_returned_status_code:
         #         print('token expired, retrying...')
         #         self.manage_token(update_token_anyway=True)
-        #         return self.get_switch_history(fromDate_str)
+        #         return self.fetch_switch_history(from_date)
         #     else:
-        #         print('in get_switch_history, error response text:\n',
+        #         print('in fetch_switch_history, error response text:\n',
         #               response_text, '\nerror response status_code:\n',
         #               response_status_code)
-        #         return start_end_time
+        #         relais_ql_data = None
 
-        try:
-            time_relai, relai1, relai2 = self.switch_history_filter(
-                relai1_ql_data,
-                relai2_ql_data)
-        except Exception as error:
-            print('in get_switch_history, error when parsing data, error message:', error)
-            return start_end_time
+        if relais_ql_data is not None:
+            try:
+                time_relai, relai1, relai2 = self.switch_history_filter(relais_ql_data)
+                self.update_switch_history(fetch_start, full_requests, time_relai, relai1, relai2, fetched_until)
+            except Exception as error:
+                print('in fetch_switch_history, error when parsing data, error message:', error)
 
-        if len(relai1) != len(relai2):
+    def get_switch_cache_keys(self):
+        """
+        This function returns the keys of the history values of relai1 and relai2 in self.history_cache.
+        """
+        return [('relais', self.relais_entity_id, attr, None) for attr in self.relais_switch_attrs]
+
+    def update_switch_history(self, fetch_start, full_requests: dict, time_relai, relai1, relai2, fetched_until):
+        """
+        This function adds the filtered history values of relai1 and relai2 requested until fetched_until to self.history_cache.
+        This function is used by the function get_switch_history, and also by the class AsyncGetData (helper_function/organize_data_async.py).
+        """
+        for key, relai in zip(self.get_switch_cache_keys(), [relai1, relai2]):
+            self.history_cache.update(key, fetch_start, full_requests[key], [time_relai, relai], fetched_until)
+
+    def organize_switch_history(self, from_date):
+        """
+        This function transforms the cached history values of relai1 and relai2 into the start time and end time of control systems,
+        the format of the returned data is explained in the function get_switch_history.
+        This function is used by the function get_switch_history, and also by the class AsyncGetData (helper_function/organize_data_async.py).
+        """
+        oldest = np.datetime64(0, 'ns')
+        (time_relai, relai1), (time_relai2, relai2) = [self.history_cache.get(key, oldest) for key in self.get_switch_cache_keys()]
+        if len(time_relai) != len(time_relai2):
             print('relais1 and relais2 have different lengths')
-            return start_end_time
-
-        # calculate start time and end time of each control period
-        r1_pre, r2_pre, sys_pre = self.null_value, self.null_value, self.null_value
-        for i, (r1, r2) in enumerate(zip(relai1, relai2)):
-            if (r1, r2) != (r1_pre, r2_pre):
-                if i != 0:
-                    end_time = time_relai[i] - timedelta(seconds=1)
-                    start_end_time[sys_pre][1].append(end_time)
-                start_time = time_relai[i]
-                if r1 == 1:
-                    start_end_time['lcgw'][0].append(start_time)
-                    sys_pre = 'lcgw'
-                elif r1 == 0 and r2 == 0:
-                    start_end_time['plc'][0].append(start_time)
-                    sys_pre = 'plc'
-                else:
-                    start_end_time['ed'][0].append(start_time)
-                    sys_pre = 'ed'
-            r1_pre, r2_pre = r1, r2
-        end_time = datetime.now()
-        start_end_time[sys_pre][1].append(end_time)
-        return start_end_time
+            time_relai, relai1, relai2 = time_relai[:0], relai1[:0], relai2[:0]
+        self.switch_segments.update(time_relai, relai1, relai2)
+        return self.switch_segments.get(from_date, HistoryCache.now())
 
-    def switch_history_filter(self, relai1_timeseries_object, relai2_timeseries_object):
+    def switch_history_filter(self, relais_timeseries_object):
         """
         This function transform the data get from quantumleap using FiLiP into numpy array, and then filter out the None values.
         This function is used by function get_switch_history while parsing the historical data of the relais.
         """
-        relai1_time = np.array(relai1_timeseries_object.index)
-        relai1_value = np.array(relai1_timeseries_object.attributes[0].values)
-        # relai2_time = np.array(relai2_timeseries_object.index)
-        relai2_value = np.array(relai2_timeseries_object.attributes[0].values)
+        relai_values = {attribute.attrName: np.array(attribute.values) for attribute in relais_timeseries_object.attributes}
+        relai_time = np.array(relais_timeseries_object.index)
+        relai1_value, relai2_value = [relai_values[attr] for attr in self.relais_switch_attrs]
+        return self.switch_history_filter_values(relai_time, relai1_value, relai2_value)
 
+    @staticmethod
+    def switch_history_filter_values(relai1_time, relai1_value, relai2_value):
+        """
+        This function filters out the None values of the history values of the relais, given as numpy arrays.
+        The returned timestamps are numpy datetime64[ns] in UTC.
+        """
         # filter out null values
         relai1_select_index = relai1_value != None
         relai2_select_index = relai2_value != None
         select_index = relai1_select_index * relai2_select_index
         relai1_time_filtered, relai1_value_filtered, relai2_value_filtered = \
-            relai1_time[select_index], relai1_value[select_index].astype(float), relai2_value[select_index].astype(float)
+            to_datetime64(relai1_time[select_index]), relai1_value[select_index].astype(float), relai2_value[select_index].astype(float)
 
         return relai1_time_filtered, relai1_value_filtered, relai2_value_filtered
 
@@ -386,10 +618,9 @@ class GetData:
         parameter command_name: e.g. 'setpoint'
         parameter command: e.g. {'type': 'command', 'value': '0'}
         """
-        self.manage_token()
-        self.cb_client.headers.update({'fiware-servicepath': '/%s' % system})
+        cb_client = self.get_cb_client('/%s' % system)
         try:
-            self.cb_client.post_command(entity_id=entity_id, entity_type=entity_type, command=command, command_name=command_name)
+            cb_client.post_command(entity_id=entity_id, entity_type=entity_type, command=command, command_name=command_name)
         ## temporary
         except Exception as error:
             print('in send_command, error message:\n', error)
@@ -400,7 +631,7 @@ class GetData:
         #     if response_text == self.expired_token_returned_message and response_status_code == self.expired_token_returned_status_code:
         #         print('token expired, retrying...')
         #         self.manage_token(update_token_anyway=True)
-        #         self.cb_client.post_command(entity_id=entity_id,
+        #         cb_client.post_command(entity_id=entity_id,
         #                                     entity_type=entity_type,
         #                                     command=command,
         #                                     command_name=command_name)
@@ -411,86 +642,344 @@ class GetData:
         """
         When this class is terminated, class the request sessions
         """
+        for executor in [self.history_executor, self.page_executor]:
+            if executor is not None:
+                executor.shutdown(wait=False)
         self.requests_session_cb.close()
         self.requests_session_ql.close()
 
 
-class GetQuantumLeap(Thread):
+class GetQuantumLeap:
     """
-    This class is a thread that gets data from quantumleap, and this class is used in the function get_history_thread in the class GetData.
+    This class gets data of all attributes of one entity from quantumleap, and this class is used in the function get_history_thread in the class GetData.
     """
-    def __init__(self, config, param, return_data, ql_client, entity_id, attr_name, from_date):
-        Thread.__init__(self)
+    def __init__(self, config, attr_params, ql_client, history_cache, system, entity_id, from_date, aggr_period=None, single_flight=None,
+                 page_executor=None, tile_cache=None, to_date=None, aggr_method=None):
         """
-        The return_data is the same object shared by many threads in the function function get_history_thread in the class GetData.
-        When another thread add data to the return_data, the return_data in this thread will also change accordingly.
+        The attr_params maps the attributes of the entity to the parameters, e.g. {'measured_Temperature': 'Air_Outlet_Temperature'},
+        see the function construct_history_structure of the class GetData.
+        The ql_client is created by the function get_ql_client of the class GetData and already contains the token and the fiware-servicepath.
+        The history_cache is the HistoryCache of the class GetData, which is shared by all threads of the thread pool.
+        If aggr_period is given (e.g. 'minute'), the data are aggregated by quantumleap with aggr_method (config.history_aggregation_method by default).
+        The data of other aggregation methods are cached separately, see the function get_cache_key.
+        The single_flight is the SingleFlight of the class GetData, or None, see the function run.
+        The page_executor is the thread pool requesting the pages of large results, or None, see the function request_data.
+        The tile_cache is the DailyTileCache of the class GetData, or None, see the function run.
+        The to_date (UTC, e.g. '2021-01-31T18:00:00') is the end of the requested data, None means until now.
         """
         self.config = config
-        self.param = param
-        self.return_data = return_data
+        self.attr_params = attr_params
         self.ql_client = ql_client
+        self.history_cache = history_cache
+        self.system = system
         self.entity_id = entity_id
-        self.attr_name = attr_name
         self.from_date = from_date
-        self.kp = KeycloakPython()
+        self.aggr_period = aggr_period
+        self.aggr_method = (aggr_method or config.history_aggregation_method) if aggr_period is not None else None
+        self.single_flight = single_flight
+        self.page_executor = page_executor
+        self.tile_cache = tile_cache
+        self.to_date = to_date
         self.expired_token_returned_message = ''
         self.expired_token_returned_status_code = 400
 
-    def filter(self, timeseries_object):
+    def filter(self, data_time, values: dict):
         """
-        This function filters out the outliers of the data from the quantumleap.
+        This function filters out the outliers of the data of each attribute from the quantumleap, and returns the data of each parameter.
+        The data are the return of the function request_data.
         The definition of outliers is in the helper_function/config.py
+        Illustration of the returned data:
+        {
+            'Air_Outlet_Temperature': [
+                np.array(['2021-01-02T08:00:00', '2021-01-02T08:01:00'], dtype='datetime64[ns]'),
+                [10, 20]
+            ],
+            'Air_Outlet_Humidity': [
+                np.array(['2021-01-02T08:00:00', '2021-01-02T08:01:00'], dtype='datetime64[ns]'),
+                [60, 70]
+            ]
+        }
+        """
+        return {
+            self.attr_params[attr]: self.filter_values(self.config, self.attr_params[attr], data_time, values[attr])
+            for attr in values if attr in self.attr_params
+        }
+
+    @staticmethod
+    def get_arrays(timeseries_object):
+        """
+        This function returns the timestamps and the values of each attribute of the data returned by FiLiP as numpy arrays.
+        Illustration of the returned data:
+        (
+            np.array(['2021-01-02T08:00:00', '2021-01-02T08:01:00'], dtype='datetime64[ns]'),
+            {'measured_Temperature': np.array([10, None], dtype=object)}
+        )
+        """
+        return (to_datetime64(timeseries_object.index),
+                {attribute.attrName: np.array(attribute.values, dtype=object) for attribute in timeseries_object.attributes})
+
+    @staticmethod
+    def join_pages(pages: list, attrs: list):
+        """
+        This function joins the pages of a result of quantumleap, each in the format returned by the function get_arrays, in the given order.
+        The arrays of the whole result are allocated once and the pages are copied into them.
+        An attribute missing in a page gets None.
+        """
+        size = sum(len(page_time) for page_time, page_values in pages)
+        data_time = np.empty(size, dtype='datetime64[ns]')
+        values = {attr: np.empty(size, dtype=object) for attr in attrs}
+        position = 0
+        for page_time, page_values in pages:
+            end = position + len(page_time)
+            data_time[position:end] = page_time
+            for attr in attrs:
+                values[attr][position:end] = page_values[attr] if attr in page_values else None
+            position = end
+        return data_time, values
+
+    def count_records(self, fetch_start, to_date):
         """
-        data_time = np.array(timeseries_object.index)
-        data_value = np.array(timeseries_object.attributes[0].values)
+        This function returns the number of records of the entity from fetch_start until to_date, counted by quantumleap (aggrMethod 'count'),
+        or None if quantumleap cannot count them.
+        """
+        try:
+            read_data = self.ql_client.get_entity_by_id(
+                entity_id=self.entity_id, attrs=','.join(self.attr_params),
+                from_date=HistoryCache.format_date(fetch_start), to_date=HistoryCache.format_date(to_date), aggr_method='count')
+            return max([int(attribute.values[0]) for attribute in read_data.attributes if len(attribute.values) > 0 and attribute.values[0] is not None],
+                       default=0)
+        except Exception as error:
+            print('in GetQuantumLeap when counting', self.entity_id, 'error message:\n', error)
+            return None
 
+    def request_page(self, fetch_start, to_date, offset: int):
+        """
+        This function requests config.history_page_size records from the offset on, and returns them in the format of the function get_arrays.
+        """
+        return self.get_arrays(self.ql_client.get_entity_by_id(
+            entity_id=self.entity_id, attrs=','.join(self.attr_params),
+            from_date=HistoryCache.format_date(fetch_start), to_date=HistoryCache.format_date(to_date),
+            limit=self.config.history_page_size, offset=offset))
+
+    def request_data(self, fetch_start, to_date=None):
+        """
+        This function requests the data of all attributes of the entity from fetch_start until to_date (None means until now),
+        and returns them in the format of the function get_arrays.
+        Quantumleap returns at most config.history_page_size records per request. So for the raw data, the number of records is counted first,
+        and if there are more, the pages (limit, offset) are requested in parallel in self.page_executor and joined by the function join_pages.
+        The records newer than the time of the count are requested on the next refresh.
+        Aggregated data are requested in one request, there are few of them.
+        """
+        if self.aggr_period is not None or self.page_executor is None:
+            return self.get_arrays(self.ql_client.get_entity_by_id(
+                entity_id=self.entity_id,
+                attrs=','.join(self.attr_params), from_date=HistoryCache.format_date(fetch_start),
+                to_date=HistoryCache.format_date(to_date) if to_date is not None else None,
+                aggr_method=self.aggr_method, aggr_period=self.aggr_period))
+
+        if to_date is None:
+            to_date = HistoryCache.now()
+        total = self.count_records(fetch_start, to_date)
+        page_size = self.config.history_page_size
+        if total is None or total <= page_size:
+            return self.get_arrays(self.ql_client.get_entity_by_id(
+                entity_id=self.entity_id,
+                attrs=','.join(self.attr_params), from_date=HistoryCache.format_date(fetch_start), to_date=HistoryCache.format_date(to_date)))
+        offsets = list(range(0, total, page_size))
+        pages = list(self.page_executor.map(lambda offset: self.request_page(fetch_start, to_date, offset), offsets))
+        # quantumleap counts the values of each attribute, records with only null values may not have been counted
+        while len(pages[-1][0]) == page_size:
+            offsets.append(offsets[-1] + page_size)
+            pages.append(self.request_page(fetch_start, to_date, offsets[-1]))
+        return self.join_pages(pages, list(self.attr_params))
+
+    @staticmethod
+    def filter_values(config, param, data_time, data_value):
+        """
+        This function filters out the outliers of the data of one parameter, given as numpy arrays of timestamps and values,
+        so that it can also be used for data which are not read via FiLiP (e.g. by the class AsyncGetData).
+        The returned timestamps are numpy datetime64[ns] in UTC.
+        """
+        data_time = to_datetime64(data_time)
         # filter out null values
         select_index = data_value != None
         data_time_withoutNone, data_value_withoutNone = data_time[select_index], data_value[select_index].astype(float)
 
         # filter out temperature abnormal values
-        if 'Temperature' in self.param:
-            select_index_temp_min = data_value_withoutNone > self.config.temperature_min
-            select_index_temp_max = data_value_withoutNone < self.config.temperature_max
+        if 'Temperature' in param:
+            select_index_temp_min = data_value_withoutNone > config.temperature_min
+            select_index_temp_max = data_value_withoutNone < config.temperature_max
             select_index = select_index_temp_min * select_index_temp_max
             data_time_withoutNone, data_value_withoutNone = data_time_withoutNone[select_index], data_value_withoutNone[
                 select_index]
         # filter out humidity abnormal values
-        if 'Humidity' in self.param:
-            select_index_humi_min = data_value_withoutNone > self.config.humidity_min
-            select_index_humi_max = data_value_withoutNone < self.config.humidity_max
+        if 'Humidity' in param:
+            select_index_humi_min = data_value_withoutNone > config.humidity_min
+            select_index_humi_max = data_value_withoutNone < config.humidity_max
             select_index = select_index_humi_min * select_index_humi_max
             data_time_withoutNone, data_value_withoutNone = data_time_withoutNone[select_index], data_value_withoutNone[select_index]
         return [data_time_withoutNone, data_value_withoutNone]
 
     def run(self):
         """
-        This function is inherited from Thread, therefore please don't change the function's name.
-        When this class is initiated, for example thread_obj = GetQuantumLeap, then thread_obj.start() will run this function in a new thread.
-        Illustration of the overall return_data:
+        This function is submitted to the thread pool of the class GetData by the function get_history_thread,
+        and the future of the thread pool returns the data of the parameters of this entity.
+        Illustration of the returned data:
         {
-            'Air_Inlet_Temperature': [
-                [datetime(2021, 1, 2, 8, 0, 0), datetime(2021, 1, 2, 8, 1, 0)],
+            'Air_Outlet_Temperature': [
+                np.array(['2021-01-02T08:00:00', '2021-01-02T08:01:00'], dtype='datetime64[ns]'),
                 [10, 20]
             ],
-            'Air_Inlet_Humidity': [
-                [datetime(2021, 1, 2, 8, 2, 0), datetime(2021, 1, 2, 8, 3, 0)],
+            'Air_Outlet_Humidity': [
+                np.array(['2021-01-02T08:02:00', '2021-01-02T08:03:00'], dtype='datetime64[ns]'),
                 [60, 70]
             ]
         }
-        Each thread corresponds to the data of each key in the return_data (e.g. data of return_data['Air_Inlet_Temperature'])
+        All attributes of the entity are requested from quantumleap in one request.
+        Only the data newer than the last request are requested from quantumleap and added to the history_cache,
+        the returned data are then read from the history_cache.
+        When quantumleap cannot be read, the data already in the history_cache are returned.
+        If the same request (the same service path, entity, attributes, aggregation and time range) is already running,
+        e.g. because several sessions refresh at the same time, this function waits for it instead of sending the request again.
+        The aggregated data of the completed days are taken from the tile_cache, the missing tiles are requested in parallel (see the function get_tiles),
+        so that only the current day is requested via the history_cache.
+        """
+        from_date = HistoryCache.parse_date(self.from_date)
+        to_date = HistoryCache.parse_date(self.to_date) if self.to_date is not None else None
+        tile_until = self.tile_cache.get_until(from_date, self.aggr_period) if self.tile_cache is not None else None
+        recent_from = from_date if tile_until is None else np.datetime64(tile_until, 'ns')
+        cache_keys = {attr: self.get_cache_key(self.config, self.system, self.entity_id, attr, self.aggr_period, self.aggr_method)
+                      for attr in self.attr_params}
+        if to_date is None or to_date >= recent_from:
+            fetch_start, full_requests = self.history_cache.get_fetch_start_group(list(cache_keys.values()), recent_from)
+            if self.single_flight is None:
+                self.fetch(cache_keys, fetch_start, full_requests)
+            else:
+                request_key = ('/%s' % self.system, self.entity_id, tuple(self.attr_params), self.aggr_period, self.aggr_method, fetch_start)
+                self.single_flight.run(request_key, self.fetch, cache_keys, fetch_start, full_requests)
+        if tile_until is None and to_date is None:
+            return {param: self.history_cache.get(cache_keys[attr], from_date) for attr, param in self.attr_params.items()}
+
+        tiles = {attr: [] for attr in self.attr_params}
+        if tile_until is not None:
+            last_day = tile_until if to_date is None else min(tile_until, np.datetime64(to_date, 'D') + np.timedelta64(1, 'D'))
+            tiles = self.get_tiles(DailyTileCache.get_days(from_date, last_day), cache_keys)
+        return {param: DailyTileCache.join(tiles[attr] + [self.history_cache.get(cache_keys[attr], recent_from)], from_date, to_date)
+                for attr, param in self.attr_params.items()}
+
+    def get_tiles(self, days, cache_keys: dict):
+        """
+        This function returns the tiles of the given days for each attribute, e.g. {'measured_Temperature': [tile of each day]}.
+        The missing tiles are requested in parallel in the page_executor, see the function get_tile_runs.
+        """
+        tiles = {day: {attr: self.tile_cache.get(cache_keys[attr] + (day,)) for attr in self.attr_params} for day in days}
+        missing = [day for day in days if any(tile is None for tile in tiles[day].values())]
+        runs = self.get_tile_runs(self.config, self.aggr_period, missing)
+        if self.page_executor is None or len(runs) == 1:
+            for run_days in runs:
+                tiles.update(self.fetch_tiles(run_days, cache_keys))
+        else:
+            for future in [self.page_executor.submit(self.fetch_tiles, run_days, cache_keys) for run_days in runs]:
+                tiles.update(future.result())
+        return {attr: [tiles[day][attr] for day in days] for attr in self.attr_params}
+
+    @staticmethod
+    def get_cache_key(config, system: str, entity_id: str, attr: str, aggr_period: str = None, aggr_method: str = None):
+        """
+        This function returns the key of the data of an attribute in the history_cache and the tile_cache.
+        The data of aggregation methods other than config.history_aggregation_method are kept under the attribute with the method as suffix.
+        Example: ('plc', 'sensor:Multisensor:Air_Inlet_PLC', 'measured_Temperature_max', 'hour')
         """
-        now = time.time()
-        if now >= self.return_data['token_expire_time']:
-            access_token, expires_in = self.kp.get_access_token()
-            self.return_data['token_expire_time'] = now + expires_in
-            self.ql_client.headers.update(
-                {'Authorization': 'Bearer %s' % access_token})
+        if aggr_method is not None and aggr_method != config.history_aggregation_method:
+            attr = GetQuantumLeap.get_envelope_name(attr, aggr_method)
+        return system, entity_id, attr, aggr_period
 
+    @staticmethod
+    def get_envelope_name(name: str, aggr_method: str):
+        """
+        This function returns the name of a parameter or attribute aggregated by one of config.history_envelope_methods.
+        Example: get_envelope_name('Air_Inlet_Temperature', 'max') -> 'Air_Inlet_Temperature_max'
+        """
+        return '%s_%s' % (name, aggr_method)
+
+    @staticmethod
+    def get_tile_runs(config, aggr_period, days):
+        """
+        This function groups the missing days into runs of consecutive days, each of which is requested from quantumleap in one request.
+        A run has at most as many days as fit into config.history_page_size records of the aggregation period.
+        Example for aggr_period 'minute' (1440 records per day, so 6 days per run):
+        ['2021-01-01', ..., '2021-01-08', '2021-01-10'] -> [['2021-01-01', ..., '2021-01-06'], ['2021-01-07', '2021-01-08'], ['2021-01-10']]
+        """
+        records_per_day = {'second': 86400, 'minute': 1440, 'hour': 24, 'day': 1}.get(aggr_period, 86400)
+        max_days = max(1, config.history_page_size // records_per_day)
+        runs = []
+        for day in days:
+            if runs and day == runs[-1][-1] + np.timedelta64(1, 'D') and len(runs[-1]) < max_days:
+                runs[-1].append(day)
+            else:
+                runs.append([day])
+        return runs
+
+    def fetch_tiles(self, days: list, cache_keys: dict):
+        """
+        This function requests the tiles of all attributes of the entity on consecutive days, the same request already running is waited for instead.
+        """
+        if self.single_flight is None:
+            return self.request_tiles(days, cache_keys)
+        request_key = ('/%s' % self.system, self.entity_id, tuple(self.attr_params), self.aggr_period, self.aggr_method, days[0], days[-1])
+        return self.single_flight.run(request_key, self.request_tiles, days, cache_keys)
+
+    def request_tiles(self, days: list, cache_keys: dict):
+        """
+        This function requests the data of all attributes of the entity on consecutive days from quantumleap in one request,
+        splits them into the tiles of each day and keeps them in the tile_cache.
+        Quantumleap answers 404 if there are no data, then the tiles are kept empty.
+        If the data cannot be requested, the data of these days in the history_cache are returned and no tiles are kept, so they are requested again next time.
+        Illustration of returned data:
+        {
+            np.datetime64('2021-01-02'): {'measured_Temperature': [timestamps, values]}
+        }
+        """
+        first_start, _ = DailyTileCache.get_day_range(days[0])
+        _, last_end = DailyTileCache.get_day_range(days[-1])
         try:
-            read_data = self.ql_client.get_entity_attr_values_by_id(
-                    entity_id=self.entity_id,
-                    attr_name=self.attr_name, from_date=self.from_date)
+            data = self.filter(*self.request_data(first_start, last_end))
+            keep = True
+        except Exception as error:
+            keep = getattr(getattr(error, 'response', None), 'status_code', None) == 404
+            if keep:
+                data = {}
+            else:
+                print('in GetQuantumLeap when getting the tiles of', self.entity_id, days[0], days[-1], 'error message:\n', error)
+                data = {self.attr_params[attr]: self.history_cache.get(cache_keys[attr], first_start) for attr in self.attr_params}
+        tiles = self.split_tiles(data, self.attr_params, days)
+        if keep:
+            for day in days:
+                for attr in self.attr_params:
+                    self.tile_cache.put(cache_keys[attr] + (day,), tiles[day][attr])
+        return tiles
+
+    @staticmethod
+    def split_tiles(data: dict, attr_params: dict, days: list):
+        """
+        This function splits the data of each parameter on consecutive days (in the format returned by the function filter)
+        into the tiles of each day, in the format returned by the function request_tiles. A parameter missing in data gets empty tiles.
+        """
+        empty = [np.array([], dtype='datetime64[ns]'), np.array([], dtype=np.float32)]
+        tiles = {}
+        for day in days:
+            day_start, day_end = DailyTileCache.get_day_range(day)
+            tiles[day] = {attr: DailyTileCache.join([data.get(param, empty)], day_start, day_end) for attr, param in attr_params.items()}
+        return tiles
+
+    def fetch(self, cache_keys: dict, fetch_start, full_requests: dict):
+        """
+        This function requests the data of all attributes of the entity from fetch_start on from quantumleap, and adds them to the history_cache.
+        The attributes without data in the answer are added as empty, so that the next request of the entity starts from now on for all of them.
+        """
+        fetched_until = HistoryCache.now()
+        try:
+            read_data = self.request_data(fetch_start, fetched_until)
         ## temporary
         except Exception as error:
             print('in GetQuantumLeap when getting, error message:\n', error)
@@ -502,14 +991,17 @@ class GetQuantumLeap(Thread):
         #     if response_text == self.expired_token_returned_message and response_status_code == self.expired_token_returned_status_code:
         #         print('token expired, retrying...')
         #         self.manage_token(update_token_anyway=True)
-        #         read_data = self.ql_client.get_entity_attr_values_by_id(
+        #         read_data = self.ql_client.get_entity_by_id(
         #             entity_id=self.entity_id,
-        #             attr_name=self.attr_name, from_date=self.from_date)
+        #             attrs=','.join(self.attr_params), from_date=self.from_date)
         #     else:
-        #         print('in GetQuantumLeap when getting', self.param, 'error response text:\n', response_text, '\nerror response status_code:\n', response_status_code)
+        #         print('in GetQuantumLeap when getting', self.entity_id, 'error response text:\n', response_text, '\nerror response status_code:\n', response_status_code)
         #         read_data = None
-        try:
-            data = self.filter(read_data)
-        except:
-            data = [[], []]
-        self.return_data[self.param] = data
+        if read_data is not None:
+            try:
+                data = self.filter(*read_data)
+                empty = [np.array([], dtype='datetime64[ns]'), np.array([], dtype=np.float32)]
+                for attr, param in self.attr_params.items():
+                    self.history_cache.update(cache_keys[attr], fetch_start, full_requests[cache_keys[attr]], data.get(param, empty), fetched_until)
+            except Exception as error:
+                print('in GetQuantumLeap when parsing', self.entity_id, 'error message:\n', error)
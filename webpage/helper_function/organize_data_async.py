@@ -0,0 +1,409 @@
+"""
+This file contains the class AsyncGetData.
+AsyncGetData is a variant of GetData (helper_function/organize_data.py) which sends all http requests to quantumleap and orion
+concurrently on one asyncio event loop with one pooled http client (httpx), instead of one thread per request.
+It returns the same data as GetData, so that index.py can use either of them (see use_async_client in helper_function/config.py).
+
+The event loop runs in a background thread, the functions called by the call back functions of DASH (e.g. get_history)
+submit their coroutines to this event loop and wait for the result.
+"""
+
+import asyncio
+from concurrent.futures import TimeoutError
+from datetime import datetime
+from threading import Thread
+import numpy as np
+import httpx
+from helper_function.config import WebpageConfig
+from helper_function.history_cache import HistoryCache
+from helper_function.history_tiles import DailyTileCache
+from helper_function.timeseries_store import to_datetime64
+from helper_function.organize_data import GetData, GetQuantumLeap
+from helper_function.circuit_breaker import CircuitOpenError
+
+
+class AsyncGetData(GetData):
+    """
+    This class gets the data from orion and quantumleap via the REST APIs directly with httpx.AsyncClient.
+    Sending commands and the handling of tokens are inherited from GetData.
+    """
+    def __init__(self, config: WebpageConfig):
+        GetData.__init__(self, config)
+        self.loop = asyncio.new_event_loop()
+        self.loop_thread = Thread(target=self.loop.run_forever, name='AsyncGetData', daemon=True)
+        self.loop_thread.start()
+        self.http_client = None  # created in the event loop by the function get_http_client
+        self.running_requests = {}  # {request key: task}, see the function run_single_flight
+
+    def construct_executors(self):
+        """
+        This function replaces the function construct_executors of GetData, the requests run on the event loop instead of thread pools.
+        """
+        return None, None
+
+    def run(self, coroutine, timeout: float = None):
+        """
+        This function runs a coroutine on the event loop of this class and waits for its result.
+        It is called by the call back functions, which run in the threads of the web server.
+        """
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop).result(timeout)
+
+    def get_http_client(self):
+        """
+        This function returns the http client shared by all requests. The connections to the server are pooled,
+        the number of connections is bounded by config.history_max_workers.
+        """
+        if self.http_client is None:
+            self.http_client = httpx.AsyncClient(
+                timeout=self.config.history_request_timeout,
+                limits=httpx.Limits(max_connections=self.config.history_max_workers))
+        return self.http_client
+
+    async def run_single_flight(self, key, coroutine_function, *args):
+        """
+        This function does the same as SingleFlight (helper_function/single_flight.py) on the event loop:
+        it awaits coroutine_function(*args), or the task already running for the same key.
+        The task is shielded, so that a caller giving up (e.g. after its timeout) does not cancel it for the other callers.
+        """
+        task = self.running_requests.get(key)
+        if task is None:
+            task = asyncio.ensure_future(coroutine_function(*args))
+            self.running_requests[key] = task
+            task.add_done_callback(lambda _: self.running_requests.pop(key, None))
+        return await asyncio.shield(task)
+
+    async def get_headers(self, service_path: str):
+        """
+        This function returns the headers of a request to the fiware platform.
+        The token is managed by the function manage_token of GetData, which is run in a thread so that it does not block the event loop.
+        """
+        token = await self.loop.run_in_executor(None, self.manage_token)
+        return {'fiware-service': self.service,
+                'fiware-servicepath': service_path,
+                'Authorization': 'Bearer %s' % token}
+
+    async def get_json(self, url: str, service_path: str, params: dict = None):
+        """
+        This function sends a GET request and returns the decoded json of the response.
+        The request has the timeout of its backend and passes the circuit breaker of its backend, the same as the requests of GetData.
+        """
+        if url.startswith(self.url_orion):
+            timeout, circuit_breaker = self.config.orion_timeout, self.orion_circuit_breaker
+        else:
+            timeout, circuit_breaker = self.config.quantumleap_timeout, self.quantumleap_circuit_breaker
+        if not circuit_breaker.allow_request():
+            raise CircuitOpenError('%s is unavailable, the request to %s is not sent' % (circuit_breaker.name, url))
+        try:
+            response = await self.get_http_client().get(url, params=params, headers=await self.get_headers(service_path),
+                                                        timeout=httpx.Timeout(timeout[1], connect=timeout[0]))
+        except httpx.TransportError:
+            circuit_breaker.record_failure()
+            raise
+        if response.status_code >= 500:
+            circuit_breaker.record_failure()
+        else:
+            circuit_breaker.record_success()
+        response.raise_for_status()
+        return response.json()
+
+    @staticmethod
+    def parse_index(index: list):
+        """
+        This function transforms the timestamps returned by quantumleap (e.g. '2021-01-02T08:00:00.000+00:00')
+        into timezone aware datetimes, the same as FiLiP returns.
+        """
+        return np.array([datetime.fromisoformat(t.replace('Z', '+00:00')) for t in index])
+
+    async def get_history_entity_async(self, system: str, entity_id: str, from_date: datetime, aggr_period: str = None, to_date=None,
+                                       aggr_method: str = None):
+        """
+        This function does the same as the function run of GetQuantumLeap for one entity:
+        it requests the data of all attributes of the entity newer than the last request from quantumleap in one request,
+        adds them to self.history_cache, and returns the data in the cache from from_date on for each parameter.
+        The same request already running is awaited instead of being sent again.
+        The aggregated data of the completed days are taken from self.tile_cache, see the function get_tiles_async.
+        aggr_method is one of the function get_aggregation_methods of GetData.
+        self.history_cache is read in a thread of the executor, because its lock may be held while it saves its files.
+        """
+        attr_params = self.get_attr_params(system, entity_id, aggr_method)
+        cache_keys = {attr: GetQuantumLeap.get_cache_key(self.config, system, entity_id, attr, aggr_period, aggr_method) for attr in attr_params}
+        tile_until = self.tile_cache.get_until(from_date, aggr_period)
+        recent_from = from_date if tile_until is None else np.datetime64(tile_until, 'ns')
+        if to_date is None or to_date >= recent_from:
+            fetch_start, full_requests = await self.loop.run_in_executor(
+                None, self.history_cache.get_fetch_start_group, list(cache_keys.values()), recent_from)
+            request_key = ('/%s' % system, entity_id, tuple(attr_params), aggr_period, aggr_method, fetch_start)
+            await self.run_single_flight(request_key, self.fetch_history_entity_async, system, entity_id, aggr_period, cache_keys, fetch_start,
+                                         full_requests, aggr_method)
+        if tile_until is None and to_date is None:
+            return await self.loop.run_in_executor(
+                None, lambda: {param: self.history_cache.get(cache_keys[attr], from_date) for attr, param in attr_params.items()})
+
+        tiles = {attr: [] for attr in attr_params}
+        if tile_until is not None:
+            last_day = tile_until if to_date is None else min(tile_until, np.datetime64(to_date, 'D') + np.timedelta64(1, 'D'))
+            tiles = await self.get_tiles_async(system, entity_id, aggr_period, DailyTileCache.get_days(from_date, last_day), cache_keys, aggr_method)
+        recent = await self.loop.run_in_executor(None, lambda: {attr: self.history_cache.get(cache_keys[attr], recent_from) for attr in attr_params})
+        return {param: DailyTileCache.join(tiles[attr] + [recent[attr]], from_date, to_date) for attr, param in attr_params.items()}
+
+    async def get_tiles_async(self, system: str, entity_id: str, aggr_period, days, cache_keys: dict, aggr_method: str = None):
+        """
+        This function does the same as the function get_tiles of GetQuantumLeap, the runs of missing days are requested concurrently.
+        The tiles are read from the files of self.tile_cache in a thread of the executor, so that the event loop is not blocked.
+        """
+        attr_params = self.get_attr_params(system, entity_id, aggr_method)
+        tiles = await self.loop.run_in_executor(
+            None, lambda: {day: {attr: self.tile_cache.get(cache_keys[attr] + (day,)) for attr in attr_params} for day in days})
+        missing = [day for day in days if any(tile is None for tile in tiles[day].values())]
+        runs = GetQuantumLeap.get_tile_runs(self.config, aggr_period, missing)
+        for run_tiles in await asyncio.gather(*[
+                self.run_single_flight(('/%s' % system, entity_id, tuple(attr_params), aggr_period, aggr_method, run_days[0], run_days[-1]),
+                                       self.request_tiles_async, system, entity_id, aggr_period, run_days, cache_keys, aggr_method)
+                for run_days in runs]):
+            tiles.update(run_tiles)
+        return {attr: [tiles[day][attr] for day in days] for attr in attr_params}
+
+    async def request_tiles_async(self, system: str, entity_id: str, aggr_period, days: list, cache_keys: dict, aggr_method: str = None):
+        """
+        This function does the same as the function request_tiles of GetQuantumLeap.
+        The tiles are saved to the files of self.tile_cache in a thread of the executor, so that the event loop is not blocked.
+        """
+        attr_params = self.get_attr_params(system, entity_id, aggr_method)
+        first_start, _ = DailyTileCache.get_day_range(days[0])
+        _, last_end = DailyTileCache.get_day_range(days[-1])
+        try:
+            data_time, values = await self.request_history_entity_async(system, entity_id, aggr_period, first_start, last_end, aggr_method)
+            data = {attr_params[attr]: GetQuantumLeap.filter_values(self.config, attr_params[attr], data_time, value)
+                    for attr, value in values.items() if attr in attr_params}
+            keep = True
+        except Exception as error:
+            keep = getattr(getattr(error, 'response', None), 'status_code', None) == 404
+            if keep:
+                data = {}
+            else:
+                print('in request_tiles_async when getting', system, entity_id, days[0], days[-1], 'error message:\n', error)
+                data = await self.loop.run_in_executor(
+                    None, lambda: {attr_params[attr]: self.history_cache.get(cache_keys[attr], first_start) for attr in attr_params})
+        tiles = GetQuantumLeap.split_tiles(data, attr_params, days)
+        if keep:
+            def put_tiles():
+                for day in days:
+                    for attr in attr_params:
+                        self.tile_cache.put(cache_keys[attr] + (day,), tiles[day][attr])
+            await self.loop.run_in_executor(None, put_tiles)
+        return tiles
+
+    async def fetch_history_entity_async(self, system: str, entity_id: str, aggr_period, cache_keys: dict, fetch_start, full_requests: dict,
+                                         aggr_method: str = None):
+        """
+        This function requests the data of all attributes of the entity from fetch_start on from quantumleap, and adds them to self.history_cache.
+        self.history_cache is updated in a thread of the executor, because HistoryCache.update saves the cache to files from time to time,
+        which would block the event loop.
+        """
+        attr_params = self.get_attr_params(system, entity_id, aggr_method)
+        fetched_until = HistoryCache.now()
+        try:
+            data_time, values = await self.request_history_entity_async(system, entity_id, aggr_period, fetch_start, fetched_until, aggr_method)
+
+            def update_cache():
+                empty = [np.array([], dtype='datetime64[ns]'), np.array([], dtype=np.float32)]
+                for attr, param in attr_params.items():
+                    data = GetQuantumLeap.filter_values(self.config, param, data_time, values[attr]) if attr in values else empty
+                    self.history_cache.update(cache_keys[attr], fetch_start, full_requests[cache_keys[attr]], data, fetched_until)
+            await self.loop.run_in_executor(None, update_cache)
+        except Exception as error:
+            print('in fetch_history_entity_async when getting', system, entity_id, 'error message:\n', error)
+
+    def get_arrays(self, read_data: dict):
+        """
+        This function does the same as the function get_arrays of GetQuantumLeap for the json returned by quantumleap.
+        """
+        return (to_datetime64(self.parse_index(read_data['index'])),
+                {attribute['attrName']: np.array(attribute['values'], dtype=object) for attribute in read_data['attributes']})
+
+    async def request_history_entity_async(self, system: str, entity_id: str, aggr_period, fetch_start, to_date=None, aggr_method: str = None):
+        """
+        This function does the same as the function request_data of GetQuantumLeap:
+        large results of raw data are counted first and then requested in pages concurrently, at most config.history_page_workers at a time.
+        """
+        attr_params = self.get_attr_params(system, entity_id, aggr_method)
+        url, service_path = self.url_quantum_leap + 'v2/entities/%s' % entity_id, '/%s' % system
+        params = {'attrs': ','.join(attr_params), 'fromDate': HistoryCache.format_date(fetch_start)}
+        if to_date is not None:
+            params['toDate'] = HistoryCache.format_date(to_date)
+        if aggr_period is not None:
+            params.update({'aggrMethod': aggr_method or self.config.history_aggregation_method, 'aggrPeriod': aggr_period})
+            return self.get_arrays(await self.get_json(url, service_path, params=params))
+
+        if to_date is None:
+            params['toDate'] = HistoryCache.format_date(HistoryCache.now())
+        try:
+            count_data = await self.get_json(url, service_path, params=dict(params, aggrMethod='count'))
+            total = max([int(attribute['values'][0]) for attribute in count_data['attributes']
+                         if len(attribute['values']) > 0 and attribute['values'][0] is not None], default=0)
+        except Exception as error:
+            print('in request_history_entity_async when counting', system, entity_id, 'error message:\n', error)
+            total = None
+        page_size = self.config.history_page_size
+        if total is None or total <= page_size:
+            return self.get_arrays(await self.get_json(url, service_path, params=params))
+
+        semaphore = asyncio.Semaphore(self.config.history_page_workers)
+
+        async def request_page(offset):
+            async with semaphore:
+                return self.get_arrays(await self.get_json(url, service_path, params=dict(params, limit=page_size, offset=offset)))
+
+        offsets = list(range(0, total, page_size))
+        pages = list(await asyncio.gather(*[request_page(offset) for offset in offsets]))
+        # quantumleap counts the values of each attribute, records with only null values may not have been counted
+        while len(pages[-1][0]) == page_size:
+            offsets.append(offsets[-1] + page_size)
+            pages.append(await request_page(offsets[-1]))
+        return GetQuantumLeap.join_pages(pages, list(attr_params))
+
+    async def get_history_async(self, systems: list, fromDate_str: str, timeout: float, aggr_period: str = None, stale: set = None,
+                                toDate_str: str = None):
+        """
+        This function requests the historical data of all entities of all given control systems concurrently.
+        If the request of an entity fails or does not finish within the timeout, its cached data are returned and marked as stale.
+        The format of the returned data and the parameters stale and toDate_str are explained in the function get_history of GetData.
+        """
+        from_date = HistoryCache.parse_date(fromDate_str)
+        to_date = HistoryCache.parse_date(toDate_str) if toDate_str is not None else None
+        entities = [(system, entity, aggr_method) for system in systems for entity in self.history_structure[system]
+                    for aggr_method in self.get_aggregation_methods(aggr_period)]
+        tasks = [asyncio.ensure_future(self.get_history_entity_async(system, entity, from_date, aggr_period, to_date, aggr_method))
+                 for system, entity, aggr_method in entities]
+        await asyncio.wait(tasks, timeout=timeout)
+
+        history = {system: {} for system in systems}
+        for (system, entity, aggr_method), task in zip(entities, tasks):
+            if not task.done():
+                # the request keeps filling the cache in the background, its error is retrieved when it finishes
+                task.add_done_callback(self.retrieve_exception)
+                print('in get_history_async, timeout when getting', system, entity, aggr_method or '')
+            elif task.cancelled() or task.exception() is not None:
+                print('in get_history_async when getting', system, entity, aggr_method or '', 'error message:\n',
+                      'cancelled' if task.cancelled() else task.exception())
+            else:
+                history[system].update(task.result())
+                continue
+            history[system].update(await self.loop.run_in_executor(
+                None, self.get_cached_history, system, entity, from_date, aggr_period, to_date, aggr_method))
+            if stale is not None:
+                stale.update((system, param) for param in self.get_attr_params(system, entity, aggr_method).values())
+        return history
+
+    @staticmethod
+    def retrieve_exception(task):
+        """
+        This function prints the error of a task which was no longer awaited, e.g. after the timeout of the function get_history_async,
+        so that asyncio does not report the error as never retrieved.
+        """
+        if not task.cancelled() and task.exception() is not None:
+            print('in retrieve_exception, error message:\n', task.exception())
+
+    def get_history(self, systems: list, fromDate_str: str, timeout: float = None, max_points: int = None, aggr_period: str = None,
+                    stale: set = None, toDate_str: str = None):
+        """
+        This function does the same as the function get_history of GetData, but all requests are sent on the event loop.
+        """
+        if timeout is None:
+            timeout = self.config.history_request_timeout
+        return self.downsample_history(self.run(self.get_history_async(systems, fromDate_str, timeout, aggr_period, stale, toDate_str)), max_points)
+
+    async def get_switch_history_async(self, fromDate_str: str):
+        """
+        This function does the same as the function get_switch_history of GetData, the history values of relai1 and relai2 are requested in one request.
+        """
+        from_date = HistoryCache.parse_date(fromDate_str)
+        cache_keys = self.get_switch_cache_keys()
+        fetch_start, full_requests = await self.loop.run_in_executor(None, self.history_cache.get_fetch_start_group, cache_keys, from_date)
+        request_key = ('/', self.relais_entity_id, tuple(self.relais_switch_attrs), None, fetch_start)
+        await self.run_single_flight(request_key, self.fetch_switch_history_async, fetch_start, full_requests)
+        return await self.loop.run_in_executor(None, self.organize_switch_history, from_date)
+
+    async def fetch_switch_history_async(self, fetch_start, full_requests: dict):
+        """
+        This function requests the history values of relai1 and relai2 from fetch_start on, and adds them to self.history_cache
+        in a thread of the executor, the same as the function fetch_history_entity_async.
+        """
+        fetched_until = HistoryCache.now()
+        params = {'attrs': ','.join(self.relais_switch_attrs), 'fromDate': HistoryCache.format_date(fetch_start),
+                  'toDate': HistoryCache.format_date(fetched_until)}
+        try:
+            relais_ql_data = await self.get_json(self.url_quantum_leap + 'v2/entities/%s' % self.relais_entity_id, '/', params=params)
+            relai_values = {attribute['attrName']: np.array(attribute['values']) for attribute in relais_ql_data['attributes']}
+            time_relai, relai1, relai2 = self.switch_history_filter_values(
+                self.parse_index(relais_ql_data['index']),
+                *[relai_values[attr] for attr in self.relais_switch_attrs])
+            await self.loop.run_in_executor(None, self.update_switch_history, fetch_start, full_requests, time_relai, relai1, relai2, fetched_until)
+        except Exception as error:
+            print('in fetch_switch_history_async, error message:\n', error)
+
+    def get_switch_history(self, fromDate_str, timeout: float = None):
+        """
+        This function does the same as the function get_switch_history of GetData, including the timeout.
+        """
+        try:
+            return self.run(self.get_switch_history_async(fromDate_str), timeout)
+        except TimeoutError:
+            # the request keeps filling the cache in the background
+            print('in get_switch_history, timeout when getting the relais')
+            return self.organize_switch_history(HistoryCache.parse_date(fromDate_str))
+
+    async def get_relais_switch_async(self):
+        """
+        This function does the same as the function get_relais_switch of GetData.
+        """
+        try:
+            data_read = await self.get_json(
+                self.url_orion + 'v2/entities/actuator:Relais_Switch:DO4-1/attrs', '/',
+                params={'type': 'actuator:Relais_Switch', 'options': 'keyValues'})
+            return {relai: data_read[relai] for relai in
+                    ['current_State_Relais1', 'current_State_Relais2', 'current_State_Relais3', 'current_State_Relais4']}
+        except Exception as error:
+            print('in get_relais_switch_async, error message:\n', error)
+            return {
+                'current_State_Relais1': self.null_value,
+                'current_State_Relais2': self.null_value,
+                'current_State_Relais3': self.null_value,
+                'current_State_Relais4': self.null_value
+            }
+
+    def get_relais_switch(self):
+        return self.run(self.get_relais_switch_async())
+
+    async def get_current_value_async(self, system: str):
+        """
+        This function does the same as the function get_current_value of GetData, with the same self.extraction_plan.
+        """
+        try:
+            data_read = await self.get_json(self.url_orion + 'v2/entities', '/%s' % system,
+                                            params={'options': 'keyValues', 'limit': 1000})
+        except Exception as error:
+            print('in get_current_value_async, error message:\n', error)
+            return self.return_null_orion()
+
+        plan = self.extraction_plan[system]
+        current_value = dict.fromkeys(self.current_values_display_param_list[system], self.null_value)
+        for item in data_read:
+            for attr, param in plan.get(item.get('id'), ()):
+                try:
+                    current_value[param] = round(float(item[attr]), self.config.display_digits)
+                except (KeyError, TypeError, ValueError):
+                    pass
+        return current_value
+
+    def get_current_value(self, system: str):
+        return self.run(self.get_current_value_async(system))
+
+    def __del__(self):
+        """
+        When this class is terminated, close the http client and stop the event loop
+        """
+        if self.http_client is not None:
+            self.run(self.http_client.aclose())
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        GetData.__del__(self)
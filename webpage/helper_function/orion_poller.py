@@ -0,0 +1,133 @@
+"""
+This file contains the class OrionPoller.
+Instead of every open browser tab reading the relais and the current values from orion by itself,
+one OrionPoller per server process reads them on a fixed clock, and the call back function only reads the latest snapshot.
+Therefore the load on orion does not depend on the number of viewers of the dashboard.
+When the server runs several worker processes, only one of them reads orion, and the snapshot is shared via a SharedStore
+(helper_function/shared_state.py).
+"""
+
+import time
+from threading import Thread, Lock, Event
+from helper_function.organize_data import GetData
+from helper_function.shared_state import SharedStore
+
+
+class OrionPoller(Thread):
+    """
+    This class is a daemon thread that reads the relais and the current values of the active control system from orion
+    every 'interval' seconds via GetData, and keeps the result as a snapshot.
+    Illustration of the snapshot:
+    {
+        'switch': {
+            'current_State_Relais1': 1,
+            'current_State_Relais2': 0,
+            'current_State_Relais3': 1,
+            'current_State_Relais4': 1
+        },
+        'system': 'lcgw',
+        'data': {
+            'Air_Inlet_Temperature': 10,
+            'Air_Inlet_Humidity': 50
+        },
+        'update_time': 1622707200.0
+    }
+    'system' is the active control system ('plc', 'ed', or 'lcgw'), or None if the relais cannot be read,
+    in this case 'data' is the return of GetData.return_null_orion.
+
+    If shared_store is given, only the process which holds the role 'orion_poller' of the shared_store reads orion,
+    and the snapshot is read from the shared_store by all processes. If that process exits, another one takes over the role.
+    """
+    def __init__(self, get_data: GetData, interval: float, shared_store: SharedStore = None):
+        Thread.__init__(self, name='OrionPoller', daemon=True)
+        self.get_data = get_data
+        self.interval = interval
+        self.lock = Lock()
+        self.stop_event = Event()
+        self.shared_store = shared_store
+        self.snapshot = {
+            'switch': {
+                'current_State_Relais1': get_data.null_value,
+                'current_State_Relais2': get_data.null_value,
+                'current_State_Relais3': get_data.null_value,
+                'current_State_Relais4': get_data.null_value
+            },
+            'system': None,
+            'data': get_data.return_null_orion(),
+            'update_time': 0
+        }
+
+    @staticmethod
+    def get_control_system(switch: dict):
+        """
+        This function returns the active control system according to the relais, or None if the relais cannot be read.
+        """
+        if switch['current_State_Relais1'] == 1:
+            return 'lcgw'
+        elif switch['current_State_Relais2'] == 0:
+            return 'plc'
+        elif switch['current_State_Relais2'] == 1:
+            return 'ed'
+        return None
+
+    def poll(self):
+        """
+        This function reads the relais and the current values from orion once, and replaces the snapshot.
+        """
+        switch = self.get_data.get_relais_switch()
+        system = self.get_control_system(switch)
+        if system is not None:
+            data = self.get_data.get_current_value(system)
+        else:  # cannot read anything
+            data = self.get_data.return_null_orion()
+        self.publish({'switch': switch, 'system': system, 'data': data, 'update_time': time.time()})
+
+    def publish(self, snapshot: dict):
+        """
+        This function replaces the snapshot, also in the shared_store if given.
+        """
+        with self.lock:
+            self.snapshot = snapshot
+        if self.shared_store is not None:
+            try:
+                self.shared_store.write('orion_snapshot', snapshot)
+            except Exception as error:
+                print('in OrionPoller.publish, error message:\n', error)
+
+    def get_snapshot(self):
+        """
+        This function returns the latest snapshot. The snapshot is replaced as a whole by the function poll, and should not be changed by the caller.
+        """
+        if self.shared_store is not None:
+            snapshot = self.shared_store.read('orion_snapshot')
+            if snapshot is not None:
+                return snapshot
+        with self.lock:
+            return self.snapshot
+
+    def is_leader(self):
+        """
+        This function returns whether this process reads orion, always True without a shared_store.
+        """
+        return self.shared_store is None or self.shared_store.try_lead('orion_poller')
+
+    def run(self):
+        """
+        This function is inherited from Thread, therefore please don't change the function's name.
+        The snapshot is refreshed on a fixed clock, a slow request delays only the current refresh instead of all following ones.
+        """
+        next_time = time.monotonic()
+        while not self.stop_event.is_set():
+            try:
+                if self.is_leader():
+                    self.poll()
+            except Exception as error:
+                print('in OrionPoller, error message:\n', error)
+            next_time += self.interval
+            now = time.monotonic()
+            if next_time < now:  # the refresh took longer than the interval, skip the missed ticks
+                next_time = now
+            self.stop_event.wait(next_time - now)
+
+    def stop(self):
+        self.stop_event.set()
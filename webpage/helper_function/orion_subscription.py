@@ -0,0 +1,242 @@
+"""
+This file contains the class OrionSubscriber.
+OrionSubscriber registers subscriptions in orion for the entities in config.data_structure and the relais,
+orion then posts a notification to an endpoint on the flask server of the dashboard whenever an attribute changes.
+The latest values are kept in memory and provided as the same snapshot as OrionPoller (helper_function/orion_poller.py),
+so that the call back functions do not need to know whether the values are polled or pushed.
+When the server runs several worker processes, the notification can arrive at any of them, therefore the latest values and the snapshot
+are then kept in the SharedStore (helper_function/shared_state.py), and only one process registers the subscriptions and reads orion.
+
+The endpoint only accepts a notification which carries the secret in the header config.orion_notification_header
+(given to orion with the subscriptions), and the id of one of the subscriptions registered by this dashboard, otherwise it answers 403.
+The notifications can also be posted by any other http client (e.g. the fake orion of test_orion_subscription.py) to config.orion_notification_path,
+the body has to be the notification format of orion with attrsFormat 'keyValues':
+{
+    "subscriptionId": "60b8d6c0e8a2d2a1f4f1a8a1",
+    "data": [
+        {
+            "id": "sensor:Multisensor:Air_Inlet_PLC",
+            "type": "sensor:Multisensor",
+            "measured_Temperature": 21.3
+        }
+    ]
+}
+"""
+
+import hmac
+import secrets
+import time
+from flask import request
+from helper_function.organize_data import GetData
+from helper_function.orion_poller import OrionPoller
+from helper_function.shared_state import SharedStore
+
+
+class OrionSubscriber(OrionPoller):
+    """
+    This class is a daemon thread which registers the subscriptions in orion, reads all current values once,
+    and then only reads them again every config.orion_resync_interval seconds in case a notification is lost.
+    Between, the snapshot is updated by the notifications posted to the endpoint registered by the function register_endpoint.
+    As long as not all service paths are subscribed (e.g. orion was unreachable at the start), the subscriptions are retried
+    and the values are read every config.orion_refresh_interval seconds, the same as OrionPoller does.
+    """
+    relais_entity_id = 'actuator:Relais_Switch:DO4-1'
+    relais_entity_type = 'actuator:Relais_Switch'
+    relais_attrs = ['current_State_Relais1', 'current_State_Relais2', 'current_State_Relais3', 'current_State_Relais4']
+
+    def __init__(self, get_data: GetData, shared_store: SharedStore = None):
+        OrionPoller.__init__(self, get_data, get_data.config.orion_resync_interval, shared_store)
+        self.config = get_data.config
+        self.description = 'iotteststand dashboard %s' % self.config.orion_notification_url
+        self.entity_values = {}  # {entity id: {attribute: latest value}}
+        self.subscription_ids = {}  # {fiware service path: id of the subscription registered by this dashboard}
+        self.secret = self.get_secret()
+
+    def get_secret(self):
+        """
+        This function returns the secret which orion sends with every notification: config.orion_notification_secret if set,
+        otherwise a random secret, which is the same for all processes if the shared_store is given.
+        """
+        if self.config.orion_notification_secret:
+            return self.config.orion_notification_secret
+        if self.shared_store is not None:
+            return self.shared_store.update('orion_notification_secret', lambda secret: secret or secrets.token_hex(16))
+        return secrets.token_hex(16)
+
+    def register_endpoint(self, server):
+        """
+        This function adds the endpoint receiving the notifications of orion to the flask server (server of app.py).
+        """
+        def orion_notification():
+            notification = request.get_json(force=True, silent=True)
+            if not self.is_authentic(request.headers.get(self.config.orion_notification_header, ''), notification):
+                return '', 403
+            self.handle_notification(notification)
+            return '', 204
+        server.add_url_rule(self.config.orion_notification_path, 'orion_notification', orion_notification, methods=['POST'])
+
+    def is_authentic(self, secret: str, notification):
+        """
+        This function returns whether a notification was posted by orion for one of the subscriptions of this dashboard:
+        the secret in its header has to be self.secret, and its subscriptionId one of the registered subscriptions.
+        """
+        if not hmac.compare_digest(secret.encode(), self.secret.encode()):
+            return False
+        return isinstance(notification, dict) and notification.get('subscriptionId') in self.get_subscription_ids()
+
+    def get_subscription_ids(self):
+        """
+        This function returns the ids of the subscriptions registered by this dashboard, from the shared_store if given.
+        """
+        if self.shared_store is not None:
+            return set(self.shared_store.read('orion_subscription_ids', {}).values())
+        with self.lock:
+            return set(self.subscription_ids.values())
+
+    def get_subscribed_entities(self):
+        """
+        This function returns the entities and attributes to subscribe for each fiware service path.
+        Illustration of returned data:
+        {
+            '/plc': {'sensor:Multisensor:Air_Inlet_PLC': ['measured_Temperature', 'measured_Relative_Humidity']},
+            '/': {'actuator:Relais_Switch:DO4-1': ['current_State_Relais1', 'current_State_Relais2']}
+        }
+        """
+        subscribed = {'/': {self.relais_entity_id: list(self.relais_attrs)}}
+        for system in self.config.data_structure:
+            subscribed['/%s' % system] = {}
+            for param in self.config.data_structure[system]:
+                entity = self.config.data_structure[system][param]['entity']
+                attribute = self.config.data_structure[system][param]['attribute']
+                subscribed['/%s' % system].setdefault(entity, []).append(attribute)
+        return subscribed
+
+    def register_subscriptions(self, service_paths: list = None):
+        """
+        This function posts one subscription per fiware service path to orion (for the given service paths, all by default),
+        and returns the service paths which could not be subscribed, e.g. because orion is unreachable, so that they can be retried.
+        Subscriptions of this dashboard left from a previous run (same description) are deleted before,
+        so that they do not pile up in orion on every restart.
+        The secret is given to orion as a custom header of the notifications ('httpCustom' instead of 'http').
+        A notification sent by orion before the id of its subscription is known is rejected, the following resync reads the values instead.
+        """
+        subscription_ids, failed = {}, []
+        for service_path, entities in self.get_subscribed_entities().items():
+            if service_paths is not None and service_path not in service_paths:
+                continue
+            cb_client = self.get_data.get_cb_client(service_path)
+            try:
+                for subscription in cb_client.get_subscription_list():
+                    if subscription.description == self.description:
+                        cb_client.delete_subscription(subscription.id)
+                subscription_id = cb_client.post_subscription(subscription={
+                    'description': self.description,
+                    'subject': {
+                        'entities': [{'id': entity} for entity in entities],
+                        'condition': {'attrs': sorted({attr for attrs in entities.values() for attr in attrs})}
+                    },
+                    'notification': {
+                        'httpCustom': {
+                            'url': self.config.orion_notification_url,
+                            'headers': {self.config.orion_notification_header: self.secret}
+                        },
+                        'attrs': sorted({attr for attrs in entities.values() for attr in attrs}),
+                        'attrsFormat': 'keyValues'
+                    },
+                    'throttling': 0
+                })
+                subscription_ids[service_path] = subscription_id
+            except Exception as error:
+                print('in register_subscriptions, error when subscribing', service_path, 'error message:\n', error)
+                failed.append(service_path)
+        if self.shared_store is not None:
+            self.shared_store.update('orion_subscription_ids', lambda ids: dict(ids, **subscription_ids), {})
+        else:
+            with self.lock:
+                self.subscription_ids.update(subscription_ids)
+        return failed
+
+    def resync(self):
+        """
+        This function reads all subscribed entities from orion, and replaces the latest values and the snapshot.
+        """
+        entity_values = {}
+        for service_path, entities in self.get_subscribed_entities().items():
+            cb_client = self.get_data.get_cb_client(service_path)
+            try:
+                for item in cb_client.get_entity_list(response_format='keyValues'):
+                    if item.id in entities:
+                        entity_values[item.id] = item.dict()
+            except Exception as error:
+                print('in resync, error when reading', service_path, 'error message:\n', error)
+        self.update_entities(entity_values)
+        self.update_snapshot()
+
+    def handle_notification(self, notification: dict):
+        """
+        This function takes the body of a notification of orion, and updates the latest values and the snapshot.
+        """
+        self.update_entities({entity['id']: entity for entity in notification.get('data', [])})
+        self.update_snapshot()
+
+    def update_entities(self, entity_values: dict):
+        """
+        This function adds the latest values {entity id: {attribute: value}} to self.entity_values, or to the shared_store if given.
+        """
+        def merge(values):
+            for entity_id, attributes in entity_values.items():
+                values.setdefault(entity_id, {}).update(attributes)
+            return values
+        if self.shared_store is not None:
+            self.shared_store.update('orion_entity_values', merge, {})
+        else:
+            with self.lock:
+                merge(self.entity_values)
+
+    def get_entity_values(self):
+        """
+        This function returns a copy of the latest values {entity id: {attribute: value}}.
+        """
+        if self.shared_store is not None:
+            return self.shared_store.read('orion_entity_values', {})
+        with self.lock:
+            return {entity_id: dict(attributes) for entity_id, attributes in self.entity_values.items()}
+
+    def get_value(self, entity_values: dict, entity_id: str, attribute: str):
+        """
+        This function returns the latest value of an attribute rounded to config.display_digits, or the null value if it is unknown.
+        """
+        try:
+            return round(float(entity_values[entity_id][attribute]), self.config.display_digits)
+        except (KeyError, TypeError, ValueError):
+            return self.get_data.null_value
+
+    def update_snapshot(self):
+        """
+        This function builds the snapshot (see OrionPoller) from the latest values.
+        """
+        entity_values = self.get_entity_values()
+        switch = {relai: self.get_value(entity_values, self.relais_entity_id, relai) for relai in self.relais_attrs}
+        system = self.get_control_system(switch)
+        if system is not None:
+            data = {param: self.get_value(entity_values, self.config.data_structure[system][param]['entity'],
+                                          self.config.data_structure[system][param]['attribute'])
+                    for param in self.get_data.current_values_display_param_list[system]}
+        else:
+            data = self.get_data.return_null_orion()
+        self.publish({'switch': switch, 'system': system, 'data': data, 'update_time': time.time()})
+
+    def run(self):
+        """
+        This function is inherited from Thread, therefore please don't change the function's name.
+        """
+        unsubscribed = None  # service paths still to be subscribed, None means all
+        while not self.stop_event.is_set():
+            try:
+                if self.is_leader():
+                    if unsubscribed is None or unsubscribed:
+                        unsubscribed = self.register_subscriptions(unsubscribed)
+                    self.resync()
+            except Exception as error:
+                print('in OrionSubscriber, error message:\n', error)
+            self.stop_event.wait(self.interval if unsubscribed == [] else self.config.orion_refresh_interval)
@@ -0,0 +1,210 @@
+"""
+This file contains the classes SharedStore and SharedTimedCache.
+When the dashboard is served by several worker processes (gunicorn, see gunicorn.conf.py), every process has its own memory,
+so the state which has to be the same for all processes is kept in files in config.shared_state_dir instead:
+- the snapshot of the current values from orion, which is read from orion by only one process (see OrionPoller)
+- the cached historical data and figures, which are computed by only one process per refresh period (see index.py)
+The files are replaced atomically and locked with fcntl, which works on linux (the docker image) and macOS.
+"""
+
+import os
+import time
+import fcntl
+import pickle
+import hashlib
+import tempfile
+from contextlib import contextmanager
+
+
+class SharedStore:
+    """
+    This class is a key-value store in a directory, shared by all processes of the server. Keys are strings, values any picklable data.
+
+    parameter directory: the directory of the files, created if it does not exist
+    """
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(self.directory, exist_ok=True)
+        self.leader_files = {}  # {name: open lock file} of the roles this process holds, see the function try_lead
+
+    def get_path(self, key: str, suffix: str = '.pickle'):
+        return os.path.join(self.directory, key + suffix)
+
+    @staticmethod
+    def is_current_file(lock_file, path: str):
+        """
+        This function returns whether the open lock_file is still the file at path, i.e. it has not been deleted (and created again) by remove_lock.
+        """
+        try:
+            return os.fstat(lock_file.fileno()).st_ino == os.stat(path).st_ino
+        except FileNotFoundError:
+            return False
+
+    @contextmanager
+    def lock(self, key: str):
+        """
+        This function locks a key for all processes and threads until the with block ends.
+        If the lock file was deleted by the function remove_lock while waiting for its lock, the new lock file is locked instead.
+        Example:
+            with shared_store.lock('orion_entity_values'):
+                ...
+        """
+        path = self.get_path(key, '.lock')
+        while True:
+            lock_file = open(path, 'a')
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            if self.is_current_file(lock_file, path):
+                break
+            lock_file.close()
+        with lock_file:
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def remove_lock(self, key: str):
+        """
+        This function deletes the lock file of a key if no process holds its lock, and returns whether it was deleted.
+        The file is deleted while its lock is held, the processes waiting for it notice this in the function lock and lock a new file.
+        """
+        path = self.get_path(key, '.lock')
+        try:
+            lock_file = open(path, 'r')  # not 'a', which would create the file again
+        except FileNotFoundError:
+            return False
+        with lock_file:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                return False
+            if not self.is_current_file(lock_file, path):
+                return False
+            os.remove(path)
+            return True
+
+    def read(self, key: str, default=None):
+        """
+        This function returns the value of a key, or default if the key has never been written or cannot be read.
+        """
+        try:
+            with open(self.get_path(key), 'rb') as file:
+                return pickle.load(file)
+        except FileNotFoundError:
+            return default
+        except Exception as error:
+            print('in SharedStore.read, error when reading', key, 'error message:\n', error)
+            return default
+
+    def write(self, key: str, value):
+        """
+        This function writes the value of a key. The value is first written to a temporary file which then replaces the file of the key,
+        so that other processes never read a half written file.
+        """
+        file, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(file, 'wb') as tmp_file:
+                pickle.dump(value, tmp_file, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, self.get_path(key))
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def update(self, key: str, function, default=None):
+        """
+        This function replaces the value of a key by function(value) while the key is locked, and returns the new value.
+        Example: shared_store.update('counter', lambda value: value + 1, 0)
+        """
+        with self.lock(key):
+            value = function(self.read(key, default))
+            self.write(key, value)
+            return value
+
+    def try_lead(self, name: str):
+        """
+        This function returns whether this process holds the role 'name', e.g. reading orion for all processes.
+        The first process calling it gets the role and keeps it until it exits, then the next process calling it gets the role.
+        """
+        if name in self.leader_files:
+            return True
+        lock_file = open(self.get_path(name, '.leader'), 'a')
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+        self.leader_files[name] = lock_file
+        return True
+
+
+class SharedTimedCache:
+    """
+    This class does the same as TimedCache (helper_function/timed_cache.py) for all processes of the server:
+    the entries are files in the subdirectory 'name' of the SharedStore, and a value is computed by only one process and thread at a time.
+
+    parameter shared_store: the SharedStore of the server
+    parameter name: name of the cache, e.g. 'history_figure'
+    parameter ttl: seconds, how long an entry is valid
+    parameter max_entries: maximum number of entries, the oldest ones are deleted
+    """
+    def __init__(self, shared_store: SharedStore, name: str, ttl: float, max_entries: int = 32):
+        self.store = SharedStore(os.path.join(shared_store.directory, name))
+        self.ttl = ttl
+        self.max_entries = max_entries
+
+    @staticmethod
+    def get_file_key(key):
+        return hashlib.sha1(repr(key).encode()).hexdigest()
+
+    def get(self, key):
+        """
+        This function returns the value of a key, or None if the key is not cached or has expired.
+        """
+        entry = self.store.read(self.get_file_key(key))
+        if entry is None or entry[0] <= time.time():
+            return None
+        return entry[1]
+
+    def put(self, key, value):
+        self.store.write(self.get_file_key(key), (time.time() + self.ttl, value))
+        self.drop_old_entries()
+
+    def get_or_compute(self, key, compute):
+        """
+        This function returns the cached value of a key, or calls compute() and caches its return.
+        If another process or thread is already computing the value of this key, this function waits for it instead of computing it again.
+        """
+        value = self.get(key)
+        if value is not None:
+            return value
+        with self.store.lock(self.get_file_key(key)):
+            value = self.get(key)  # computed by another process while waiting for the lock
+            if value is None:
+                value = compute()
+                if value is not None:
+                    self.put(key, value)
+        return value
+
+    def drop_old_entries(self):
+        """
+        This function deletes the expired entries and the oldest entries above self.max_entries, by the modification time of the files.
+        The lock file of an entry is only deleted when it is older than self.ttl and its lock is not held, see SharedStore.remove_lock.
+        """
+        entries = []
+        expire_time = time.time() - self.ttl
+        for name in os.listdir(self.store.directory):
+            try:
+                modified = os.path.getmtime(os.path.join(self.store.directory, name))
+            except FileNotFoundError:
+                continue
+            if name.endswith('.pickle'):
+                entries.append((modified, name[:-len('.pickle')]))
+            elif name.endswith('.lock') and modified < expire_time:
+                self.store.remove_lock(name[:-len('.lock')])
+        entries.sort(reverse=True)
+        for index, (modified, file_key) in enumerate(entries):
+            if index >= self.max_entries or modified < expire_time:
+                try:
+                    os.remove(self.store.get_path(file_key))
+                except FileNotFoundError:
+                    pass
@@ -0,0 +1,45 @@
+"""
+This file contains the class SingleFlight.
+When several browser sessions refresh the historical graphs at the same time (e.g. right after the server has started,
+or when the refresh intervals of many sessions line up), they would send the same requests to quantumleap at the same time.
+With SingleFlight, only the first of the identical requests is sent, and the others wait for its result.
+"""
+
+from threading import Lock
+from concurrent.futures import Future
+
+
+class SingleFlight:
+    """
+    This class calls a function only once for all threads asking for the same key at the same time.
+    Unlike TimedCache (helper_function/timed_cache.py), the result is not kept: a call after the running one has finished calls the function again.
+    """
+    def __init__(self):
+        self.lock = Lock()
+        self.running = {}  # {key: Future of the running call}
+
+    def run(self, key, function, *args, **kwargs):
+        """
+        This function returns function(*args, **kwargs). If another thread is already running it for the same key,
+        this function waits for that call and returns its result (or raises its error) instead.
+        Example: single_flight.run(('/plc', 'sensor:Multisensor:Air_Inlet_PLC', ...), ql_obj.fetch, fetch_start, full_requests)
+        """
+        with self.lock:
+            future = self.running.get(key)
+            is_first = future is None
+            if is_first:
+                future = Future()
+                self.running[key] = future
+        if not is_first:
+            return future.result()
+        try:
+            result = function(*args, **kwargs)
+        except BaseException as error:
+            future.set_exception(error)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self.lock:
+                del self.running[key]
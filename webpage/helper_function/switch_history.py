@@ -0,0 +1,100 @@
+"""
+This file contains the class SwitchSegments.
+SwitchSegments transforms the history values of relai1 and relai2 into the periods in which each control system was active,
+with numpy instead of a python loop, and keeps the periods, so that on a refresh only the new values of the relais have to be processed.
+It is used by GetData (helper_function/organize_data.py) and AsyncGetData (helper_function/organize_data_async.py).
+"""
+
+from threading import Lock
+import numpy as np
+from helper_function.timeseries_store import to_plot_time
+
+
+class SwitchSegments:
+    """
+    This class keeps the start time and the control system of every control period.
+    Illustration of self.starts and self.codes:
+        self.starts = np.array(['2021-01-02T08:00:00', '2021-01-02T10:00:00', '2021-01-02T12:00:00'], dtype='datetime64[ns]')
+        self.codes = np.array([0, 2, 0])
+    The code is the index of the control system in self.system_names, a control period ends when the next one starts.
+    """
+    system_names = ['plc', 'ed', 'lcgw']
+    # control system of each value of (relai1, relai2), the rows are relai1 = 0, 1, other, the columns are relai2 = 0, other
+    system_lookup = np.array([
+        [0, 1],  # plc, ed
+        [2, 2],  # lcgw, lcgw
+        [1, 1]  # ed, ed
+    ])
+
+    def __init__(self):
+        self.lock = Lock()
+        self.starts = np.array([], dtype='datetime64[ns]')
+        self.codes = np.array([], dtype=np.int8)
+        self.first_time = None  # first processed timestamp of the relais
+        self.last_time = None  # last processed timestamp of the relais
+
+    @classmethod
+    def get_system_codes(cls, relai1, relai2):
+        """
+        This function returns the code of the control system for each pair of values of relai1 and relai2.
+        The same as before: relai1 == 1 means lcgw, relai1 == 0 and relai2 == 0 means plc, anything else means ed.
+        """
+        row = np.where(relai1 == 0, 0, np.where(relai1 == 1, 1, 2))
+        column = (relai2 != 0).astype(int)
+        return cls.system_lookup[row, column]
+
+    def extend(self, data_time, relai1, relai2):
+        """
+        This function appends the control periods starting in the given values of the relais, which have to be newer than the processed ones.
+        """
+        if len(data_time) == 0:
+            return
+        codes = self.get_system_codes(relai1, relai2)
+        change = np.flatnonzero(codes[1:] != codes[:-1]) + 1
+        change = np.concatenate([[0], change])
+        if len(self.codes) > 0 and codes[0] == self.codes[-1]:
+            change = change[1:]  # the last known control period goes on
+        self.starts = np.concatenate([self.starts, data_time[change]])
+        self.codes = np.concatenate([self.codes, codes[change].astype(np.int8)])
+        self.last_time = data_time[-1]
+
+    def update(self, data_time, relai1, relai2):
+        """
+        This function updates the control periods with all cached values of the relais (numpy arrays ordered by time).
+        Only the values newer than the last processed timestamp are processed, unless older values have been added to the cache,
+        then all control periods are calculated again.
+        The control periods before the first cached timestamp are dropped together with the cached values.
+        """
+        with self.lock:
+            if len(data_time) == 0:
+                self.__init__()
+                return
+            if self.first_time is None or data_time[0] < self.first_time:
+                self.__init__()
+                self.first_time = data_time[0]
+                self.extend(data_time, relai1, relai2)
+                return
+            if data_time[0] > self.first_time:
+                first = max(np.searchsorted(self.starts, data_time[0], side='right') - 1, 0)
+                self.starts, self.codes = self.starts[first:], self.codes[first:]
+                self.first_time = data_time[0]
+            new = np.searchsorted(data_time, self.last_time, side='right')
+            self.extend(data_time[new:], relai1[new:], relai2[new:])
+
+    def get(self, from_date, now):
+        """
+        This function returns the control periods from from_date until now,
+        in the format explained in the function get_switch_history of GetData.
+        A control period ends one second before the next one starts, the last one ends now.
+        A control period which started before from_date is returned as starting at from_date.
+        """
+        start_end_time = {name: [[], []] for name in self.system_names}
+        with self.lock:
+            if len(self.starts) == 0:
+                return start_end_time
+            ends = np.concatenate([self.starts[1:] - np.timedelta64(1, 's'), [now]]).astype('datetime64[ns]')
+            select_index = ends >= from_date
+            starts, ends, codes = np.maximum(self.starts[select_index], from_date), ends[select_index], self.codes[select_index]
+        for code, name in enumerate(self.system_names):
+            start_end_time[name] = [to_plot_time(starts[codes == code]).tolist(), to_plot_time(ends[codes == code]).tolist()]
+        return start_end_time
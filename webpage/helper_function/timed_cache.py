@@ -0,0 +1,85 @@
+"""
+This file contains the class TimedCache.
+TimedCache keeps results of the call back functions for a short time, so that e.g. opening another tab of the historical graphs
+reuses the data of the last refresh instead of requesting and processing them again.
+It is shared by all browser sessions, and the same result requested by several sessions at the same time is only computed once.
+"""
+
+import time
+from threading import Lock, Condition
+from collections import OrderedDict
+
+
+class TimedCache:
+    """
+    This class is a small in-memory cache whose entries expire after ttl seconds.
+    If there are more than max_entries entries, the least recently used one is dropped.
+    While a value is computed by the function get_or_compute, other threads asking for the same key wait for it ("single flight").
+
+    parameter ttl: seconds, how long an entry is valid
+    parameter max_entries: maximum number of entries
+    parameter clock: function returning the current time in seconds, time.monotonic by default, can be replaced e.g. for testing
+    """
+    def __init__(self, ttl: float, max_entries: int = 32, clock=time.monotonic):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.clock = clock
+        self.condition = Condition(Lock())
+        self.entries = OrderedDict()  # {key: (expire time, value)}
+        self.computing = set()  # keys whose value is being computed
+
+    def get(self, key):
+        """
+        This function returns the value of a key, or None if the key is not cached or has expired.
+        """
+        with self.condition:
+            return self.get_entry(key)
+
+    def get_entry(self, key):
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        if entry[0] <= self.clock():
+            del self.entries[key]
+            return None
+        self.entries.move_to_end(key)
+        return entry[1]
+
+    def put(self, key, value):
+        with self.condition:
+            self.put_entry(key, value)
+
+    def put_entry(self, key, value):
+        self.entries[key] = (self.clock() + self.ttl, value)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def get_or_compute(self, key, compute):
+        """
+        This function returns the cached value of a key, or calls compute() and caches its return.
+        If another thread is already computing the value of this key, this function waits for it instead of computing it again.
+        If compute() raises an error, nothing is cached and one of the waiting threads computes the value instead.
+        """
+        with self.condition:
+            while True:
+                value = self.get_entry(key)
+                if value is not None:
+                    return value
+                if key not in self.computing:
+                    self.computing.add(key)
+                    break
+                self.condition.wait()
+        try:
+            value = compute()
+        except Exception:
+            with self.condition:
+                self.computing.discard(key)
+                self.condition.notify_all()
+            raise
+        with self.condition:
+            if value is not None:
+                self.put_entry(key, value)
+            self.computing.discard(key)
+            self.condition.notify_all()
+        return value
@@ -0,0 +1,139 @@
+"""
+This file contains the class RingSeries and the functions to_datetime64 and to_plot_time.
+RingSeries keeps one historical time series in two columnar numpy arrays (timestamps as datetime64[ns] and values as float32)
+which are used as a ring buffer with a fixed maximum memory, instead of python lists of datetime objects.
+It is used by HistoryCache (helper_function/history_cache.py) for every cached series.
+"""
+
+from datetime import timezone
+import numpy as np
+
+
+def to_datetime64(data_time):
+    """
+    This function transforms timestamps (timezone aware datetimes as returned by FiLiP, or numpy datetime64)
+    into a numpy array of datetime64[ns] in UTC.
+    """
+    data_time = np.asarray(data_time)
+    if data_time.dtype.kind == 'M':
+        return data_time.astype('datetime64[ns]')
+    return np.array([t.astimezone(timezone.utc).replace(tzinfo=None) if t.tzinfo is not None else t for t in data_time],
+                    dtype='datetime64[ns]')
+
+
+def to_plot_time(data_time):
+    """
+    This function transforms timestamps into ISO strings with milliseconds (e.g. '2021-01-31T08:00:00.000') for the x axis of plotly.
+    The json encoder of plotly does not handle datetime64[ns] arrays, and the strings are read by plotly.js much faster than datetime objects.
+    """
+    return np.datetime_as_string(np.asarray(data_time, dtype='datetime64[ms]'))
+
+
+class RingSeries:
+    """
+    This class is a ring buffer of (timestamp, value) pairs ordered by time.
+    Every element is written twice, at position i and at position i + capacity ("mirrored" ring buffer),
+    so that the stored data are always one contiguous piece of the arrays, and reading a time range returns numpy views instead of copies.
+    The arrays start small and grow when needed, up to max_capacity elements, afterwards the oldest elements are overwritten.
+
+    The views returned by the functions get_view and get_range show later updates of this series,
+    please copy them if they are kept longer than for building a figure.
+
+    parameter max_capacity: maximum number of elements, see the function capacity_from_bytes
+    """
+    itemsize = np.dtype('datetime64[ns]').itemsize + np.dtype(np.float32).itemsize
+
+    def __init__(self, max_capacity: int, initial_capacity: int = 1024):
+        self.max_capacity = max(int(max_capacity), 1)
+        self.capacity = min(initial_capacity, self.max_capacity)
+        self.times = np.empty(2 * self.capacity, dtype='datetime64[ns]')
+        self.values = np.empty(2 * self.capacity, dtype=np.float32)
+        self.start = 0  # position of the oldest element, always smaller than self.capacity
+        self.size = 0
+
+    @classmethod
+    def capacity_from_bytes(cls, max_bytes: int):
+        """
+        This function returns the maximum number of elements of a series which uses at most max_bytes of memory.
+        """
+        return max_bytes // (2 * cls.itemsize)
+
+    def __len__(self):
+        return self.size
+
+    @property
+    def nbytes(self):
+        return self.times.nbytes + self.values.nbytes
+
+    def grow(self, needed: int):
+        """
+        This function enlarges the arrays (doubling, up to self.max_capacity) so that they can hold needed elements.
+        """
+        capacity = self.capacity
+        while capacity < needed and capacity < self.max_capacity:
+            capacity = min(capacity * 2, self.max_capacity)
+        if capacity == self.capacity:
+            return
+        data_time, data_value = self.get_view()
+        self.times = np.empty(2 * capacity, dtype='datetime64[ns]')
+        self.values = np.empty(2 * capacity, dtype=np.float32)
+        self.times[:self.size], self.times[capacity:capacity + self.size] = data_time, data_time
+        self.values[:self.size], self.values[capacity:capacity + self.size] = data_value, data_value
+        self.capacity = capacity
+        self.start = 0
+
+    def append(self, data_time, data_value):
+        """
+        This function appends new elements, which have to be newer than the stored ones.
+        If the series is full, the oldest elements are overwritten.
+        """
+        data_time = to_datetime64(data_time)
+        data_value = np.asarray(data_value, dtype=np.float32)
+        if len(data_time) == 0:
+            return
+        self.grow(self.size + len(data_time))
+        if len(data_time) > self.capacity:
+            data_time, data_value = data_time[-self.capacity:], data_value[-self.capacity:]
+        position = (self.start + self.size + np.arange(len(data_time))) % self.capacity
+        self.times[position], self.times[position + self.capacity] = data_time, data_time
+        self.values[position], self.values[position + self.capacity] = data_value, data_value
+        overflow = max(self.size + len(data_time) - self.capacity, 0)
+        self.start = (self.start + overflow) % self.capacity
+        self.size += len(data_time) - overflow
+
+    def drop_before(self, date):
+        """
+        This function drops the elements older than date.
+        """
+        dropped = np.searchsorted(self.get_view()[0], date)
+        self.start = (self.start + dropped) % self.capacity
+        self.size -= dropped
+
+    def drop_from(self, date):
+        """
+        This function drops the elements at and after date, so that they can be replaced by the function append.
+        """
+        self.size = int(np.searchsorted(self.get_view()[0], date))
+
+    def get_view(self):
+        """
+        This function returns all stored elements as [timestamps, values], both are views of the arrays.
+        """
+        return [self.times[self.start:self.start + self.size], self.values[self.start:self.start + self.size]]
+
+    def get_range(self, from_date, to_date=None):
+        """
+        This function returns the elements from from_date on (and before to_date if given) as [timestamps, values] views.
+        """
+        data_time, data_value = self.get_view()
+        start = np.searchsorted(data_time, from_date)
+        end = np.searchsorted(data_time, to_date) if to_date is not None else len(data_time)
+        return [data_time[start:end], data_value[start:end]]
+
+    def last_time(self):
+        """
+        This function returns the timestamp of the newest element, or None if the series is empty.
+        """
+        if self.size == 0:
+            return None
+        return self.times[self.start + self.size - 1]
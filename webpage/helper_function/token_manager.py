@@ -0,0 +1,101 @@
+"""
+This file contains the class TokenManager and the function get_token_manager.
+All requests of the dashboard to the fiware platform (GetData, AsyncGetData, the thread pool of GetData, OrionSubscriber)
+share one TokenManager per server process, which gets the tokens from keycloak.
+Only one thread requests a new token at a time, even when many parallel requests find the token expired,
+and the token is renewed shortly before it expires, so that the requests normally never wait for keycloak.
+The requests to keycloak have a timeout, and fail at once while keycloak is down (see helper_function/circuit_breaker.py).
+"""
+
+import time
+from threading import Lock, Condition
+from helper_function.keycloak_python import KeycloakPython
+from helper_function.config import WebpageConfig
+from helper_function.circuit_breaker import CircuitBreaker, BackendSession
+
+
+class TokenManager:
+    """
+    This class keeps the current token and its expire time.
+
+    parameter fetch_token: function returning (access_token, expires_in seconds), e.g. KeycloakPython().get_access_token
+    parameter renew_before: seconds before the expire time from which on the token is renewed
+    parameter clock: function returning the current time in seconds, time.time by default, can be replaced e.g. for testing
+    """
+    def __init__(self, fetch_token, renew_before: float = 20, clock=time.time):
+        self.fetch_token = fetch_token
+        self.renew_before = renew_before
+        self.clock = clock
+        self.condition = Condition(Lock())
+        self.token = ''
+        self.expire_time = 0
+        self.refreshing = False  # True while one thread is requesting a new token
+
+    def get_token(self, force_refresh: bool = False):
+        """
+        This function returns a valid token.
+        If the token is about to expire, the first calling thread requests a new one from keycloak,
+        the other threads keep using the current token as long as it is still valid, or wait for the new one otherwise.
+
+        parameter force_refresh: request a new token even if the current one has not expired, e.g. after the server rejected it
+        """
+        with self.condition:
+            while True:
+                now = self.clock()
+                if not force_refresh and self.token and now < self.expire_time - self.renew_before:
+                    return self.token
+                if not self.refreshing:
+                    self.refreshing = True
+                    break
+                if not force_refresh and self.token and now < self.expire_time:
+                    return self.token  # still valid, another thread is already renewing it
+                self.condition.wait()
+                force_refresh = False  # the token has just been renewed by another thread
+
+        start = self.clock()
+        try:
+            access_token, expires_in = self.fetch_token()
+        except Exception:
+            with self.condition:
+                self.refreshing = False
+                self.condition.notify_all()
+            raise
+        with self.condition:
+            self.token = access_token
+            self.expire_time = start + expires_in
+            self.refreshing = False
+            self.condition.notify_all()
+            return access_token
+
+
+token_manager = None
+token_manager_lock = Lock()
+
+
+def get_keycloak_probe_url(token_url: str):
+    """
+    This function returns the url of the openid configuration of the realm, which is probed while keycloak is down.
+    If the token url is not the usual token endpoint of a realm, the token url itself is probed, a GET request to it is answered with 405.
+    Example: 'https://keycloak/auth/realms/fiware/protocol/openid-connect/token' -> 'https://keycloak/auth/realms/fiware/.well-known/openid-configuration'
+    """
+    token_path = '/protocol/openid-connect/token'
+    if token_url.rstrip('/').endswith(token_path):
+        return token_url.rstrip('/')[:-len(token_path)] + '/.well-known/openid-configuration'
+    return token_url
+
+
+def get_token_manager(config: WebpageConfig):
+    """
+    This function returns the TokenManager of this server process, it is created on the first call.
+    While keycloak is down, the openid configuration of the realm is probed in the background every config.circuit_probe_interval seconds,
+    the same as the versions of orion and quantumleap, see the function get_keycloak_probe_url.
+    """
+    global token_manager
+    with token_manager_lock:
+        if token_manager is None:
+            keycloak = KeycloakPython(timeout=config.keycloak_timeout)
+            probe_session = BackendSession(config.keycloak_timeout)
+            circuit_breaker = CircuitBreaker('keycloak', config.circuit_failure_threshold, config.circuit_probe_interval,
+                                             probe=lambda: probe_session.probe(get_keycloak_probe_url(keycloak.keycloak_host)))
+            token_manager = TokenManager(lambda: circuit_breaker.call(keycloak.get_access_token), renew_before=config.token_renew_before)
+        return token_manager
@@ -10,25 +10,59 @@ However, when clicking "apply", the temperature value set by user in the text bo
 When implementing temperature control functions, can refer to the template at " # temperature control (template for futurn implementation)"
 """
 
+import sys
+import time
+import signal
 import datetime
+import numpy as np
+import dash
 from dash.dependencies import Input, Output, State
-from app import app
-from plotly.subplots import make_subplots
-import plotly.graph_objects as go
+from app import app, server
 from helper_function.config import WebpageConfig
 from helper_function.organize_data import GetData
+from helper_function.organize_data_async import AsyncGetData
+from helper_function.history_cache import HistoryCache
+from helper_function.background_bands import build_band_shapes
+from helper_function.figure_builder import HistoryFigureBuilder
+from helper_function.timed_cache import TimedCache
+from helper_function.shared_state import SharedStore, SharedTimedCache
+from helper_function.orion_poller import OrionPoller
+from helper_function.orion_subscription import OrionSubscriber
 from assets.views.display_widgets import *
-import time
-import pytz
 
 # building the navigation bar
 # https://github.com/facultyai/dash-bootstrap-components/blob/master/examples/advanced-component-usage/Navbars.py
 
 # global variables
-current_control_sys = 'lcgw'  # will be overwrite in call back function "image_data_update"
+# Everything below exists once per server process. When the server runs several worker processes (see gunicorn.conf.py),
+# the state shared by the processes is kept in shared_store (helper_function/shared_state.py).
 config = WebpageConfig()
-get_data = GetData(config)
-timezone = pytz.timezone('UTC')
+shared_store = SharedStore(config.shared_state_dir) if config.shared_state_dir else None
+get_data = AsyncGetData(config) if config.use_async_client else GetData(config)
+# one per server process, shared by all browser sessions
+if config.orion_subscription_enabled:
+    orion_poller = OrionSubscriber(get_data, shared_store)
+    orion_poller.register_endpoint(server)
+else:
+    orion_poller = OrionPoller(get_data, config.orion_refresh_interval, shared_store)
+orion_poller.start()
+figure_builder = HistoryFigureBuilder(config)
+# shared by all browser sessions, see the function get_time_bucket
+if shared_store is not None:
+    history_display_cache = SharedTimedCache(shared_store, 'history_display', config.history_display_cache_ttl, config.history_display_cache_size)
+    history_figure_cache = SharedTimedCache(shared_store, 'history_figure', config.history_display_cache_ttl, config.history_display_cache_size)
+else:
+    history_display_cache = TimedCache(config.history_display_cache_ttl, config.history_display_cache_size)
+    history_figure_cache = TimedCache(config.history_display_cache_ttl, config.history_display_cache_size)
+
+
+def get_current_control_sys():
+    """
+    This function returns the active control system ('plc', 'ed' or 'lcgw') from the latest snapshot of orion_poller,
+    or 'lcgw' if the relais cannot be read.
+    """
+    return orion_poller.get_snapshot()['system'] or 'lcgw'
+
 
 # Define layout of the dashboard
 app.layout = html.Div([
@@ -153,6 +187,7 @@ This is designed by DASH.
 def toggle_modal(n1, n2, is_open, fan_value):
     if n1 or n2:  # Because of this condition, this function is not called during the initialization.
         if not is_open:
+            current_control_sys = get_current_control_sys()
             get_data.send_command(system=current_control_sys,
                                   entity_id='actuator:Fan_%s' % current_control_sys.upper(),
                                   entity_type='actuator:Fan',
@@ -171,6 +206,7 @@ def toggle_modal(n1, n2, is_open, fan_value):
 def toggle_modal(n1, n2, is_open, valve_value):
     if n1 or n2:
         if not is_open:  # Because of this condition, this function is not called during the initialization.
+            current_control_sys = get_current_control_sys()
             get_data.send_command(system=current_control_sys,
                                   entity_id='actuator:Three_Way_Valve_%s' % current_control_sys.upper(),
                                   entity_type='actuator:Valve',
@@ -181,323 +217,105 @@ def toggle_modal(n1, n2, is_open, valve_value):
 
 
 # display history graph
-@app.callback([Output('tab_temp_rh_air', 'figure'),
-               Output('tab_temp_water', 'figure'),
-               Output('tab_voc', 'figure'),
-               Output('tab_valve', 'figure')],
-              [Input('Dropdown-history-duration', 'value'),
-               Input('Dropdown-display-system', 'value'),
-               Input('interval-refresh', 'n_intervals')])
-def update_plots(minutes, system, _):
+def own_history(history: dict):
+    """
+    This function returns the historical data with arrays which do not share memory with any cache of get_data.
+    Only the arrays which are views are copied. This lets the data be kept in history_display_cache while the caches are updated,
+    whether that cache is a TimedCache in this process or a SharedTimedCache, which pickles them.
+    """
+    return {
+        system: {param: [array if array.base is None else array.copy() for array in data] for param, data in history[system].items()}
+        for system in history
+    }
+
+
+def get_history_display_data(minutes, system):
+    """
+    This function returns the historical data, the background shapes of the historical graphs, and the stale series.
+    The result is kept in history_display_cache, see the function get_time_bucket.
+    All requests to quantumleap together get at most config.history_callback_deadline seconds, so that a slow or hanging quantumleap
+    never blocks a worker of the server for longer. Series which have not arrived in time are taken from the cache and marked as stale,
+    and are filled in on the next refresh.
+    """
+    deadline = time.monotonic() + config.history_callback_deadline
     fromDate = datetime.datetime.utcnow() - datetime.timedelta(minutes=int(minutes))
     fromDate_str = datetime.datetime.strftime(fromDate, '%Y-%m-%dT%H:%M:%S')
-    system_color = {'plc': 'rgb(255, 0, 0)', 'ed': 'rgb(0, 255, 0)', 'lcgw': 'rgb(0, 0, 255)'}
-
-    # Get all data needed via thread
-    if system in ['plc', 'ALL']:
-        data_plc = get_data.get_history_thread('plc', fromDate_str)
-    if system in ['ed', 'ALL']:
-        data_ed = get_data.get_history_thread('ed', fromDate_str)
-    if system in ['lcgw', 'ALL']:
-        data_lcgw = get_data.get_history_thread('lcgw', fromDate_str)
-
-    # Wait until all data have arrived
-    expected_keys_plc = len(config.history_values_display_param_list['plc']) + 1  # + 1 because of "token_expire_time"
-    expected_keys_ed = len(config.history_values_display_param_list['ed']) + 1
-    expected_keys_lcgw = len(config.history_values_display_param_list['lcgw']) + 1
-    reading_data = True
-    while reading_data:
-        if system == 'plc':
-            if len(data_plc.keys()) == expected_keys_plc:
-                reading_data = False
-        elif system == 'ed':
-            if len(data_ed.keys()) == expected_keys_ed:
-                reading_data = False
-        elif system == 'lcgw':
-            if len(data_lcgw.keys()) == expected_keys_lcgw:
-                reading_data = False
-        else:
-            if len(data_plc.keys()) == expected_keys_plc and \
-                    len(data_ed.keys()) == expected_keys_ed and \
-                    len(data_lcgw.keys()) == expected_keys_lcgw:
-                reading_data = False
-        time.sleep(1)
-
-    # Tab1 Temperature & Humidity of Air Side
-    param_temp_rh_air = ['Air_Inlet_Temperature', 'Air_Inlet_Humidity', 'Air_Outlet_Temperature', 'Air_Outlet_Humidity']
-    fig_air = make_subplots(specs=[[{'secondary_y': True}]])
-    # the x_min, y_min, y_max are simply stored and calculated for the location of the system's label on the plot
-    x_min = timezone.localize(datetime.datetime.now())
-    y_min = float('Inf')
-    y_max = -float('Inf')
-    for param in param_temp_rh_air:
-        if 'Humidity' in param:
-            y2_axis = True
-        else:
-            y2_axis = False
-        if system in ['plc', 'ALL'] and param in data_plc:
-            fig_air.add_trace(
-                go.Scatter(x=data_plc[param][0], y=data_plc[param][1], name='PLC_%s' % param),
-                secondary_y=y2_axis
-            )
-            try:  # use try-except here because data_plc may contain no data when something's wrong during the getting data process from the quantumleap
-                x_min = min(x_min, data_plc[param][0][0])
-                y_min = min(y_min, min(data_plc[param][1]))
-                y_max = max(y_max, max(data_plc[param][1]))
-            except:
-                pass
-        if system in ['ed', 'ALL'] and param in data_ed:
-            fig_air.add_trace(
-                go.Scatter(x=data_ed[param][0], y=data_ed[param][1], name='ED_%s' % param),
-                secondary_y=y2_axis
-            )
-            try:
-                x_min = min(x_min, data_ed[param][0][0])
-                y_min = min(y_min, min(data_ed[param][1]))
-                y_max = max(y_max, max(data_ed[param][1]))
-            except:
-                pass
-        if system in ['lcgw', 'ALL'] and param in data_lcgw:
-            fig_air.add_trace(
-                go.Scatter(x=data_lcgw[param][0], y=data_lcgw[param][1], name='LCGW_%s' % param),
-                secondary_y=y2_axis
-            )
-            try:
-                x_min = min(x_min, data_lcgw[param][0][0])
-                y_min = min(y_min, min(data_lcgw[param][1]))
-                y_max = max(y_max, max(data_lcgw[param][1]))
-            except:
-                pass
-    # axis name
-    fig_air.update_yaxes(
-        title_text='Temperature',
-        secondary_y=False)
-    fig_air.update_yaxes(
-        title_text='Humidity',
-        secondary_y=True)
-
-    # add annotation
-    if y_max > y_min:  # filter out the case when there is no data
-        # add little legend box saying 'plc'
-        fig_air.add_annotation(
-            x=x_min, y=y_max, xref='x', yref='y', text='PLC',
-            font=dict(family='Courier New, monospace', size=16, color='rgb(0, 0, 0)'),
-            align='center', borderwidth=2, borderpad=4, bgcolor='rgb(250, 0, 0)', opacity=0.7, width=50
-        )
-        # add little legend box saying 'ED'
-        fig_air.add_annotation(
-            x=x_min, y=y_min + 0.9*(y_max-y_min), xref='x', yref='y', text='ED',
-            font=dict(family='Courier New, monospace', size=16, color='rgb(0, 0, 0)'),
-            align='center', borderwidth=2, borderpad=4, bgcolor='rgb(0, 250, 0)', opacity=0.7, width=50
-        )
-        # add little legend box saying 'LCGW'
-        fig_air.add_annotation(
-            x=x_min, y=y_min + 0.8*(y_max-y_min), xref='x', yref='y', text='LCGW',
-            font=dict(family='Courier New, monospace', size=16, color='rgb(0, 0, 0)'),
-            align='center', borderwidth=2, borderpad=4, bgcolor='rgb(139, 161, 231)', opacity=0.8, width=50
-        )
-
-    # Tab2 Temperature of Water Side
-    param_temp_water = ['Return_Temperature_Primary', 'Supply_Temperature_Primary', 'Return_Temperature', 'Supply_Temperature']
-    fig_water = make_subplots()
-    x_min = timezone.localize(datetime.datetime.now())
-    y_min = float('Inf')
-    y_max = -float('Inf')
-    for param in param_temp_water:
-        if system in ['plc', 'ALL'] and param in data_plc:
-            fig_water.add_trace(
-                go.Scatter(x=data_plc[param][0], y=data_plc[param][1], name='PLC_%s' % param)
-            )
-            try:
-                x_min = min(x_min, data_plc[param][0][0])
-                y_min = min(y_min, min(data_plc[param][1]))
-                y_max = max(y_max, max(data_plc[param][1]))
-            except:
-                pass
-        if system in ['ED', 'ALL'] and param in data_ed:
-            fig_water.add_trace(
-                go.Scatter(x=data_ed[param][0], y=data_ed[param][1], name='ED_%s' % param)
-            )
-            try:
-                x_min = min(x_min, data_ed[param][0][0])
-                y_min = min(y_min, min(data_ed[param][1]))
-                y_max = max(y_max, max(data_ed[param][1]))
-            except:
-                pass
-        if system in ['lcgw', 'ALL'] and param in data_lcgw:
-            fig_water.add_trace(
-                go.Scatter(x=data_lcgw[param][0], y=data_lcgw[param][1], name='LCGW_%s' % param)
-            )
-            try:
-                x_min = min(x_min, data_lcgw[param][0][0])
-                y_min = min(y_min, min(data_lcgw[param][1]))
-                y_max = max(y_max, max(data_lcgw[param][1]))
-            except:
-                pass
-
-    # add annotation
-    if y_max > y_min:  # filter out the case when there is no data
-        # add little legend box saying 'PLC'
-        fig_water.add_annotation(
-            x=x_min, y=y_max, xref='x', yref='y', text='PLC',
-            font=dict(family='Courier New, monospace', size=16, color='rgb(0, 0, 0)'),
-            align='center', borderwidth=2, borderpad=4, bgcolor='rgb(250, 0, 0)', opacity=0.7, width=50
-        )
-        # add little legend box saying 'ED'
-        fig_water.add_annotation(
-            x=x_min, y=y_min + 0.9*(y_max-y_min), xref='x', yref='y', text='ED',
-            font=dict(family='Courier New, monospace', size=16, color='rgb(0, 0, 0)'),
-            align='center', borderwidth=2, borderpad=4, bgcolor='rgb(0, 250, 0)', opacity=0.7, width=50
-        )
-        # add little legend box saying 'LCGW'
-        fig_water.add_annotation(
-            x=x_min, y=y_min + 0.8*(y_max-y_min), xref='x', yref='y', text='LCGW',
-            font=dict(family='Courier New, monospace', size=16, color='rgb(0, 0, 0)'),
-            align='center', borderwidth=2, borderpad=4, bgcolor='rgb(139, 161, 231)', opacity=0.8, width=50
-        )
-
-    # Tab3 VOC
-    fig_voc = make_subplots()
-    x_min = timezone.localize(datetime.datetime.now())
-    y_min = float('Inf')
-    y_max = -float('Inf')
-    param = 'Air_Outlet_VOC'
-    if system in ['plc', 'ALL'] and param in data_plc:
-        fig_voc.add_trace(
-            go.Scatter(x=data_plc[param][0], y=data_plc[param][1], name='PLC', line=dict(color=system_color['plc']))
-        )
-        try:
-            x_min = min(x_min, data_plc[param][0][0])
-            y_min = min(y_min, min(data_plc[param][1]))
-            y_max = max(y_max, max(data_plc[param][1]))
-        except:
-            pass
-    if system in ['ed', 'ALL'] and param in data_ed:
-        fig_voc.add_trace(
-            go.Scatter(x=data_ed[param][0], y=data_ed[param][1], name='ED', line=dict(color=system_color['ed']))
-        )
-        try:
-            x_min = min(x_min, data_ed[param][0][0])
-            y_min = min(y_min, min(data_ed[param][1]))
-            y_max = max(y_max, max(data_ed[param][1]))
-        except:
-            pass
-    if system in ['lcgw', 'ALL'] and param in data_lcgw:
-        fig_voc.add_trace(
-            go.Scatter(x=data_lcgw[param][0], y=data_lcgw[param][1], name='LCGW', line=dict(color=system_color['lcgw']))
-        )
-        try:
-            x_min = min(x_min, data_lcgw[param][0][0])
-            y_min = min(y_min, min(data_lcgw[param][1]))
-            y_max = max(y_max, max(data_lcgw[param][1]))
-        except:
-            pass
 
-    # add annotation
-    if y_max > y_min:  # filter out the case when there is no data
-        # add little legend box saying 'PLC'
-        fig_voc.add_annotation(
-            x=x_min, y=y_max, xref='x', yref='y', text='PLC',
-            font=dict(family='Courier New, monospace', size=16, color='rgb(0, 0, 0)'),
-            align='center', borderwidth=2, borderpad=4, bgcolor='rgb(250, 0, 0)', opacity=0.7, width=50
-        )
-        # add little legend box saying 'ED'
-        fig_voc.add_annotation(
-            x=x_min, y=y_min + 0.9*(y_max-y_min), xref='x', yref='y', text='ED',
-            font=dict(family='Courier New, monospace', size=16, color='rgb(0, 0, 0)'),
-            align='center', borderwidth=2, borderpad=4, bgcolor='rgb(0, 250, 0)', opacity=0.7, width=50
-        )
-        # add little legend box saying 'LCGW'
-        fig_voc.add_annotation(
-            x=x_min, y=y_min + 0.8*(y_max-y_min), xref='x', yref='y', text='LCGW',
-            font=dict(family='Courier New, monospace', size=16, color='rgb(0, 0, 0)'),
-            align='center', borderwidth=2, borderpad=4, bgcolor='rgb(139, 161, 231)', opacity=0.8, width=50
-        )
-
-    # Tab4 Valve
-    fig_valve = make_subplots()
-    x_min = timezone.localize(datetime.datetime.now())
-    y_min = float('Inf')
-    y_max = -float('Inf')
-    param = 'Three_Way_Valve'
-    if system in ['plc', 'ALL'] and param in data_plc:
-        fig_valve.add_trace(
-            go.Scatter(x=data_plc[param][0], y=data_plc[param][1], name='PLC', line=dict(color=system_color['plc']))
-        )
-        try:
-            x_min = min(x_min, data_plc[param][0][0])
-            y_min = min(y_min, min(data_plc[param][1]))
-            y_max = max(y_max, max(data_plc[param][1]))
-        except:
-            pass
-    if system in ['ed', 'ALL'] and param in data_ed:
-        fig_valve.add_trace(
-            go.Scatter(x=data_ed[param][0], y=data_ed[param][1], name='ED', line=dict(color=system_color['ed']))
-        )
-        try:
-            x_min = min(x_min, data_ed[param][0][0])
-            y_min = min(y_min, min(data_ed[param][1]))
-            y_max = max(y_max, max(data_ed[param][1]))
-        except:
-            pass
-    if system in ['lcgw', 'ALL'] and param in data_lcgw:
-        fig_valve.add_trace(
-            go.Scatter(x=data_lcgw[param][0], y=data_lcgw[param][1], name='LCGW', line=dict(color=system_color['lcgw']))
-        )
-        try:
-            x_min = min(x_min, data_lcgw[param][0][0])
-            y_min = min(y_min, min(data_lcgw[param][1]))
-            y_max = max(y_max, max(data_lcgw[param][1]))
-        except:
-            pass
-
-    # add annotation
-    if y_max > y_min:  # filter out the case when there is no data
-        # add little legend box saying 'PLC'
-        fig_valve.add_annotation(
-            x=x_min, y=y_max, xref='x', yref='y', text='PLC',
-            font=dict(family='Courier New, monospace', size=16, color='rgb(0, 0, 0)'),
-            align='center', borderwidth=2, borderpad=4, bgcolor='rgb(250, 0, 0)', opacity=0.7, width=50
-        )
-        # add little legend box saying 'ED'
-        fig_valve.add_annotation(
-            x=x_min, y=y_min + 0.9*(y_max-y_min), xref='x', yref='y', text='ED',
-            font=dict(family='Courier New, monospace', size=16, color='rgb(0, 0, 0)'),
-            align='center', borderwidth=2, borderpad=4, bgcolor='rgb(0, 250, 0)', opacity=0.7, width=50
-        )
-        # add little legend box saying 'LCGW'
-        fig_valve.add_annotation(
-            x=x_min, y=y_min + 0.8*(y_max-y_min), xref='x', yref='y', text='LCGW',
-            font=dict(family='Courier New, monospace', size=16, color='rgb(0, 0, 0)'),
-            align='center', borderwidth=2, borderpad=4, bgcolor='rgb(139, 161, 231)', opacity=0.8, width=50
-        )
+    # Get all data needed via the thread pool of get_data, the data of all systems are requested in parallel
+    systems = ['plc', 'ed', 'lcgw'] if system == 'ALL' else [system]
+    stale = set()
+    history = get_data.get_history(systems, fromDate_str, timeout=min(config.history_request_timeout, deadline - time.monotonic()),
+                                   max_points=get_data.get_point_budget(int(minutes)),
+                                   aggr_period=get_data.get_aggregation_period(int(minutes)),
+                                   stale=stale)
 
     # Backgroud color of the plot. The color is different for different control systems.
-    start_end_time = get_data.get_switch_history(fromDate_str)
-    for sys in start_end_time:
-        if start_end_time[sys] != [[], []]:
-            for (start_time, end_time) in zip(start_end_time[sys][0], start_end_time[sys][1]):
-                fig_air.add_vrect(
-                    x0=start_time, x1=end_time,
-                    fillcolor=system_color[sys], opacity=0.15,
-                    layer='below', line_width=0,
-                )
-                fig_water.add_vrect(
-                    x0=start_time, x1=end_time,
-                    fillcolor=system_color[sys], opacity=0.15,
-                    layer='below', line_width=0,
-                )
-                fig_voc.add_vrect(
-                    x0=start_time, x1=end_time,
-                    fillcolor=system_color[sys], opacity=0.15,
-                    layer='below', line_width=0,
-                )
-                fig_valve.add_vrect(
-                    x0=start_time, x1=end_time,
-                    fillcolor=system_color[sys], opacity=0.15,
-                    layer='below', line_width=0,
-                )
-    return fig_air, fig_water, fig_voc, fig_valve
+    # The shapes are built once and set on the figures, see helper_function/background_bands.py
+    start_end_time = get_data.get_switch_history(fromDate_str, timeout=max(deadline - time.monotonic(), 0))
+    band_shapes = build_band_shapes(start_end_time, np.datetime64(fromDate), HistoryCache.now(),
+                                    figure_builder.system_color, config.history_band_resolution)
+    return own_history(history), band_shapes, frozenset(stale)
+
+
+def get_time_bucket(interval_ms):
+    """
+    This function returns the refresh interval in milliseconds and the number of the current refresh period,
+    e.g. for a refresh interval of 60 seconds, the number changes every full minute.
+    The historical data and figures are cached per refresh period and shared by all browser sessions with the same inputs,
+    so that any number of sessions showing the same graph cost one request to quantumleap and one figure per refresh period.
+    The interval is part of the returned bucket, so that sessions with different refresh intervals do not share the data of a period
+    which is longer or shorter than their own.
+    Example: get_time_bucket(60000) at 08:00:30 -> (60000, number of minutes since 1970 until 08:00)
+    """
+    period = max(int(interval_ms or 1000), 1000)
+    return period, int(time.time() * 1000 // period)
+
+
+# Only the figure of the opened tab is built and sent, the other tabs are built when they are opened.
+# On the refresh of the interval, only the new points of the raw data are sent and appended to the figure (extendData),
+# the figure is sent completely when the tab, the duration or the system changes, or when the data are aggregated or downsampled,
+# see helper_function/figure_builder.py
+@app.callback([Output('tab_temp_rh_air', 'figure'),
+               Output('tab_temp_water', 'figure'),
+               Output('tab_voc', 'figure'),
+               Output('tab_valve', 'figure'),
+               Output('tab_temp_rh_air', 'extendData'),
+               Output('tab_temp_water', 'extendData'),
+               Output('tab_voc', 'extendData'),
+               Output('tab_valve', 'extendData'),
+               Output('history-graph-state', 'data')],
+              [Input('Dropdown-history-duration', 'value'),
+               Input('Dropdown-display-system', 'value'),
+               Input('interval-refresh', 'n_intervals'),
+               Input('Tabs', 'value')],
+              [State('history-graph-state', 'data'),
+               State('interval-refresh', 'interval')])
+def update_plots(minutes, system, _, tab, graph_state, interval_ms):
+    tabs = list(figure_builder.tabs)  # in the order of the outputs
+    figures = [dash.no_update] * len(tabs)
+    extend_data = [dash.no_update] * len(tabs)
+
+    # the data and figures are shared by all sessions within one refresh period, see the function get_time_bucket
+    time_bucket = get_time_bucket(interval_ms)
+    history, band_shapes, stale = history_display_cache.get_or_compute(
+        (minutes, system, time_bucket), lambda: get_history_display_data(minutes, system))
+
+    triggered = [trigger['prop_id'] for trigger in dash.callback_context.triggered]
+    if triggered == ['interval-refresh.n_intervals']:
+        raw = get_data.get_aggregation_period(int(minutes)) is None and get_data.get_point_budget(int(minutes)) is None
+        update = figure_builder.build_incremental_update(tab, history, band_shapes, int(minutes), system, graph_state, stale, raw)
+        if update is not None:
+            data, graph_state = update
+            if data is not None:
+                extend_data[tabs.index(tab)] = data
+            return figures + extend_data + [graph_state]
+
+    figure, graph_state = history_figure_cache.get_or_compute(
+        (minutes, system, tab, time_bucket),
+        lambda: (figure_builder.build_figure(tab, history, band_shapes, int(minutes), stale),
+                 figure_builder.build_graph_state(history, band_shapes, int(minutes), system, [tab], stale)))
+    figures[tabs.index(tab)] = figure
+    return figures + extend_data + [graph_state]
 
 
 # update refresh rate of history graph
@@ -525,22 +343,18 @@ def update_refresh_rate(seconds):
                Output('PowerButton-fan-pump', 'color')],
               [Input('Interval-current-value-refresh', 'n_intervals')])
 def image_data_update(value):
-    switch = get_data.get_relais_switch()
-    if switch['current_State_Relais1'] == 1:  # LCGW
+    # the values are read from orion (or pushed by orion) by orion_poller, here only its latest snapshot is read
+    snapshot = orion_poller.get_snapshot()
+    switch = snapshot['switch']
+    data = snapshot['data']
+    if snapshot['system'] == 'lcgw':
         switch_output = ['gray', 'gray', 'green']
-        current_control_sys = 'lcgw'
-        data = get_data.get_current_value(current_control_sys)
-    elif switch['current_State_Relais2'] == 0:  # PLC
+    elif snapshot['system'] == 'plc':
         switch_output = ['green', 'gray', 'gray']
-        current_control_sys = 'plc'
-        data = get_data.get_current_value(current_control_sys)
-    elif switch['current_State_Relais2'] == 1:  # ED
+    elif snapshot['system'] == 'ed':
         switch_output = ['gray', 'green', 'gray']
-        current_control_sys = 'ed'
-        data = get_data.get_current_value(current_control_sys)
     else:  # cannot read anything
         switch_output = ['gray'] * 3
-        data = get_data.return_null_orion()
     output = [
         data['Return_Temperature_Primary'],
         data['Supply_Temperature_Primary'],
@@ -674,5 +488,7 @@ def toggle_modal_temperature_control(n1, n2, is_open, temperature_value):
 
 
 if __name__ == '__main__':
+    # exit normally when the container is stopped, so that the history cache is saved (atexit) before
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
     app.run_server(host=config.HOST_NAME, port=config.PORT_NUMBER, debug=False)  # to run on cluster
     # app.run_server(host='127.0.0.1', debug=True)  # to run on pc
@@ -0,0 +1,183 @@
+"""
+This file tests OrionSubscriber (helper_function/orion_subscription.py) against a fake orion, without a fiware platform.
+FakeOrion keeps the entities and subscriptions of each fiware service path in memory, and posts a notification to the endpoint on the flask server
+whenever an entity changes, with the url and the headers given in the subscription, the same as orion does.
+
+Run it in the folder webpage: python -m unittest test_orion_subscription
+"""
+
+import unittest
+from urllib.parse import urlparse
+from flask import Flask
+from helper_function.config import WebpageConfig
+from helper_function.organize_data import GetData
+from helper_function.orion_subscription import OrionSubscriber
+
+
+class FakeEntity:
+    """
+    This class is an entity as returned by ContextBrokerClient.get_entity_list with response_format 'keyValues'.
+    """
+    def __init__(self, values: dict):
+        self.id = values['id']
+        self.values = values
+
+    def dict(self):
+        return dict(self.values)
+
+
+class FakeSubscription:
+    def __init__(self, subscription_id: str, subscription: dict):
+        self.id = subscription_id
+        self.description = subscription['description']
+        self.subscription = subscription
+
+
+class FakeContextBroker:
+    """
+    This class replaces the ContextBrokerClient of one fiware service path.
+    The notifications are posted via the test client of the flask server to the path of the notification url of the subscription.
+    """
+    def __init__(self, test_client, service_path: str):
+        self.test_client = test_client
+        self.service_path = service_path
+        self.entities = {}  # {entity id: {attribute: value}}
+        self.subscriptions = {}  # {subscription id: FakeSubscription}
+        self.reachable = True
+
+    def get_subscription_list(self):
+        if not self.reachable:
+            raise ConnectionError('orion is unreachable')
+        return list(self.subscriptions.values())
+
+    def delete_subscription(self, subscription_id: str):
+        del self.subscriptions[subscription_id]
+
+    def post_subscription(self, subscription: dict):
+        subscription_id = '%s subscription%d' % (self.service_path, len(self.subscriptions) + 1)
+        while subscription_id in self.subscriptions:
+            subscription_id += '_'
+        self.subscriptions[subscription_id] = FakeSubscription(subscription_id, subscription)
+        return subscription_id
+
+    def get_entity_list(self, response_format: str):
+        return [FakeEntity(dict(values, id=entity_id)) for entity_id, values in self.entities.items()]
+
+    def set_attribute(self, entity_id: str, attribute: str, value, notify: bool = True):
+        """
+        This function changes an attribute of an entity, and posts a notification for each subscription of the entity if notify.
+        Returns the status codes of the answers of the endpoint.
+        """
+        self.entities.setdefault(entity_id, {})[attribute] = value
+        if not notify:
+            return []
+        status_codes = []
+        for subscription_id, subscription in self.subscriptions.items():
+            subject = subscription.subscription['subject']
+            if entity_id not in [entity['id'] for entity in subject['entities']] or attribute not in subject['condition']['attrs']:
+                continue
+            http = subscription.subscription['notification']['httpCustom']
+            response = self.test_client.post(urlparse(http['url']).path, headers=http['headers'],
+                                             json={'subscriptionId': subscription_id, 'data': [dict(self.entities[entity_id], id=entity_id)]})
+            status_codes.append(response.status_code)
+        return status_codes
+
+
+class FakeOrion:
+    """
+    This class keeps a FakeContextBroker for each fiware service path.
+    """
+    def __init__(self, test_client):
+        self.test_client = test_client
+        self.service_paths = {}  # {service path: FakeContextBroker}
+
+    def get_cb_client(self, service_path: str):
+        if service_path not in self.service_paths:
+            self.service_paths[service_path] = FakeContextBroker(self.test_client, service_path)
+        return self.service_paths[service_path]
+
+    def get_subscription_ids(self):
+        return {subscription_id for cb_client in self.service_paths.values() for subscription_id in cb_client.subscriptions}
+
+    def set_attribute(self, service_path: str, entity_id: str, attribute: str, value, notify: bool = True):
+        return self.get_cb_client(service_path).set_attribute(entity_id, attribute, value, notify)
+
+
+class FakeGetData:
+    """
+    This class provides the part of GetData used by OrionSubscriber, the context brokers are the ones of a FakeOrion.
+    """
+    return_null_orion = GetData.return_null_orion
+
+    def __init__(self, config: WebpageConfig, fake_orion: FakeOrion):
+        self.config = config
+        self.null_value = -99.0
+        self.current_values_display_param_list = {system: list(config.data_structure[system].keys()) for system in config.data_structure}
+        self.get_cb_client = fake_orion.get_cb_client
+
+
+class TestOrionSubscriber(unittest.TestCase):
+    def setUp(self):
+        self.config = WebpageConfig()
+        self.config.orion_notification_secret = 'test secret'
+        self.server = Flask(__name__)
+        self.client = self.server.test_client()
+        self.fake_orion = FakeOrion(self.client)
+        self.subscriber = OrionSubscriber(FakeGetData(self.config, self.fake_orion))
+        self.subscriber.register_endpoint(self.server)
+        self.subscriber.register_subscriptions()
+
+    def test_register_subscriptions(self):
+        # one subscription per service path, registered again without piling up
+        self.assertEqual(len(self.fake_orion.get_subscription_ids()), len(self.config.data_structure) + 1)
+        self.subscriber.register_subscriptions()
+        self.assertEqual(len(self.fake_orion.get_subscription_ids()), len(self.config.data_structure) + 1)
+        self.assertEqual(self.subscriber.get_subscription_ids(), self.fake_orion.get_subscription_ids())
+
+    def test_register_subscriptions_retry(self):
+        # a service path which cannot be subscribed is returned, and subscribed on the retry
+        subscriber = OrionSubscriber(FakeGetData(self.config, self.fake_orion))
+        self.fake_orion.get_cb_client('/plc').reachable = False
+        self.assertEqual(subscriber.register_subscriptions(), ['/plc'])
+        self.assertEqual(len(subscriber.get_subscription_ids()), len(self.config.data_structure))
+        self.fake_orion.get_cb_client('/plc').reachable = True
+        self.assertEqual(subscriber.register_subscriptions(['/plc']), [])
+        self.assertEqual(subscriber.get_subscription_ids(), self.fake_orion.get_subscription_ids())
+
+    def test_notification(self):
+        self.assertEqual(self.fake_orion.set_attribute('/', 'actuator:Relais_Switch:DO4-1', 'current_State_Relais1', 0), [204])
+        self.assertEqual(self.fake_orion.set_attribute('/', 'actuator:Relais_Switch:DO4-1', 'current_State_Relais2', 0), [204])
+        self.assertEqual(self.fake_orion.set_attribute('/plc', 'sensor:Multisensor:Air_Inlet_PLC', 'measured_Temperature', 21.34), [204])
+        snapshot = self.subscriber.get_snapshot()
+        self.assertEqual(snapshot['system'], 'plc')
+        self.assertEqual(snapshot['data']['Air_Inlet_Temperature'], 21.3)
+        self.assertEqual(snapshot['data']['Air_Inlet_Humidity'], -99.0)
+
+    def test_unauthenticated_notification(self):
+        notification = {'subscriptionId': next(iter(self.fake_orion.get_cb_client('/').subscriptions)),
+                        'data': [{'id': 'actuator:Relais_Switch:DO4-1', 'current_State_Relais1': 1}]}
+        path = self.config.orion_notification_path
+        header = self.config.orion_notification_header
+        self.assertEqual(self.client.post(path, json=notification).status_code, 403)
+        self.assertEqual(self.client.post(path, json=notification, headers={header: 'wrong secret'}).status_code, 403)
+        self.assertEqual(self.client.post(path, json=dict(notification, subscriptionId='unknown'),
+                                          headers={header: 'test secret'}).status_code, 403)
+        self.assertEqual(self.client.post(path, data='not json', headers={header: 'test secret'}).status_code, 403)
+        self.assertIsNone(self.subscriber.get_snapshot()['system'])
+        self.assertEqual(self.client.post(path, json=notification, headers={header: 'test secret'}).status_code, 204)
+        self.assertEqual(self.subscriber.get_snapshot()['system'], 'lcgw')
+
+    def test_resync(self):
+        # changes without notification (lost notifications) are read by resync
+        self.fake_orion.set_attribute('/', 'actuator:Relais_Switch:DO4-1', 'current_State_Relais1', 0, notify=False)
+        self.fake_orion.set_attribute('/', 'actuator:Relais_Switch:DO4-1', 'current_State_Relais2', 1, notify=False)
+        self.fake_orion.set_attribute('/ed', 'sensor:Multisensor:Air_Inlet_ED', 'measured_Temperature', 19.0, notify=False)
+        self.assertIsNone(self.subscriber.get_snapshot()['system'])
+        self.subscriber.resync()
+        snapshot = self.subscriber.get_snapshot()
+        self.assertEqual(snapshot['system'], 'ed')
+        self.assertEqual(snapshot['switch']['current_State_Relais2'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
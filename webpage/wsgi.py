@@ -0,0 +1,7 @@
+"""
+This file is the entry point for serving the dashboard with gunicorn (several worker processes) instead of the development server of DASH:
+    gunicorn --config gunicorn.conf.py wsgi:server
+The settings of gunicorn are in gunicorn.conf.py. For running on a local PC, "python index.py" still works.
+"""
+
+from index import server